@@ -1,4 +1,9 @@
 import json
+import hashlib
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parseaddr
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
 from termcolor import colored
 from models import (
     IncomingEmail, JobDescription, ResumeData, 
@@ -7,14 +12,79 @@ from models import (
 from llm_client import LLMClient
 from resume_parser import ResumeParser
 from ats_scorer import ATSScorer
+from dedup import DuplicateIndex
+
+if TYPE_CHECKING:
+    from profiler import Profiler
+    # numpy-backed; only imported by callers that enable semantic matching
+    from embeddings import SemanticSkillMatcher
+
+# Replies used instead of LLM-written ones when the bot degrades under backlog
+EMAIL_TEMPLATES = {
+    "PROCEED": {
+        "subject": "Your application for {role}: next steps",
+        "body": ("Dear {name},\n\nThank you for applying for the {role} position. We are pleased to let you know "
+                 "that you have been shortlisted. We will be in touch shortly to schedule an interview.\n\n"
+                 "Best regards,\nThe Hiring Team")
+    },
+    "REJECT": {
+        "subject": "Your application for {role}",
+        "body": ("Dear {name},\n\nThank you for your interest in the {role} position and for the time you put "
+                 "into your application. After careful review, we have decided not to move forward at this time. "
+                 "We encourage you to apply for future openings that match your experience.\n\n"
+                 "Best regards,\nThe Hiring Team")
+    }
+}
 
 class HiringAgent:
-    def __init__(self, llm_client: LLMClient):
+    def __init__(self, llm_client: LLMClient, dedup_index: Optional[DuplicateIndex] = None,
+                 matcher: Optional["SemanticSkillMatcher"] = None, profiler: Optional["Profiler"] = None):
         self.llm = llm_client
+        self.dedup = dedup_index
+        self.matcher = matcher
+        self.profiler = profiler
+
+    @contextmanager
+    def _stage(self, name: str):
+        with self.profiler.stage(name) if self.profiler else nullcontext(), \
+                self.llm.usage.stage(name) if self.llm.usage else nullcontext():
+            yield
 
-    def run(self, email: IncomingEmail, jd_text: str, config: dict):
+    def _reused(self, stage: str):
+        # The model work this stage would have done was served by the duplicate index
+        if self.llm.usage:
+            self.llm.usage.record("dedup", self.llm.active_model, cache="hit", stage=stage)
+
+    def run(self, email: IncomingEmail, jd_text: str, config: dict, message_id: Optional[str] = None,
+            raw_text: Optional[str] = None):
+        """
+        Screens one application end to end. Besides the cutoff, `config` may
+        carry a degradation level's settings (see degradation.py): `model`
+        routes the LLM calls, `resume_chars` caps the resume context,
+        `local_scoring` and `template_email` skip those LLM calls. A degraded
+        result is never added to the dedup index, so near-duplicates aren't
+        later served it as full quality. `raw_text` is the resume text when a
+        caller has already extracted it.
+
+        With a usage ledger on the LLM client, the calls are recorded under
+        `message_id` (the sender's address by default) and the result's
+        "usage" holds the message's token and compute totals per stage.
+        """
+        usage = self.llm.usage
+        with usage.message(message_id or email.sender_email) if usage else nullcontext() as scope, \
+                self.llm.routed(config.get("model")):
+            result = self._run(email, jd_text, config, raw_text)
+            if result is not None and scope is not None:
+                result["usage"] = scope.summary()
+        if result is not None:
+            result["degradation"] = {"level": config.get("degradation_level", 0),
+                                     "name": config.get("degradation", "full")}
+        return result
+
+    def _run(self, email: IncomingEmail, jd_text: str, config: dict, raw_text: Optional[str] = None):
         print(colored("\n--- STEP 1: Email Classification ---", "cyan"))
-        classification = self.classify_email(email)
+        with self._stage("classify_email"):
+            classification = self.classify_email(email)
         print(f"Is Job Application: {classification.is_job_application} (Confidence: {classification.confidence}%)")
         
         if not classification.is_job_application:
@@ -24,19 +94,51 @@ class HiringAgent:
         print(colored("\n--- STEP 3: Job Description Understanding ---", "cyan"))
         # Note: Swapped order slightly to have JD ready for matching or if input is raw text
         # If jd_text is provided, parse it.
-        jd = self.parse_jd(jd_text)
+        with self._stage("parse_jd"):
+            jd = self.parse_jd(jd_text)
+        if self.llm.usage:
+            self.llm.usage.set_role(jd.role_title)
         print(f"Role: {jd.role_title}")
         print(f"Mandatory Skills: {jd.mandatory_skills}")
 
         print(colored("\n--- STEP 2: Resume Parsing ---", "cyan"))
-        resume_data = self.parse_resume(email.attachment_path)
+        if raw_text is None:
+            with self._stage("extract_text"):
+                raw_text = ResumeParser.extract_text(email.attachment_path)
+        jd_hash = hashlib.sha256(jd_text.encode()).hexdigest()
+        duplicate = None
+        if self.dedup:
+            with self._stage("dedup_lookup"):
+                signature = self.dedup.signature(raw_text)
+                duplicate = self.dedup.find(signature, jd_hash)
+
+        reuse = duplicate is not None and config.get("reuse_duplicates", True)
+        if reuse:
+            print(colored(f"Near-duplicate of {duplicate.resume_id} ({duplicate.source}), "
+                          f"similarity {duplicate.similarity}. Reusing extracted data.", "yellow"))
+            resume_data = duplicate.resume
+            self._reused("structure_resume")
+        else:
+            with self._stage("structure_resume"):
+                resume_data = self.structure_resume(raw_text, config.get("resume_chars", 4000))
         print(f"Candidate: {resume_data.name}")
         print(f"Experience: {resume_data.experience_years} years")
         print(f"Skills: {resume_data.skills}")
 
         print(colored("\n--- STEP 4: ATS Scoring ---", "cyan"))
-        scorer = ATSScorer(jd, self.llm)
-        score_result = scorer.score(resume_data)
+        score_reused = reuse and duplicate.score is not None
+        if score_reused:
+            score_result = duplicate.score
+            self._reused("ats_score")
+        else:
+            with self._stage("ats_score"):
+                scorer = ATSScorer(jd, self.llm, matcher=self.matcher, local=config.get("local_scoring", False))
+                score_result = scorer.score(resume_data)
+
+        if self.dedup and not score_reused and not config.get("degradation_level", 0):
+            with self._stage("dedup_add"):
+                self.dedup.add(DuplicateIndex.text_id(raw_text), signature, resume_data,
+                               score_result, jd_hash, source=email.sender_email)
         print(f"Final ATS Score: {score_result.final_ats_score}/100")
         print(f"Breakdown: {score_result.model_dump()}")
 
@@ -47,19 +149,164 @@ class HiringAgent:
         print(f"Reason: {decision.reason_summary}")
 
         print(colored("\n--- STEP 6: Email Generation ---", "cyan"))
-        email_draft = self.generate_email(decision, resume_data.name, jd.role_title)
+        with self._stage("generate_email"):
+            if config.get("template_email"):
+                email_draft = self.template_email(decision, resume_data.name, jd.role_title)
+            else:
+                email_draft = self.generate_email(decision, resume_data.name, jd.role_title)
         print(f"Subject: {email_draft.email_subject}")
         print(f"Body Preview: {email_draft.email_body[:100]}...")
         
         return {
+            "duplicate_of": {
+                "resume_id": duplicate.resume_id,
+                "source": duplicate.source,
+                "similarity": duplicate.similarity,
+                "reused": reuse
+            } if duplicate else None,
             "classification": classification.model_dump(),
             "jd": jd.model_dump(),
             "resume": resume_data.model_dump(),
             "score": score_result.model_dump(),
             "decision": decision.model_dump(),
-            "email": email_draft.model_dump()
+            "email": email_draft.model_dump(),
+            "resume_text": raw_text
+        }
+
+    def prescreen_reject(self, email: IncomingEmail, jd: JobDescription, raw_text: str,
+                         prescreen: Dict[str, Any]) -> dict:
+        """
+        A REJECT result, shaped like `run`'s, for a resume the keyword
+        pre-screen found hopeless: no LLM call. Scores are the lexical local
+        scores over the JD skills the pre-screen matched, and the reply is the
+        rejection template.
+        """
+        name, address = parseaddr(email.sender_email)
+        resume = ResumeData(name=name, email=address or email.sender_email, skills=prescreen["matched"])
+        score = ATSScorer(jd, self.llm, local=True).score(resume)
+        decision = DecisionOutput(
+            decision="REJECT",
+            reason_summary=f"Pre-screen matched {prescreen['mandatory_fraction']:.0%} of mandatory skills."
+        )
+        return {
+            "duplicate_of": None,
+            "prescreen_rejected": True,
+            "jd": jd.model_dump(),
+            "resume": resume.model_dump(),
+            "score": score.model_dump(),
+            "decision": decision.model_dump(),
+            "email": self.template_email(decision, name, jd.role_title).model_dump(),
+            "resume_text": raw_text
         }
 
+    def screen_batch(self, attachment_paths: List[str], jd: JobDescription, jd_text: str, config: dict,
+                     max_workers: int = 4) -> List[dict]:
+        """
+        Screens several resumes against one already-parsed JD, skipping email
+        classification. Work is shared across the batch: identical resume texts
+        are structured once, scoring goes through ATSScorer.score_batch (one
+        matrix multiply with a semantic matcher), and the remaining LLM calls run
+        concurrently. Returns one result per path, shaped like `run`, or
+        {"error": ...} for items that failed.
+        """
+        n = len(attachment_paths)
+        errors: Dict[int, str] = {}
+        jd_hash = hashlib.sha256(jd_text.encode()).hexdigest()
+        cutoff_score = config.get("cutoff_score", 70)
+        print(colored(f"\n--- Batch Screening: {n} resume(s) for {jd.role_title} ---", "cyan"))
+
+        def attempt(stage, fn, i, *args):
+            # Shared work is charged to the first resume of its group
+            try:
+                with self.llm.usage.message(attachment_paths[i], jd.role_title) if self.llm.usage else nullcontext(), \
+                        self._stage(stage):
+                    return fn(*args)
+            except Exception as e:
+                errors[i] = str(e)
+                return None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            texts = list(pool.map(
+                lambda i: attempt("extract_text", ResumeParser.extract_text, i, attachment_paths[i]), range(n)))
+
+            # Group identical texts so each is structured and scored once
+            groups: Dict[str, List[int]] = {}
+            for i, text in enumerate(texts):
+                if i not in errors:
+                    groups.setdefault(DuplicateIndex.text_id(text), []).append(i)
+
+            resumes, scores, duplicates, signatures = {}, {}, {}, {}
+            to_structure = []
+            for key, members in groups.items():
+                text = texts[members[0]]
+                if self.dedup:
+                    signatures[key] = self.dedup.signature(text)
+                    duplicates[key] = self.dedup.find(signatures[key], jd_hash)
+                dup = duplicates.get(key)
+                if dup is not None and config.get("reuse_duplicates", True):
+                    resumes[key] = dup.resume
+                    if dup.score is not None:
+                        scores[key] = dup.score
+                else:
+                    to_structure.append(key)
+
+            structured = pool.map(
+                lambda k: attempt("structure_resume", self.structure_resume, groups[k][0], texts[groups[k][0]]),
+                to_structure)
+            for key, resume_data in zip(to_structure, structured):
+                if resume_data is not None:
+                    resumes[key] = resume_data
+
+            to_score = [k for k in resumes if k not in scores]
+            scorer = ATSScorer(jd, self.llm, matcher=self.matcher)
+            if self.matcher:
+                try:
+                    scores.update(zip(to_score, scorer.score_batch([resumes[k] for k in to_score])))
+                except Exception as e:
+                    for k in to_score:
+                        errors[groups[k][0]] = str(e)
+            else:
+                for key, score in zip(to_score, pool.map(
+                        lambda k: attempt("ats_score", scorer.score, groups[k][0], resumes[k]), to_score)):
+                    if score is not None:
+                        scores[key] = score
+
+            if self.dedup and not config.get("degradation_level", 0):
+                for key in to_score:
+                    if key in scores:
+                        self.dedup.add(key, signatures[key], resumes[key], scores[key], jd_hash)
+
+            decisions = {k: self.make_decision(scores[k].final_ats_score, cutoff_score) for k in scores}
+            drafts = dict(zip(decisions, pool.map(
+                lambda k: attempt("generate_email", self.generate_email, groups[k][0], decisions[k],
+                                  resumes[k].name, jd.role_title),
+                decisions)))
+
+        results = []
+        for i in range(n):
+            key = DuplicateIndex.text_id(texts[i]) if texts[i] is not None else None
+            if key not in drafts or drafts[key] is None:
+                first = groups[key][0] if key in groups else i
+                results.append({"error": errors.get(i) or errors.get(first) or "screening failed"})
+                continue
+            dup = duplicates.get(key)
+            results.append({
+                "duplicate_of": {
+                    "resume_id": dup.resume_id,
+                    "source": dup.source,
+                    "similarity": dup.similarity,
+                    "reused": config.get("reuse_duplicates", True)
+                } if dup else None,
+                "classification": None,
+                "jd": jd.model_dump(),
+                "resume": resumes[key].model_dump(),
+                "score": scores[key].model_dump(),
+                "decision": decisions[key].model_dump(),
+                "email": drafts[key].model_dump(),
+                "resume_text": texts[i]
+            })
+        return results
+
     def classify_email(self, email: IncomingEmail) -> ClassificationResult:
         prompt = f"""
         Analyze the following email to determine if it is a job application.
@@ -90,11 +337,14 @@ class HiringAgent:
         raw_text = ResumeParser.extract_text(file_path)
         
         # 2. Structure with LLM
+        return self.structure_resume(raw_text)
+
+    def structure_resume(self, raw_text: str, max_chars: int = 4000) -> ResumeData:
         prompt = f"""
         Extract structured data from the following Resume text.
         
         Resume Text:
-        {raw_text[:4000]}  # Truncate to avoid context window issues if too long
+        {raw_text[:max_chars]}  # Truncate to avoid context window issues if too long
         
         Return valid JSON matching the ResumeData schema.
         IMPORTANT: Extract ALL technical skills, tools, languages, and frameworks found in the resume. 
@@ -135,3 +385,11 @@ class HiringAgent:
         Return valid JSON with 'email_subject' and 'email_body'.
         """
         return self.llm.generate_json(prompt, EmailDraft)
+
+    def template_email(self, decision: DecisionOutput, candidate_name: str, role_title: str) -> EmailDraft:
+        """Fixed-text reply following the same guidelines as generate_email, without an LLM call."""
+        template = EMAIL_TEMPLATES[decision.decision]
+        return EmailDraft(
+            email_subject=template["subject"].format(role=role_title),
+            email_body=template["body"].format(name=candidate_name or "Candidate", role=role_title)
+        )
@@ -0,0 +1,92 @@
+import math
+import time
+from typing import Dict, Any, Optional
+
+SCORE_COMPONENTS = ["skill_score", "experience_score", "keyword_score", "education_score", "final_ats_score"]
+HISTOGRAM_BUCKETS = 10  # fixed-width buckets over 0-100: [0,10), [10,20) ... [90,100]
+MAX_DAYS = 90
+
+
+def empty_aggregates() -> Dict[str, Any]:
+    return {
+        "count": 0,
+        "decisions": {},
+        "score": {"mean": 0.0, "m2": 0.0, "min": None, "max": None},
+        "histograms": {c: [0] * HISTOGRAM_BUCKETS for c in SCORE_COMPONENTS},
+        "roles": {},
+        "days": {}
+    }
+
+
+def _bucket(value: float) -> int:
+    return min(max(int(value // (100 / HISTOGRAM_BUCKETS)), 0), HISTOGRAM_BUCKETS - 1)
+
+
+def _rollup(group: Dict[str, Any], key: str, decision: str, score: float):
+    entry = group.setdefault(key, {"count": 0, "decisions": {}, "score_sum": 0.0})
+    entry["count"] += 1
+    entry["decisions"][decision] = entry["decisions"].get(decision, 0) + 1
+    entry["score_sum"] += score
+
+
+def update_aggregates(agg: Dict[str, Any], candidate: Dict[str, Any], timestamp: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Folds one screened candidate into the aggregates in O(1): decision counts,
+    a running mean/variance of the final score (Welford), per-component
+    histograms, and per-role and per-day rollups.
+    """
+    decision = candidate.get("decision") or "UNKNOWN"
+    score = float(candidate.get("score") or 0.0)
+    breakdown = candidate.get("breakdown") or {}
+
+    agg["count"] += 1
+    agg["decisions"][decision] = agg["decisions"].get(decision, 0) + 1
+
+    stats = agg["score"]
+    delta = score - stats["mean"]
+    stats["mean"] += delta / agg["count"]
+    stats["m2"] += delta * (score - stats["mean"])
+    stats["min"] = score if stats["min"] is None else min(stats["min"], score)
+    stats["max"] = score if stats["max"] is None else max(stats["max"], score)
+
+    for component in SCORE_COMPONENTS:
+        value = score if component == "final_ats_score" else breakdown.get(component)
+        if value is not None:
+            agg["histograms"][component][_bucket(float(value))] += 1
+
+    _rollup(agg["roles"], candidate.get("role") or "Unknown", decision, score)
+
+    day = time.strftime("%Y-%m-%d", time.localtime(timestamp))
+    _rollup(agg["days"], day, decision, score)
+    if len(agg["days"]) > MAX_DAYS:
+        # ISO dates sort chronologically; drop the oldest day
+        del agg["days"][min(agg["days"])]
+
+    return agg
+
+
+def summarize(agg: Dict[str, Any]) -> Dict[str, Any]:
+    """Derived view used by the dashboard: totals, mean/std and rollup means."""
+    count = agg["count"]
+    variance = agg["score"]["m2"] / (count - 1) if count > 1 else 0.0
+
+    def with_means(group: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            key: dict(entry, mean_score=entry["score_sum"] / entry["count"] if entry["count"] else 0.0)
+            for key, entry in group.items()
+        }
+
+    return {
+        "total_processed": count,
+        "proceeded": agg["decisions"].get("PROCEED", 0),
+        "rejected": agg["decisions"].get("REJECT", 0),
+        "decisions": dict(agg["decisions"]),
+        "average_score": agg["score"]["mean"],
+        "score_variance": variance,
+        "score_std": math.sqrt(variance),
+        "min_score": agg["score"]["min"],
+        "max_score": agg["score"]["max"],
+        "histograms": agg["histograms"],
+        "roles": with_means(agg["roles"]),
+        "days": with_means(agg["days"])
+    }
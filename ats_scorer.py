@@ -1,13 +1,105 @@
+from typing import List, Optional, TYPE_CHECKING
 from models import JobDescription, ResumeData, ATSScore
 from llm_client import LLMClient
+from prescreen import term_variants
 import json
 
+if TYPE_CHECKING:
+    from embeddings import SemanticSkillMatcher
+
+# Component weights behind final_ats_score (see the scoring instructions below)
+SCORE_WEIGHTS = {
+    "skill_score": 0.5,
+    "experience_score": 0.2,
+    "keyword_score": 0.2,
+    "education_score": 0.1
+}
+
+def experience_score(years: float, min_years: int) -> float:
+    """Rule from the scoring instructions: 100 at/above min, 80 within a year, else scaled down."""
+    years = years or 0.0
+    if years >= min_years:
+        return 100.0
+    if years >= min_years - 1:
+        return 80.0
+    return round(80.0 * years / max(min_years - 1, 1), 1)
+
+def weighted_final(skill: float, experience: float, keyword: float, education: float) -> float:
+    return round(
+        skill * SCORE_WEIGHTS["skill_score"]
+        + experience * SCORE_WEIGHTS["experience_score"]
+        + keyword * SCORE_WEIGHTS["keyword_score"]
+        + education * SCORE_WEIGHTS["education_score"], 1)
+
 class ATSScorer:
-    def __init__(self, jd: JobDescription, llm_client: LLMClient):
+    def __init__(self, jd: JobDescription, llm_client: LLMClient, matcher: Optional["SemanticSkillMatcher"] = None,
+                 local: bool = False):
         self.jd = jd
         self.llm = llm_client
+        self.matcher = matcher
+        self.local = local
 
     def score(self, resume: ResumeData) -> ATSScore:
+        if self.matcher:
+            return self.score_batch([resume])[0]
+        if self.local:
+            return self._score_locally(resume)
+        return self._score_with_llm(resume)
+
+    def score_batch(self, resumes: List[ResumeData]) -> List[ATSScore]:
+        """
+        Scores many resumes at once. With a semantic matcher, skill and keyword
+        scores come from one embedding matrix multiply for the whole batch and no
+        chat LLM call is made; otherwise each resume is scored by the LLM.
+        """
+        if not self.matcher:
+            return [self._score_with_llm(r) for r in resumes]
+
+        scores = []
+        for resume, (skill, keyword, edu_match) in zip(resumes, self.matcher.score_batch(self.jd, resumes)):
+            experience = experience_score(resume.experience_years, self.jd.min_experience_years)
+            # 0 if missing, 50 for an unrelated degree, up to 100 as it matches the role
+            education = round(50.0 + edu_match / 2, 1) if resume.education else 0.0
+            scores.append(ATSScore(
+                skill_score=skill,
+                experience_score=experience,
+                keyword_score=keyword,
+                education_score=education,
+                final_ats_score=weighted_final(skill, experience, keyword, education)
+            ))
+        return scores
+
+    def _score_locally(self, resume: ResumeData) -> ATSScore:
+        """
+        Lexical fallback with no model call: a JD term counts when one of its
+        spelling variants is among the resume's skills (skills) or appears in
+        its skills, projects and companies (keywords). Used when the bot
+        degrades under backlog; coarser than the LLM or semantic scores.
+        """
+        have = {v for s in resume.skills for v in term_variants(s)}
+        text = " ".join(resume.skills + resume.projects + resume.companies).lower()
+
+        def matched(terms: List[str], found) -> float:
+            if not terms:
+                return 100.0
+            return 100.0 * sum(any(found(v) for v in term_variants(t)) for t in terms) / len(terms)
+
+        mandatory = matched(self.jd.mandatory_skills, have.__contains__)
+        preferred = matched(self.jd.preferred_skills, have.__contains__)
+        skill = round(0.8 * mandatory + 0.2 * preferred, 1)
+        keyword = round(matched(self.jd.keywords, text.__contains__), 1)
+        experience = experience_score(resume.experience_years, self.jd.min_experience_years)
+        # Relevance of a degree can't be judged lexically: score any degree midway between unrelated (50) and relevant (100)
+        education = 75.0 if resume.education else 0.0
+        return ATSScore(
+            skill_score=skill,
+            experience_score=experience,
+            keyword_score=keyword,
+            education_score=education,
+            final_ats_score=weighted_final(skill, experience, keyword, education)
+        )
+
+    def _score_with_llm(self, resume: ResumeData) -> ATSScore:
         prompt = f"""
         Act as an expert Technical Recruiter. Evaluate the candidate's resume against the Job Description.
         
@@ -0,0 +1,195 @@
+import argparse
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+INDEX_FILE = "candidate_index.db"
+
+
+class CandidateIndex:
+    """
+    Searchable index of every processed resume.
+
+    Resume text and skills go into an SQLite FTS5 inverted index ranked with
+    BM25 (skills weighted above body text). Structured columns (experience,
+    score, decision, role, processed date) and a normalized skill table sit
+    beside it, so full-text ranking and filters run as one indexed query.
+    """
+
+    def __init__(self, db_path: str = INDEX_FILE):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._init_db()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS candidates (
+                doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                candidate_id TEXT NOT NULL UNIQUE,
+                name TEXT,
+                email TEXT,
+                role TEXT,
+                experience REAL,
+                score REAL,
+                decision TEXT,
+                processed_at REAL NOT NULL,
+                skills TEXT NOT NULL DEFAULT '[]'
+            );
+            CREATE INDEX IF NOT EXISTS idx_candidates_score ON candidates (score);
+            CREATE INDEX IF NOT EXISTS idx_candidates_experience ON candidates (experience);
+            CREATE INDEX IF NOT EXISTS idx_candidates_processed ON candidates (processed_at);
+            CREATE TABLE IF NOT EXISTS candidate_skills (
+                skill TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                PRIMARY KEY (skill, doc_id)
+            ) WITHOUT ROWID;
+            CREATE VIRTUAL TABLE IF NOT EXISTS resume_fts USING fts5(
+                body, skills, tokenize = 'porter unicode61'
+            );
+        """)
+
+    @staticmethod
+    def _norm_skill(skill: str) -> str:
+        return re.sub(r"\s+", " ", skill).strip().lower()
+
+    def add(self, candidate_id: str, resume_text: str, resume: Dict[str, Any], score: float,
+            decision: str, role: str = "", email: str = "", processed_at: Optional[float] = None):
+        """Adds or replaces one screened candidate."""
+        skills = resume.get("skills", [])
+        conn = self._conn()
+        with conn:
+            old = conn.execute("SELECT doc_id FROM candidates WHERE candidate_id = ?", (candidate_id,)).fetchone()
+            if old:
+                conn.execute("DELETE FROM resume_fts WHERE rowid = ?", (old["doc_id"],))
+                conn.execute("DELETE FROM candidate_skills WHERE doc_id = ?", (old["doc_id"],))
+                conn.execute("DELETE FROM candidates WHERE doc_id = ?", (old["doc_id"],))
+
+            cur = conn.execute(
+                "INSERT INTO candidates (candidate_id, name, email, role, experience, score, decision, processed_at, skills) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (candidate_id, resume.get("name"), email or resume.get("email") or "", role,
+                 resume.get("experience_years") or 0.0, score, decision,
+                 processed_at or time.time(), json.dumps(skills)))
+            doc_id = cur.lastrowid
+            conn.execute("INSERT INTO resume_fts (rowid, body, skills) VALUES (?, ?, ?)",
+                         (doc_id, resume_text, " ".join(skills)))
+            conn.executemany("INSERT OR IGNORE INTO candidate_skills VALUES (?, ?)",
+                             [(self._norm_skill(s), doc_id) for s in skills if s.strip()])
+
+    @staticmethod
+    def _fts_query(text: str, match_all: bool) -> str:
+        # Quote every term so user input can't be parsed as FTS5 syntax
+        terms = re.findall(r"[\w+#.]+", text)
+        return (" AND " if match_all else " OR ").join('"' + t.replace('"', '') + '"' for t in terms)
+
+    def search(self, query: str = "", skills: Optional[List[str]] = None, min_experience: Optional[float] = None,
+               min_score: Optional[float] = None, decision: Optional[str] = None, role: Optional[str] = None,
+               since: Optional[float] = None, until: Optional[float] = None,
+               match_all: bool = False, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Returns candidates matching every filter. With a text query they are
+        ranked by BM25 relevance, otherwise by score.
+        """
+        where, params = [], []
+        for skill in skills or []:
+            where.append("c.doc_id IN (SELECT doc_id FROM candidate_skills WHERE skill = ?)")
+            params.append(self._norm_skill(skill))
+        for column, op, value in (("experience", ">=", min_experience), ("score", ">=", min_score),
+                                  ("processed_at", ">=", since), ("processed_at", "<", until)):
+            if value is not None:
+                where.append(f"c.{column} {op} ?")
+                params.append(value)
+        if decision:
+            where.append("c.decision = ?")
+            params.append(decision.upper())
+        if role:
+            where.append("c.role LIKE ?")
+            params.append(f"%{role}%")
+
+        fts = self._fts_query(query, match_all) if query else ""
+        if fts:
+            sql = ("SELECT c.*, bm25(resume_fts, 1.0, 2.0) AS rank FROM resume_fts "
+                   "JOIN candidates c ON c.doc_id = resume_fts.rowid WHERE resume_fts MATCH ?")
+            params.insert(0, fts)
+            order = "rank"
+        else:
+            sql = "SELECT c.*, NULL AS rank FROM candidates c WHERE 1 = 1"
+            order = "c.score DESC"
+        for clause in where:
+            sql += f" AND {clause}"
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+
+        results = []
+        for row in self._conn().execute(sql, params):
+            item = dict(row)
+            item["skills"] = json.loads(item["skills"])
+            # bm25() is lower-is-better; flip it so higher means more relevant
+            rank = item.pop("rank")
+            item["relevance"] = round(-rank, 3) if rank is not None else None
+            item.pop("doc_id")
+            results.append(item)
+        return results
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
+
+
+def parse_since(text: str) -> float:
+    """Accepts a relative age like '30d' / '12h' or an ISO date like '2026-01-31'."""
+    match = re.fullmatch(r"(\d+)([dhw])", text.strip())
+    if match:
+        seconds = {"h": 3600, "d": 86400, "w": 7 * 86400}[match.group(2)]
+        return time.time() - int(match.group(1)) * seconds
+    return time.mktime(time.strptime(text.strip(), "%Y-%m-%d"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search processed candidates")
+    parser.add_argument("query", nargs="?", default="", help="Free-text query over resume text (BM25 ranked)")
+    parser.add_argument("--skill", action="append", default=[], help="Required skill (repeatable)")
+    parser.add_argument("--min-exp", type=float, help="Minimum years of experience")
+    parser.add_argument("--min-score", type=float, help="Minimum final ATS score")
+    parser.add_argument("--decision", choices=["PROCEED", "REJECT"], help="Decision filter")
+    parser.add_argument("--role", help="Role title contains")
+    parser.add_argument("--since", help="Processed since, e.g. 30d or 2026-01-31")
+    parser.add_argument("--all-terms", action="store_true", help="Require every query term")
+    parser.add_argument("--limit", type=int, default=20, help="Max results")
+    parser.add_argument("--index", default=INDEX_FILE, help="Path to the candidate index")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    index = CandidateIndex(args.index)
+    start = time.perf_counter()
+    results = index.search(
+        args.query, skills=args.skill, min_experience=args.min_exp, min_score=args.min_score,
+        decision=args.decision, role=args.role, since=parse_since(args.since) if args.since else None,
+        match_all=args.all_terms, limit=args.limit)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{len(results)} result(s) in {elapsed_ms:.1f} ms")
+    for r in results:
+        processed = time.strftime("%Y-%m-%d", time.localtime(r["processed_at"]))
+        relevance = f" relevance={r['relevance']}" if r["relevance"] is not None else ""
+        print(f"- {r['name']} <{r['email']}> score={r['score']:.1f} {r['decision']} "
+              f"exp={r['experience']}y role={r['role']} on {processed}{relevance}")
+        print(f"  skills: {', '.join(r['skills'][:12])}")
+
+if __name__ == "__main__":
+    main()
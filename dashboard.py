@@ -1,10 +1,10 @@
 import streamlit as st
 import json
+import os
 import time
 import threading
 from pathlib import Path
-from state_manager import StateManager
-from realtime_bot import BotService
+from state_manager import StateManager, MAX_CANDIDATES, MAX_LOGS, SHARD_STALE_SECONDS
 import plotly.graph_objects as go
 
 # Page config
@@ -14,8 +14,16 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize state manager
-state_mgr = StateManager()
+DEFAULT_REFRESH_SECONDS = float(os.environ.get("DASHBOARD_REFRESH_SECONDS", "2"))
+
+# Session state for incremental state sync (kept across reruns)
+if 'state_mgr' not in st.session_state:
+    st.session_state.state_mgr = StateManager()
+    st.session_state.state_version = 0
+    st.session_state.summary = {}
+    st.session_state.candidates = {}
+    st.session_state.logs = []
+    st.session_state.charts = {}
 
 # Session state for bot thread
 if 'bot_thread' not in st.session_state:
@@ -35,6 +43,8 @@ with st.sidebar:
     with col1:
         if st.button("▶️ Start Bot", use_container_width=True):
             if st.session_state.bot_thread is None or not st.session_state.bot_thread.is_alive():
+                # Imported on demand: the bot pulls in the Gmail client and resume parsers
+                from realtime_bot import BotService
                 # Initialize bot service with parameters
                 st.session_state.bot_service = BotService(
                     jd_path="data/jd.txt",
@@ -73,103 +83,252 @@ with st.sidebar:
     
     st.divider()
     
+    refresh_seconds = st.number_input(
+        "Refresh every (seconds)", min_value=0.5, max_value=60.0,
+        value=DEFAULT_REFRESH_SECONDS, step=0.5
+    )
+    
+    st.divider()
+    
     if st.button("🔄 Shutdown App", use_container_width=True):
         if st.session_state.bot_service and hasattr(st.session_state, 'stop_event'):
             st.session_state.stop_event.set()
         st.stop()
 
-# Auto-refresh
-st_autorefresh = st.empty()
-with st_autorefresh:
-    time.sleep(2)
-    st.rerun()
-
 # Load state
-state = state_mgr.load_state()
+def sync_state():
+    """Pulls only the entries added since the last version this session has seen."""
+    changes = st.session_state.state_mgr.get_changes(st.session_state.state_version)
+    if changes is None:
+        return
 
-# Metrics
-col1, col2, col3, col4 = st.columns(4)
+    if changes["reset"]:
+        st.session_state.candidates = {}
+        st.session_state.logs = []
+        st.session_state.charts = {}
 
-with col1:
-    st.metric("Total Processed", state.get("total_processed", 0))
+    for candidate in changes.pop("candidates"):
+        cid = candidate.get("id", candidate.get("version"))
+        # Re-insert so the candidate moves to the end (most recent)
+        st.session_state.candidates.pop(cid, None)
+        st.session_state.candidates[cid] = candidate
+    while len(st.session_state.candidates) > MAX_CANDIDATES:
+        stale = next(iter(st.session_state.candidates))
+        del st.session_state.candidates[stale]
+        st.session_state.charts.pop(stale, None)
 
-with col2:
-    st.metric("Proceeded", state.get("proceeded", 0), delta_color="normal")
+    st.session_state.logs = (st.session_state.logs + changes.pop("logs"))[-MAX_LOGS:]
+    st.session_state.summary = changes
+    st.session_state.state_version = changes["version"]
 
-with col3:
-    st.metric("Rejected", state.get("rejected", 0), delta_color="inverse")
+def candidate_chart(cid, breakdown: dict) -> go.Figure:
+    """Builds the score breakdown chart, reusing the cached figure unless the scores changed."""
+    values = [
+        breakdown.get('skill_score', 0),
+        breakdown.get('experience_score', 0),
+        breakdown.get('keyword_score', 0),
+        breakdown.get('education_score', 0)
+    ]
+    cached = st.session_state.charts.get(cid)
+    if cached and cached[0] == values:
+        return cached[1]
 
-with col4:
-    avg_score = state.get("average_score", 0)
-    st.metric("Avg Score", f"{avg_score:.1f}")
+    fig = go.Figure(data=[
+        go.Bar(
+            x=['Skills', 'Experience', 'Keywords', 'Education'],
+            y=values,
+            marker_color=['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A']
+        )
+    ])
+    fig.update_layout(
+        height=250,
+        margin=dict(l=0, r=0, t=0, b=0),
+        yaxis_range=[0, 100]
+    )
+    st.session_state.charts[cid] = (values, fig)
+    return fig
 
-st.divider()
+HISTOGRAM_LABELS = {
+    "final_ats_score": "Final ATS Score",
+    "skill_score": "Skills",
+    "experience_score": "Experience",
+    "keyword_score": "Keywords",
+    "education_score": "Education"
+}
 
-# Two column layout
-col_left, col_right = st.columns([1, 1])
+def histogram_chart(component: str, counts: list) -> go.Figure:
+    """Builds a histogram chart, reusing the cached figure while the bucket counts are unchanged."""
+    cache_key = f"hist_{component}"
+    cached = st.session_state.charts.get(cache_key)
+    if cached and cached[0] == counts:
+        return cached[1]
 
-with col_left:
-    st.subheader("📋 Recent Logs")
-    logs = state.get("logs", [])
-    
-    if logs:
-        # Show last 10 logs
-        for log in logs[-10:]:
-            timestamp = log.get("timestamp", "")
-            message = log.get("message", "")
-            level = log.get("level", "INFO")
-            
-            if level == "ERROR":
-                st.error(f"[{timestamp}] {message}")
-            elif level == "WARNING":
-                st.warning(f"[{timestamp}] {message}")
-            elif level == "SUCCESS":
-                st.success(f"[{timestamp}] {message}")
-            else:
-                st.info(f"[{timestamp}] {message}")
-    else:
-        st.info("No logs yet. Start the bot to begin processing.")
+    width = 100 // len(counts)
+    fig = go.Figure(data=[go.Bar(x=[f"{i * width}-{(i + 1) * width}" for i in range(len(counts))], y=counts)])
+    fig.update_layout(height=250, margin=dict(l=0, r=0, t=0, b=0))
+    st.session_state.charts[cache_key] = (list(counts), fig)
+    return fig
 
-with col_right:
-    st.subheader("👥 Recent Candidates")
-    candidates = state.get("candidates", [])
-    
-    if candidates:
-        for candidate in candidates[-5:]:
-            with st.expander(f"📧 {candidate.get('name', 'Unknown')} - Score: {candidate.get('score', 0):.1f}"):
-                st.write(f"**Email:** {candidate.get('email', 'N/A')}")
-                st.write(f"**Experience:** {candidate.get('experience', 0)} years")
-                st.write(f"**Decision:** {candidate.get('decision', 'N/A')}")
-                
-                # Score breakdown
-                breakdown = candidate.get('breakdown', {})
-                if breakdown:
-                    st.write("**Score Breakdown:**")
-                    fig = go.Figure(data=[
-                        go.Bar(
-                            x=['Skills', 'Experience', 'Keywords', 'Education'],
-                            y=[
-                                breakdown.get('skill_score', 0),
-                                breakdown.get('experience_score', 0),
-                                breakdown.get('keyword_score', 0),
-                                breakdown.get('education_score', 0)
-                            ],
-                            marker_color=['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A']
-                        )
-                    ])
-                    fig.update_layout(
-                        height=250,
-                        margin=dict(l=0, r=0, t=0, b=0),
-                        yaxis_range=[0, 100]
-                    )
-                    st.plotly_chart(fig, use_container_width=True, key=f"chart_{candidate.get('email', '')}")
+def rollup_rows(group: dict, label: str) -> list:
+    return [
+        {
+            label: key,
+            "Processed": entry["count"],
+            "Proceeded": entry["decisions"].get("PROCEED", 0),
+            "Rejected": entry["decisions"].get("REJECT", 0),
+            "Avg Score": round(entry["mean_score"], 1)
+        }
+        for key, entry in group.items()
+    ]
+
+def shard_rows(shards: dict) -> list:
+    now = time.time()
+    rows = []
+    for name, shard in sorted(shards.items()):
+        process = shard.get("process", {})
+        age = now - shard["last_seen"] if shard.get("last_seen") else None
+        if process.get("state", "running") != "running":
+            health = f"🔴 {process['state']}"
+        elif age is None or age > SHARD_STALE_SECONDS:
+            health = "🟡 stale"
+        else:
+            health = "🟢 healthy"
+        queue = shard.get("queue", {})
+        rows.append({
+            "Shard": name,
+            "Health": health,
+            "Status": shard.get("status", ""),
+            "Mailbox": process.get("query") or process.get("mailbox", ""),
+            "PID": process.get("pid", shard.get("pid")),
+            "Last Seen (s)": round(age) if age is not None else None,
+            "Processed": shard.get("processed", 0),
+            "Pending": queue.get("PENDING", 0),
+            "Dead": queue.get("DEAD", 0),
+            "Restarts": process.get("restarts", 0)
+        })
+    return rows
+
+# Auto-refresh: only this fragment reruns on the timer, and it never blocks the first render
+@st.fragment(run_every=refresh_seconds)
+def live_view():
+    sync_state()
+    state = st.session_state.summary
+    aggregates = state.get("aggregates", {})
+    st.caption(f"Bot: {state.get('status', 'Unknown')}")
+
+    # Metrics
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        st.metric("Total Processed", aggregates.get("total_processed", 0))
+
+    with col2:
+        st.metric("Proceeded", aggregates.get("proceeded", 0), delta_color="normal")
+
+    with col3:
+        st.metric("Rejected", aggregates.get("rejected", 0), delta_color="inverse")
+
+    with col4:
+        avg_score = aggregates.get("average_score", 0)
+        st.metric("Avg Score", f"{avg_score:.1f}", help=f"Std dev {aggregates.get('score_std', 0):.1f}")
+
+    st.divider()
+
+    # Two column layout
+    col_left, col_right = st.columns([1, 1])
+
+    with col_left:
+        st.subheader("📋 Recent Logs")
+        logs = st.session_state.logs
+        
+        if logs:
+            # Show last 10 logs
+            for log in logs[-10:]:
+                timestamp = log.get("timestamp", "")
+                message = log.get("message", "")
+                if log.get("shard"):
+                    message = f"[{log['shard']}] {message}"
+                level = log.get("level", "INFO")
                 
-                # Skills
-                skills = candidate.get('skills', [])
-                if skills:
-                    st.write(f"**Skills:** {', '.join(skills[:10])}")
-    else:
-        st.info("No candidates processed yet.")
+                if level == "ERROR":
+                    st.error(f"[{timestamp}] {message}")
+                elif level == "WARNING":
+                    st.warning(f"[{timestamp}] {message}")
+                elif level == "SUCCESS":
+                    st.success(f"[{timestamp}] {message}")
+                else:
+                    st.info(f"[{timestamp}] {message}")
+        else:
+            st.info("No logs yet. Start the bot to begin processing.")
+
+    with col_right:
+        st.subheader("👥 Recent Candidates")
+        candidates = list(st.session_state.candidates.items())
+        
+        if candidates:
+            for cid, candidate in candidates[-5:]:
+                with st.expander(f"📧 {candidate.get('name', 'Unknown')} - Score: {candidate.get('score', 0):.1f}"):
+                    st.write(f"**Email:** {candidate.get('email', 'N/A')}")
+                    st.write(f"**Experience:** {candidate.get('experience', 0)} years")
+                    st.write(f"**Decision:** {candidate.get('decision', 'N/A')}")
+                    st.write(f"**Reply:** {candidate.get('reply_status', 'N/A')}")
+                    if candidate.get('degradation_level'):
+                        st.write(f"**Degraded:** level {candidate['degradation_level']} (screened under backlog)")
+                    usage = candidate.get('usage') or {}
+                    if usage.get('calls'):
+                        st.write(f"**Model compute:** {usage['compute_ms'] / 1000:.1f}s over {usage['calls']} calls "
+                                 f"({usage['prompt_tokens']} prompt + {usage['completion_tokens']} generated tokens)")
+                    
+                    # Score breakdown
+                    breakdown = candidate.get('breakdown', {})
+                    if breakdown:
+                        st.write("**Score Breakdown:**")
+                        st.plotly_chart(candidate_chart(cid, breakdown), use_container_width=True,
+                                        key=f"chart_{cid}")
+                    
+                    # Skills
+                    skills = candidate.get('skills', [])
+                    if skills:
+                        st.write(f"**Skills:** {', '.join(skills[:10])}")
+        else:
+            st.info("No candidates processed yet.")
+
+    shards = state.get("shards", {})
+    if shards:
+        st.subheader("🧩 Shards")
+        st.dataframe(shard_rows(shards), hide_index=True, use_container_width=True)
+        for name, shard in sorted(shards.items()):
+            if shard.get("metrics") or shard.get("queue"):
+                with st.expander(f"⚙️ {name} Metrics"):
+                    st.json({"queue": shard.get("queue", {}), **shard.get("metrics", {})}, expanded=False)
+
+    metrics = state.get("metrics", {})
+    if metrics or state.get("queue"):
+        with st.expander("⚙️ System Metrics"):
+            if state.get("queue"):
+                st.write("**Work Queue**")
+                st.json(state["queue"], expanded=False)
+            for name, values in metrics.items():
+                st.write(f"**{name.replace('_', ' ').title()}**")
+                st.json(values, expanded=False)
+
+    if aggregates.get("total_processed"):
+        st.divider()
+        st.subheader("📊 Score Distribution")
+        col_hist, col_rollup = st.columns([1, 1])
+
+        with col_hist:
+            component = st.selectbox("Component", list(HISTOGRAM_LABELS), format_func=HISTOGRAM_LABELS.get)
+            st.plotly_chart(histogram_chart(component, aggregates["histograms"][component]),
+                            use_container_width=True, key="histogram")
+
+        with col_rollup:
+            st.write("**By Role**")
+            st.dataframe(rollup_rows(aggregates.get("roles", {}), "Role"), hide_index=True)
+            st.write("**By Day**")
+            st.dataframe(rollup_rows(aggregates.get("days", {}), "Day")[::-1], hide_index=True)
+
+live_view()
 
 st.divider()
 
@@ -0,0 +1,164 @@
+import hashlib
+import random
+import re
+import sqlite3
+import struct
+import threading
+import time
+from typing import List, Optional
+from pydantic import BaseModel
+from models import ResumeData, ATSScore
+
+DEDUP_FILE = "dedup_index.db"
+
+# Mersenne prime used for the universal hash family (a * x + b) mod p
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+class DuplicateMatch(BaseModel):
+    resume_id: str
+    similarity: float
+    source: Optional[str] = None
+    resume: ResumeData
+    score: Optional[ATSScore] = None
+
+
+class DuplicateIndex:
+    """
+    Near-duplicate resume detection with MinHash signatures and a banded LSH index.
+
+    Resumes are shingled into word 3-grams, summarised as `num_perm` MinHash values
+    and split into `bands` bands. Two resumes that share any band bucket are
+    candidates; they count as duplicates when the estimated Jaccard similarity of
+    their signatures is at least `threshold`. The index lives in SQLite so it
+    persists across runs, and stores each resume's extracted data and score for reuse.
+    """
+
+    def __init__(self, db_path: str = DEDUP_FILE, threshold: float = 0.8,
+                 num_perm: int = 128, bands: int = 16, shingle_size: int = 3):
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.db_path = db_path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = random.Random(1729)  # fixed seed: signatures must be comparable across runs
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self._local = threading.local()
+        self._init_db()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS resumes (
+                resume_id TEXT PRIMARY KEY,
+                signature BLOB NOT NULL,
+                source TEXT,
+                jd_hash TEXT,
+                resume_json TEXT NOT NULL,
+                score_json TEXT,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS lsh_buckets (
+                bucket INTEGER NOT NULL,
+                resume_id TEXT NOT NULL,
+                PRIMARY KEY (bucket, resume_id)
+            ) WITHOUT ROWID;
+        """)
+
+    @staticmethod
+    def text_id(text: str) -> str:
+        """Stable ID for an exact resume text; resubmitting the identical file maps to the same entry."""
+        return hashlib.sha1(text.encode("utf-8", "ignore")).hexdigest()[:16]
+
+    def _shingles(self, text: str) -> set:
+        tokens = re.findall(r"[a-z0-9+#]+", text.lower())
+        k = self.shingle_size
+        if len(tokens) < k:
+            return {" ".join(tokens)} if tokens else set()
+        return {" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+
+    def signature(self, text: str) -> List[int]:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little")
+            for s in self._shingles(text)
+        ]
+        if not hashes:
+            return [_MAX_HASH] * self.num_perm
+        return [min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH for a, b in self._perms]
+
+    def _band_buckets(self, signature: List[int]) -> List[int]:
+        # The band number is hashed in, so one indexed key column serves every band
+        buckets = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(struct.pack(f"<I{self.rows}I", band, *chunk), digest_size=8).digest()
+            buckets.append(int.from_bytes(digest, "little", signed=True))
+        return buckets
+
+    @staticmethod
+    def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+        """Estimated Jaccard similarity: fraction of MinHash slots that agree."""
+        return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+    def find(self, signature: List[int], jd_hash: Optional[str] = None) -> Optional[DuplicateMatch]:
+        """
+        Returns the most similar indexed resume above the threshold, or None.
+        The stored score is only returned if it was computed against the same JD.
+        """
+        buckets = self._band_buckets(signature)
+        placeholders = ",".join("?" for _ in buckets)
+        conn = self._conn()
+        candidate_ids = [row[0] for row in conn.execute(
+            f"SELECT DISTINCT resume_id FROM lsh_buckets WHERE bucket IN ({placeholders})", buckets)]
+        if not candidate_ids:
+            return None
+
+        best = None
+        best_sim = self.threshold
+        id_marks = ",".join("?" for _ in candidate_ids)
+        for row in conn.execute(
+                f"SELECT resume_id, signature, source, jd_hash, resume_json, score_json "
+                f"FROM resumes WHERE resume_id IN ({id_marks})", candidate_ids):
+            stored = list(struct.unpack(f"<{self.num_perm}I", row[1]))
+            sim = self.similarity(signature, stored)
+            if sim >= best_sim:
+                best, best_sim = row, sim
+
+        if best is None:
+            return None
+        resume_id, _, source, stored_jd, resume_json, score_json = best
+        score = None
+        if score_json and jd_hash is not None and stored_jd == jd_hash:
+            score = ATSScore.model_validate_json(score_json)
+        return DuplicateMatch(
+            resume_id=resume_id,
+            similarity=round(best_sim, 3),
+            source=source,
+            resume=ResumeData.model_validate_json(resume_json),
+            score=score
+        )
+
+    def add(self, resume_id: str, signature: List[int], resume: ResumeData,
+            score: Optional[ATSScore] = None, jd_hash: Optional[str] = None, source: Optional[str] = None):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM lsh_buckets WHERE resume_id = ?", (resume_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO resumes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (resume_id, struct.pack(f"<{self.num_perm}I", *signature), source, jd_hash,
+                 resume.model_dump_json(), score.model_dump_json() if score else None, time.time()))
+            conn.executemany(
+                "INSERT OR IGNORE INTO lsh_buckets VALUES (?, ?)",
+                [(bucket, resume_id) for bucket in self._band_buckets(signature)])
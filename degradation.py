@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+from termcolor import colored
+from state_manager import StateManager
+
+# Resume text sent for structuring once context is shortened (4000 at full quality)
+SHORT_RESUME_CHARS = 1500
+
+# Pressure (latency or projected wait over the SLO) that triggers a step down, and below which we step back up
+DEGRADE_ABOVE = 1.0
+RECOVER_BELOW = 0.5
+
+
+def degradation_levels(small_model: Optional[str] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Cheapening steps in the order they are applied. Each level keeps the
+    settings of the levels before it. Without a small model to route to, that
+    level is left out.
+    """
+    levels = [
+        ("full", {}),
+        ("short_context", {"resume_chars": SHORT_RESUME_CHARS}),
+        ("small_model", {"model": small_model}),
+        ("local_scoring", {"local_scoring": True}),
+        ("template_email", {"template_email": True}),
+    ]
+    return [(name, settings) for name, settings in levels if name != "small_model" or small_model]
+
+
+class DegradationController:
+    """
+    Trades screening quality for latency when the inbox backs up.
+
+    Completed jobs report their end-to-end latency (enqueue to done) and
+    service time. Pressure is the larger of the recent p90 latency and the
+    projected queue wait (backlog x mean service time / workers), both over the
+    SLO. Latency only counts jobs enqueued since the last level change: jobs
+    that sat through an earlier backlog would otherwise keep the bot degraded
+    long after that backlog drained. Above DEGRADE_ABOVE the controller steps down one level, below
+    RECOVER_BELOW it steps back up, at most once per `cooldown` seconds, so a
+    level's effect on throughput shows before the next change.
+    """
+
+    def __init__(self, slo_seconds: float, workers: int = 1, small_model: Optional[str] = None,
+                 cooldown: float = 30.0, window: int = 20, max_sample_age: float = 300.0,
+                 state: Optional[StateManager] = None):
+        self.slo_seconds = slo_seconds
+        self.workers = max(1, workers)
+        self.levels = degradation_levels(small_model)
+        self.cooldown = cooldown
+        self.max_sample_age = max_sample_age
+        self.state = state or StateManager()
+        self.level = 0
+        self._samples = deque(maxlen=window)  # (finished_at, enqueued_at, service_time)
+        self._changed_at = 0.0
+        self._pressure = 0.0
+        self._backlog = 0
+        self._changes = 0
+        self._lock = threading.Lock()
+
+    def settings(self) -> Dict[str, Any]:
+        """Cumulative settings of the current level, for one job's config."""
+        with self._lock:
+            level = self.level
+        merged: Dict[str, Any] = {"degradation_level": level, "degradation": self.levels[level][0]}
+        for _, settings in self.levels[1:level + 1]:
+            merged.update(settings)
+        return merged
+
+    def observe(self, enqueued_at: float, service_time: float):
+        with self._lock:
+            self._samples.append((time.time(), enqueued_at, service_time))
+
+    def _recent(self) -> List[Tuple[float, float, float]]:
+        cutoff = time.time() - self.max_sample_age
+        return [s for s in self._samples if s[0] >= cutoff]
+
+    def _p90_latency(self, recent: List[Tuple[float, float, float]]) -> Optional[float]:
+        latencies = sorted(done - enqueued for done, enqueued, _ in recent if enqueued >= self._changed_at)
+        return latencies[int(0.9 * (len(latencies) - 1))] if latencies else None
+
+    def update(self, backlog: int) -> int:
+        """Re-evaluates pressure against the SLO for the current backlog. Returns the level."""
+        with self._lock:
+            recent = self._recent()
+            p90 = self._p90_latency(recent) or 0.0
+            service = sum(s[2] for s in recent) / len(recent) if recent else 0.0
+            projected_wait = backlog * service / self.workers
+            self._pressure = max(p90, projected_wait) / self.slo_seconds
+            self._backlog = backlog
+
+            now = time.time()
+            if now - self._changed_at < self.cooldown:
+                return self.level
+            previous = self.level
+            if self._pressure > DEGRADE_ABOVE and self.level < len(self.levels) - 1:
+                self.level += 1
+            elif self._pressure < RECOVER_BELOW and self.level > 0:
+                self.level -= 1
+            if self.level == previous:
+                return self.level
+            self._changed_at = now
+            self._changes += 1
+            level = self.level
+
+        name = self.levels[level][0]
+        verb = "Degrading" if level > previous else "Recovering"
+        message = (f"{verb} to level {level} ({name}): backlog {backlog}, p90 latency {p90:.0f}s, "
+                   f"projected wait {projected_wait:.0f}s vs SLO {self.slo_seconds:.0f}s")
+        print(colored(f"\n{message}", "yellow" if level > previous else "green"))
+        self.state.log_activity(message, level="WARNING" if level > previous else "SUCCESS")
+        return level
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            p90 = self._p90_latency(self._recent())
+            return {
+                "level": self.level,
+                "name": self.levels[self.level][0],
+                "pressure": round(self._pressure, 2),
+                "backlog": self._backlog,
+                "slo_seconds": self.slo_seconds,
+                "p90_latency_s": round(p90, 1) if p90 is not None else None,
+                "level_changes": self._changes
+            }
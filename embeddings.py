@@ -0,0 +1,182 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Tuple
+import numpy as np
+from models import JobDescription, ResumeData
+from llm_client import LLMClient
+
+EMBEDDING_CACHE_FILE = "embedding_cache.db"
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class EmbeddingCache:
+    """Persistent SQLite cache of embedding vectors keyed by (model, normalized text)."""
+
+    def __init__(self, db_path: str = EMBEDDING_CACHE_FILE):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._conn().execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (model, text)
+            ) WITHOUT ROWID
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        conn = self._conn()
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(texts), 500):
+            chunk = texts[i:i + 500]
+            marks = ",".join("?" for _ in chunk)
+            for text, blob in conn.execute(
+                    f"SELECT text, vector FROM embeddings WHERE model = ? AND text IN ({marks})", [model] + chunk):
+                found[text] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, np.ndarray]):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                [(model, text, np.asarray(vec, dtype=np.float32).tobytes(), now) for text, vec in vectors.items()])
+
+
+class Embedder:
+    """
+    Turns strings into unit-length embedding rows. Texts are normalized, looked
+    up in the cache, and only the misses are sent to Ollama, in batches, so
+    each distinct skill string is embedded once across the whole history.
+    """
+
+    def __init__(self, llm_client: LLMClient, cache: EmbeddingCache, batch_size: int = 64):
+        self.llm = llm_client
+        self.cache = cache
+        self.batch_size = batch_size
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        keys = [normalize_text(t) for t in texts]
+        unique = list(dict.fromkeys(k for k in keys if k))
+        model = self.llm.embedding_model
+        vectors = self.cache.get_many(model, unique)
+
+        missing = [k for k in unique if k not in vectors]
+        if vectors and self.llm.usage:
+            self.llm.usage.record("embed", model, cache="hit", items=len(vectors))
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            fresh = {
+                text: np.asarray(vec, dtype=np.float32)
+                for text, vec in zip(batch, self.llm.embed(batch))
+            }
+            for text, vec in fresh.items():
+                norm = np.linalg.norm(vec)
+                fresh[text] = vec / norm if norm else vec
+            self.cache.put_many(model, fresh)
+            vectors.update(fresh)
+
+        if not vectors:
+            return np.zeros((len(keys), 0), dtype=np.float32)
+        dim = len(next(iter(vectors.values())))
+        zero = np.zeros(dim, dtype=np.float32)
+        return np.vstack([vectors.get(k, zero) for k in keys]) if keys else np.zeros((0, dim), dtype=np.float32)
+
+
+class JDIndex:
+    """Embedding matrix of one JobDescription's skills, keywords and role (the education anchor)."""
+
+    def __init__(self, jd: JobDescription, embedder: Embedder, preferred_weight: float = 0.5):
+        self.skills = jd.mandatory_skills + jd.preferred_skills
+        self.skill_weights = np.array(
+            [1.0] * len(jd.mandatory_skills) + [preferred_weight] * len(jd.preferred_skills), dtype=np.float32)
+        self.keywords = jd.keywords + jd.responsibilities
+        terms = self.skills + self.keywords + [jd.role_title]
+        self.matrix = embedder.embed(terms)
+        self.n_skills = len(self.skills)
+        self.n_keywords = len(self.keywords)
+
+
+class SemanticSkillMatcher:
+    """
+    Cosine-similarity scorer for skills and keywords.
+
+    For a batch of resumes, every resume term (skills, projects, certifications,
+    education) is stacked into one matrix and multiplied once against the JD
+    index. Each JD term takes its best-matching similarity within each resume,
+    mapped linearly from `low` (no credit) to `high` (full credit).
+    """
+
+    def __init__(self, embedder: Embedder, low: float = 0.55, high: float = 0.85):
+        self.embedder = embedder
+        self.low = low
+        self.high = high
+        self._indexes: Dict[str, JDIndex] = {}
+
+    def index_for(self, jd: JobDescription) -> JDIndex:
+        key = hashlib.sha256(jd.model_dump_json().encode()).hexdigest()
+        if key not in self._indexes:
+            self._indexes[key] = JDIndex(jd, self.embedder)
+        return self._indexes[key]
+
+    def _credit(self, sim: np.ndarray) -> np.ndarray:
+        return np.clip((sim - self.low) / (self.high - self.low), 0.0, 1.0)
+
+    def score_batch(self, jd: JobDescription, resumes: List[ResumeData]) -> List[Tuple[float, float, float]]:
+        """
+        Returns (skill_score, keyword_score, education_match) per resume, each 0-100.
+        education_match is the best similarity of any education entry to the role.
+        """
+        index = self.index_for(jd)
+        terms, owners, is_edu = [], [], []
+        for i, resume in enumerate(resumes):
+            for term in resume.skills + resume.projects + resume.certifications:
+                terms.append(term)
+                owners.append(i)
+                is_edu.append(False)
+            for term in resume.education:
+                terms.append(term)
+                owners.append(i)
+                is_edu.append(True)
+
+        results = [(0.0, 0.0, 0.0)] * len(resumes)
+        if not terms or index.matrix.shape[1] == 0:
+            return results
+
+        # The one matrix multiply: (all resume terms) x (all JD terms)
+        credit = self._credit(self.embedder.embed(terms) @ index.matrix.T)
+        owners = np.asarray(owners)
+        is_edu = np.asarray(is_edu)
+        s, k = index.n_skills, index.n_keywords
+
+        for i in range(len(resumes)):
+            rows = credit[(owners == i) & ~is_edu]
+            edu_rows = credit[(owners == i) & is_edu]
+            skill = keyword = education = 0.0
+            if len(rows):
+                best = rows.max(axis=0)
+                if s:
+                    skill = float(100 * (best[:s] * index.skill_weights).sum() / index.skill_weights.sum())
+                if k:
+                    keyword = float(100 * best[s:s + k].mean())
+            if len(edu_rows):
+                education = float(100 * edu_rows[:, -1].max())
+            results[i] = (round(skill, 1), round(keyword, 1), round(education, 1))
+        return results
@@ -1,18 +1,93 @@
 import os
 import base64
+import json
 import time
 from typing import List, Optional, Dict
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from email.mime.text import MIMEText
 from models import IncomingEmail
+from mail_source import MailSource, MAX_BODY_CHARS, RESUME_EXTENSIONS, attachment_save_path, oversize_reason
+from scheduler import TokenBucket, RateLimitError
+
+# The Google client libraries are imported inside the methods that use them:
+# they take a large share of startup time and many entry points never touch Gmail.
 
 SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
 
-class GmailClient:
-    def __init__(self, credentials_path: str = 'credentials.json', token_path: str = 'token.json'):
+DISCOVERY_CACHE = os.path.join(".cache", "gmail_v1_discovery.json")
+
+# Gmail API surface this client uses; the cached discovery document is pruned to it
+_USED_RESOURCES = {
+    "messages": {"list", "get", "send", "modify"},
+    "attachments": {"get"}
+}
+
+def _schema_refs(node, found: set):
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if ref:
+            found.add(ref)
+        for value in node.values():
+            _schema_refs(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            _schema_refs(value, found)
+
+def _prune_discovery(doc: Dict) -> Dict:
+    """Keeps only the users.messages methods we call and the schemas they reference."""
+    messages = doc["resources"]["users"]["resources"]["messages"]
+    attachments = messages["resources"]["attachments"]
+    pruned_messages = dict(messages, methods={
+        k: v for k, v in messages["methods"].items() if k in _USED_RESOURCES["messages"]
+    }, resources={
+        "attachments": dict(attachments, methods={
+            k: v for k, v in attachments["methods"].items() if k in _USED_RESOURCES["attachments"]
+        })
+    })
+    doc["resources"] = {"users": {"resources": {"messages": pruned_messages}}}
+
+    # Walk $refs transitively so every schema a kept method needs survives
+    needed, pending = set(), set()
+    _schema_refs(doc["resources"], pending)
+    while pending:
+        name = pending.pop()
+        if name in needed or name not in doc.get("schemas", {}):
+            continue
+        needed.add(name)
+        _schema_refs(doc["schemas"][name], pending)
+    doc["schemas"] = {k: v for k, v in doc.get("schemas", {}).items() if k in needed}
+    return doc
+
+def load_discovery_document(cache_path: str = DISCOVERY_CACHE) -> Optional[str]:
+    """
+    Returns the pruned Gmail v1 discovery document, from the local cache when
+    present, otherwise from the copy bundled with googleapiclient (no network).
+    """
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return f.read()
+
+    from googleapiclient.discovery_cache import get_static_doc
+    static_doc = get_static_doc('gmail', 'v1')
+    if not static_doc:
+        return None
+    doc = json.dumps(_prune_discovery(json.loads(static_doc)))
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(doc)
+    os.replace(tmp_path, cache_path)
+    return doc
+
+class GmailClient(MailSource):
+    def __init__(self, credentials_path: str = 'credentials.json', token_path: str = 'token.json',
+                 rate_limiter: Optional[TokenBucket] = None):
+        self.rate_limiter = rate_limiter
+        self.next_page_token = None
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from googleapiclient.discovery import build, build_from_document
+
         self.creds = None
         # Load existing token
         if os.path.exists(token_path):
@@ -26,6 +101,7 @@ class GmailClient:
                 if not os.path.exists(credentials_path):
                     raise FileNotFoundError(f"Missing {credentials_path}. Please download it from Google Cloud Console.")
                 
+                from google_auth_oauthlib.flow import InstalledAppFlow
                 flow = InstalledAppFlow.from_client_secrets_file(credentials_path, SCOPES)
                 # Using fixed port 8080 to avoid redirect_uri_mismatch with Web App credentials
                 self.creds = flow.run_local_server(port=8080)
@@ -34,21 +110,52 @@ class GmailClient:
             with open(token_path, 'w') as token:
                 token.write(self.creds.to_json())
 
-        self.service = build('gmail', 'v1', credentials=self.creds)
+        discovery_doc = load_discovery_document()
+        if discovery_doc:
+            self.service = build_from_document(discovery_doc, credentials=self.creds)
+        else:
+            self.service = build('gmail', 'v1', credentials=self.creds)
+
+    def _execute(self, method: str, request):
+        """
+        Executes a Gmail API request after charging its quota cost to the rate
+        limiter. Rate-limit responses are raised as RateLimitError.
+        """
+        from googleapiclient.errors import HttpError
+        if self.rate_limiter:
+            self.rate_limiter.acquire(method)
+        try:
+            return request.execute()
+        except HttpError as e:
+            status = e.resp.status
+            if status == 429 or (status == 403 and 'ratelimitexceeded' in str(e).lower()):
+                retry_after = e.resp.get('retry-after')
+                raise RateLimitError(f"Gmail rate limit on {method}: {e}",
+                                     float(retry_after) if retry_after and retry_after.isdigit() else None)
+            raise
 
-    def fetch_unread_emails(self) -> List[Dict]:
+    def fetch_unread_emails(self, page_token: Optional[str] = None, max_results: int = 100,
+                            query: str = '') -> List[Dict]:
         """
-        Returns a list of message objects (id, threadId) for UNREAD emails.
+        Returns a list of message objects (id, threadId) for one page of UNREAD emails.
+        `next_page_token` is set when more pages are waiting (a backlog).
+        `query` narrows the search (e.g. "label:engineering") to partition a mailbox.
         """
-        results = self.service.users().messages().list(userId='me', labelIds=['UNREAD'], q='').execute()
+        results = self._execute('messages.list', self.service.users().messages().list(
+            userId='me', labelIds=['UNREAD'], q=query, maxResults=max_results, pageToken=page_token))
+        self.next_page_token = results.get('nextPageToken')
         messages = results.get('messages', [])
         return messages
 
-    def get_email_details(self, msg_id: str, download_dir: str = "temp") -> Optional[IncomingEmail]:
+    def get_email_details(self, msg_id: str, download_dir: str = "temp",
+                          max_attachment_bytes: Optional[int] = None) -> Optional[IncomingEmail]:
         """
         Fetches full email content and downloads attachments.
+        Attachments larger than `max_attachment_bytes` are never downloaded; the
+        email comes back with `attachment_rejected` set instead. Saved files are
+        prefixed with the message ID so same-named resumes never overwrite each other.
         """
-        msg = self.service.users().messages().get(userId='me', id=msg_id).execute()
+        msg = self._execute('messages.get', self.service.users().messages().get(userId='me', id=msg_id))
         payload = msg['payload']
         headers = payload['headers']
 
@@ -75,8 +182,11 @@ class GmailClient:
             if data:
                 body_text = base64.urlsafe_b64decode(data).decode()
 
+        body_text = body_text[:MAX_BODY_CHARS]
+
         # Handle Attachments
         attachment_path = None
+        attachment_rejected = None
         if 'parts' in payload:
             for part in payload['parts']:
                 if part.get('filename') and part.get('body') and part.get('body').get('attachmentId'):
@@ -85,17 +195,24 @@ class GmailClient:
                     
                     # Look for Resume-like files
                     ext = os.path.splitext(filename)[1].lower()
-                    if ext in ['.pdf', '.docx', '.doc']:
-                        att = self.service.users().messages().attachments().get(
-                            userId='me', messageId=msg_id, id=att_id).execute()
-                        data = base64.urlsafe_b64decode(att['data'])
+                    if ext in RESUME_EXTENSIONS:
+                        attachment_rejected = oversize_reason(filename, part['body'].get('size', 0),
+                                                              max_attachment_bytes)
+                        if attachment_rejected:
+                            print(f"Skipped attachment: {attachment_rejected}")
+                            break
+
+                        att = self._execute('messages.attachments.get', self.service.users().messages().attachments().get(
+                            userId='me', messageId=msg_id, id=att_id))
+                        data = base64.urlsafe_b64decode(att.pop('data'))
                         
                         if not os.path.exists(download_dir):
                             os.makedirs(download_dir)
                             
-                        save_path = os.path.join(download_dir, filename)
+                        save_path = attachment_save_path(download_dir, msg_id, filename)
                         with open(save_path, 'wb') as f:
                             f.write(data)
+                        del data
                         
                         attachment_path = save_path
                         print(f"Downloaded attachment: {save_path}")
@@ -105,22 +222,25 @@ class GmailClient:
             sender_email=sender,
             subject=subject,
             body_text=body_text,
-            attachment_path=attachment_path
+            attachment_path=attachment_path,
+            attachment_rejected=attachment_rejected
         )
 
-    def send_reply(self, to_email: str, subject: str, body: str):
+    def send_reply(self, to_email: str, subject: str, body: str) -> str:
+        """
+        Sends a reply and returns the Gmail message ID. Errors propagate so the
+        caller can retry instead of losing the reply.
+        """
         message = MIMEText(body)
         message['to'] = to_email
         message['subject'] = subject
         raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
         
-        try:
-            self.service.users().messages().send(userId='me', body={'raw': raw}).execute()
-            print(f"Reply sent to {to_email}")
-        except Exception as e:
-            print(f"Error sending email: {e}")
+        sent = self._execute('messages.send', self.service.users().messages().send(userId='me', body={'raw': raw}))
+        print(f"Reply sent to {to_email}")
+        return sent.get('id')
 
     def mark_as_read(self, msg_id: str):
-        self.service.users().messages().modify(
-            userId='me', id=msg_id, body={'removeLabelIds': ['UNREAD']}).execute()
+        self._execute('messages.modify', self.service.users().messages().modify(
+            userId='me', id=msg_id, body={'removeLabelIds': ['UNREAD']}))
         print(f"Marked message {msg_id} as READ")
@@ -0,0 +1,78 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Cold-import budgets in milliseconds (best of several runs) and modules that
+# must stay lazily imported on each entry point's startup path.
+BUDGETS = {
+    "main": {
+        "budget_ms": 300,
+        "forbidden": ["googleapiclient", "google_auth_oauthlib", "pypdf", "docx", "numpy", "requests"]
+    },
+    "dashboard": {
+        "budget_ms": 1200,
+        "forbidden": ["googleapiclient", "google_auth_oauthlib", "pypdf", "docx", "realtime_bot", "gmail_client"]
+    }
+}
+
+
+def measure(module: str) -> Tuple[float, List[str]]:
+    """
+    Imports `module` in a fresh interpreter under `python -X importtime` and
+    returns its cumulative import time (ms) and every module that got imported.
+    Runs from a scratch directory so entry points don't write state into the repo.
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    with tempfile.TemporaryDirectory() as scratch:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=scratch, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    total_us = None
+    imported = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        imported.append(name.strip())
+        if name.strip() == module and not name.startswith("  "):
+            total_us = int(parts[1])
+    return (total_us or 0) / 1000.0, imported
+
+
+def check(targets: Dict[str, Dict], runs: int = 3) -> bool:
+    ok = True
+    for module, spec in targets.items():
+        best_ms, imported = min((measure(module) for _ in range(runs)), key=lambda r: r[0])
+        roots = {name.split(".")[0] for name in imported}
+        leaked = [m for m in spec["forbidden"] if m in roots]
+        within = best_ms <= spec["budget_ms"]
+        status = "OK" if within and not leaked else "FAIL"
+        print(f"[{status}] {module}: {best_ms:.0f} ms (budget {spec['budget_ms']} ms)")
+        if leaked:
+            print(f"       eagerly imported: {', '.join(leaked)}")
+        ok = ok and within and not leaked
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when cold startup of main.py or the dashboard regresses")
+    parser.add_argument("--runs", type=int, default=3, help="Measurements per entry point (best is kept)")
+    parser.add_argument("--only", choices=list(BUDGETS), help="Check a single entry point")
+    args = parser.parse_args()
+
+    targets = {args.only: BUDGETS[args.only]} if args.only else BUDGETS
+    sys.exit(0 if check(targets, args.runs) else 1)
+
+if __name__ == "__main__":
+    main()
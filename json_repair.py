@@ -0,0 +1,343 @@
+import json
+import re
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Iterator, List, Tuple, Type, TypeVar
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+T = TypeVar('T', bound=BaseModel)
+
+# Keys a model emits when it echoes the JSON schema instead of filling it in
+SCHEMA_KEYS = {"title", "type", "properties", "required", "$defs", "definitions"}
+
+_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_BARE = re.compile(r'[^\s,:{}\[\]"\']+')
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', '/': '/', '\\': '\\', '"': '"', "'": "'"}
+_DELIMITERS = set(' \t\r\n,:}]/')
+_MISSING = object()
+
+
+class JSONRepairError(ValueError):
+    """No JSON value in the text validates against the requested schema."""
+
+    def __init__(self, message: str, candidates: List[Any], truncated: bool = False):
+        super().__init__(message)
+        self.candidates = candidates
+        self.truncated = truncated
+
+
+class _LenientParser:
+    """
+    Single-pass, forgiving JSON reader. Besides strict JSON it accepts single
+    quotes, trailing or doubled commas, // and /* */ comments, bare keys, Python
+    literals (True/False/None) and input that stops mid-value: open strings,
+    objects and arrays are closed at end of input and incomplete pairs dropped.
+    A number or bare word running into end of input counts as incomplete,
+    since its remaining digits or letters may simply be missing.
+
+    `truncated` is set when input ended before the value did. `lost` is set
+    when that may have cost data: a string, number or word was cut off, a pair
+    dropped, or a nested object or array closed early (the top-level one only
+    misses its closing bracket; which of its fields never arrived is for the
+    caller to judge).
+    """
+
+    def __init__(self, text: str, pos: int = 0):
+        self.text = text
+        self.pos = pos
+        self.n = len(text)
+        self.depth = 0
+        self.truncated = False
+        self.lost = False
+
+    def _cut(self, lost: bool = True):
+        self.truncated = True
+        self.lost = self.lost or lost
+
+    def _skip(self):
+        text, n = self.text, self.n
+        while self.pos < n:
+            c = text[self.pos]
+            if c.isspace():
+                self.pos += 1
+            elif text.startswith("//", self.pos):
+                end = text.find("\n", self.pos)
+                self.pos = n if end == -1 else end + 1
+            elif text.startswith("/*", self.pos):
+                end = text.find("*/", self.pos + 2)
+                self.pos = n if end == -1 else end + 2
+            else:
+                break
+
+    def value(self) -> Any:
+        self._skip()
+        if self.pos >= self.n:
+            self._cut()
+            return _MISSING
+        c = self.text[self.pos]
+        if c in '{[':
+            self.depth += 1
+            try:
+                return self._object() if c == '{' else self._array()
+            finally:
+                self.depth -= 1
+        if c in '"\'':
+            return self._string(c)
+        match = _NUMBER.match(self.text, self.pos)
+        if match and (match.end() == self.n or self.text[match.end()] in _DELIMITERS):
+            self.pos = match.end()
+            if self.pos >= self.n:
+                self._cut()
+                return _MISSING  # "7" may be the start of "75": never trust a number cut off by truncation
+            token = match.group().lstrip('+')
+            if token.endswith('.'):
+                token = token[:-1]
+            try:
+                return int(token) if re.fullmatch(r'-?\d+', token) else float(token)
+            except ValueError:
+                return float(token.split('e')[0].split('E')[0])
+        match = _BARE.match(self.text, self.pos)
+        if not match:
+            # Stray delimiter (e.g. ':' or ']' where a value belongs)
+            self.pos += 1
+            return None
+        self.pos = match.end()
+        token = match.group()
+        if token in _LITERALS:
+            return _LITERALS[token]
+        if self.pos >= self.n:
+            self._cut()
+            return _MISSING  # literal or bare word cut off by truncation
+        return token
+
+    def _string(self, quote: str) -> str:
+        text, n = self.text, self.n
+        self.pos += 1
+        out = []
+        while self.pos < n:
+            c = text[self.pos]
+            if c == quote:
+                self.pos += 1
+                return "".join(out)
+            if c == '\\' and self.pos + 1 < n:
+                esc = text[self.pos + 1]
+                if esc == 'u' and re.fullmatch(r'[0-9a-fA-F]{4}', text[self.pos + 2:self.pos + 6]):
+                    out.append(chr(int(text[self.pos + 2:self.pos + 6], 16)))
+                    self.pos += 6
+                    continue
+                out.append(_ESCAPES.get(esc, esc))
+                self.pos += 2
+                continue
+            out.append(c)
+            self.pos += 1
+        self._cut()
+        return "".join(out)  # unterminated: keep what arrived
+
+    def _object(self) -> dict:
+        self.pos += 1
+        obj = {}
+        while True:
+            self._skip()
+            if self.pos >= self.n:
+                self._cut(lost=self.depth > 1)
+                return obj
+            c = self.text[self.pos]
+            if c == '}':
+                self.pos += 1
+                return obj
+            if c == ',':
+                self.pos += 1
+                continue
+            if c == ']':
+                # mismatched bracket: treat as the end of this object
+                self.pos += 1
+                return obj
+            key = self.value()
+            if key is _MISSING:
+                return obj
+            self._skip()
+            if self.pos >= self.n:
+                self._cut()
+                return obj
+            if self.text[self.pos] not in ':=':
+                continue  # key without a value, e.g. {scratch}
+            self.pos += 1
+            val = self.value()
+            if val is _MISSING:
+                return obj
+            if not isinstance(key, (dict, list)):
+                obj[str(key)] = val
+
+    def _array(self) -> list:
+        self.pos += 1
+        arr = []
+        while True:
+            self._skip()
+            if self.pos >= self.n:
+                self._cut(lost=self.depth > 1)
+                return arr
+            c = self.text[self.pos]
+            if c in ']}':
+                self.pos += 1
+                return arr
+            if c == ',':
+                self.pos += 1
+                continue
+            val = self.value()
+            if val is _MISSING:
+                return arr
+            arr.append(val)
+
+
+def _iter_parsed(text: str) -> Iterator[Tuple[Any, "_LenientParser"]]:
+    """iter_json_values, paired with the parser that read each value (None for strict JSON)."""
+    stripped = text.strip()
+    if stripped[:1] in ('{', '['):
+        try:
+            yield json.loads(stripped), None
+            return
+        except ValueError:
+            pass
+
+    pos = 0
+    while True:
+        starts = [i for i in (text.find('{', pos), text.find('[', pos)) if i != -1]
+        if not starts:
+            return
+        start = min(starts)
+        parser = _LenientParser(text, start)
+        value = parser.value()
+        if isinstance(value, (dict, list)) and value:
+            yield value, parser
+            pos = parser.pos
+        else:
+            pos = start + 1
+
+
+def iter_json_values(text: str) -> Iterator[Any]:
+    """
+    Yields every top-level JSON object or array found in `text`, in order.
+    Surrounding prose and markdown fences are skipped. Strict JSON takes the
+    fast path; everything else goes through the lenient parser.
+    """
+    for value, _ in _iter_parsed(text):
+        yield value
+
+
+def parse_lenient(text: str) -> Tuple[Any, bool]:
+    """
+    Returns the first JSON object or array in `text`, repairing it if needed,
+    and whether it was truncated: input ended before the value did, so the
+    repair closed it and any fields that never arrived are simply absent.
+    """
+    for value, parser in _iter_parsed(text):
+        return value, parser is not None and parser.truncated
+    raise JSONRepairError("No JSON object found in LLM output", [])
+
+
+@lru_cache(maxsize=None)
+def validator_for(schema: Type[T]) -> TypeAdapter:
+    """TypeAdapters are costly to build, so each schema gets one, built once."""
+    return TypeAdapter(schema)
+
+
+def is_schema_echo(value: Any) -> bool:
+    """True when the value is only schema metadata, with no extracted data."""
+    return isinstance(value, dict) and (not value or set(value) <= SCHEMA_KEYS)
+
+
+def _reshapings(value: Any, fields: set) -> Iterator[Any]:
+    """
+    Alternative readings of a parsed value, tried in order only after the
+    value fails validation as-is. Covers how small models typically mangle
+    structure: a one-item list, a wrapper key, data nested under "properties",
+    leaked schema keys and {"value": ...} wrappers around scalars.
+    """
+    if isinstance(value, list):
+        for item in value:
+            if isinstance(item, dict):
+                yield item
+                yield from _reshapings(item, fields)
+        return
+    if not isinstance(value, dict):
+        return
+
+    if len(value) == 1:
+        inner = next(iter(value.values()))
+        if isinstance(inner, dict) and not (set(value) & fields):
+            yield inner
+            yield from _reshapings(inner, fields)
+
+    data = dict(value)
+    props = data.get("properties")
+    if isinstance(props, dict) and not (set(data) - SCHEMA_KEYS) and props:
+        first = next(iter(props.values()))
+        # Schema definitions have a "type" but no "value"; anything else is data
+        if not (isinstance(first, dict) and "type" in first and "value" not in first):
+            data = dict(props)
+    for key in SCHEMA_KEYS - fields:
+        data.pop(key, None)
+    data = {k: v["value"] if isinstance(v, dict) and "value" in v and k in fields else v
+            for k, v in data.items()}
+    if data != value:
+        yield data
+
+
+def _field_overlap(value: Any, fields: set) -> int:
+    if isinstance(value, list):
+        return max((_field_overlap(v, fields) for v in value), default=0)
+    if isinstance(value, dict):
+        props = value.get("properties")
+        nested = len(fields & set(props)) if isinstance(props, dict) else 0
+        return max(len(fields & set(value)), nested)
+    return 0
+
+
+def _truncation_loss(shaped: Any, parser: _LenientParser, fields: set) -> List[str]:
+    """What a truncated candidate is missing: its absent schema fields, or a value cut off mid-way."""
+    missing = sorted(fields - set(shaped)) if isinstance(shaped, dict) else sorted(fields)
+    if not missing and parser.lost:
+        missing = ["a value cut off mid-way"]
+    return missing
+
+
+def extract_model(text: str, schema: Type[T]) -> T:
+    """
+    Returns the JSON value in `text` that best matches `schema`, validated.
+    Candidates sharing the most field names with the schema are tried first.
+    Each is validated as-is, then through common reshapings. A truncated
+    candidate only counts if nothing but its closing brackets is missing:
+    one that lost a schema field or a value would otherwise validate on the
+    field defaults. Raises JSONRepairError when nothing validates.
+    """
+    adapter = validator_for(schema)
+    fields = set(schema.model_fields)
+    parsed = list(_iter_parsed(text))
+    candidates = [value for value, _ in parsed]
+    if not candidates:
+        raise JSONRepairError("No JSON object found in LLM output", candidates)
+
+    first_error = None
+    truncation_loss: List[str] = []
+    for candidate, parser in sorted(parsed, key=lambda vp: -_field_overlap(vp[0], fields)):
+        for i, shaped in enumerate(chain([candidate], _reshapings(candidate, fields))):
+            try:
+                result = adapter.validate_python(shaped)
+            except ValidationError as e:
+                if i == 0:
+                    first_error = first_error or e
+                continue
+            loss = _truncation_loss(shaped, parser, fields) if parser is not None and parser.truncated else []
+            if not loss:
+                return result
+            truncation_loss = truncation_loss or loss
+    if all(is_schema_echo(c) for c in candidates):
+        raise JSONRepairError(f"LLM output is the {schema.__name__} schema itself, not data", candidates)
+    if truncation_loss:
+        raise JSONRepairError(f"LLM output for {schema.__name__} was cut off before it was complete; "
+                              f"missing: {', '.join(truncation_loss)}", candidates, truncated=True)
+    problems = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'root'}: {err['msg']}"
+                         for err in first_error.errors(include_url=False))
+    raise JSONRepairError(f"LLM output does not match {schema.__name__}: {problems}", candidates,
+                          truncated=any(parser is not None and parser.truncated for _, parser in parsed))
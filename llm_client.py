@@ -1,134 +1,148 @@
-import requests
 import json
-from typing import Dict, Any, Type, TypeVar
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Type, TypeVar, TYPE_CHECKING
 from pydantic import BaseModel
+from json_repair import extract_model, JSONRepairError
+
+if TYPE_CHECKING:
+    from usage_ledger import UsageLedger
 
 T = TypeVar('T', bound=BaseModel)
 
+# Per-schema extraction outcomes, shared by every client in the process
+_extraction_stats: Dict[str, Dict[str, int]] = {}
+_stats_lock = threading.Lock()
+
+
+class LLMExtractionError(RuntimeError):
+    """The LLM produced no valid object for a schema, even after retries."""
+
+    def __init__(self, schema_name: str, attempts: int, error: str, raw_response: str):
+        super().__init__(f"{schema_name} extraction failed after {attempts} attempts: {error}")
+        self.schema_name = schema_name
+        self.attempts = attempts
+        self.raw_response = raw_response
+
+
+def _record_extraction(schema_name: str, retries: int, ok: bool):
+    with _stats_lock:
+        stats = _extraction_stats.setdefault(schema_name, {"calls": 0, "ok": 0, "retried": 0, "retries": 0, "failed": 0})
+        stats["calls"] += 1
+        stats["retries"] += retries
+        if retries:
+            stats["retried"] += 1
+        stats["ok" if ok else "failed"] += 1
+
+
+def extraction_metrics() -> Dict[str, Dict[str, Any]]:
+    """Per-schema call counts with success, retry and failure rates."""
+    with _stats_lock:
+        return {
+            name: dict(stats,
+                       success_rate=round(stats["ok"] / stats["calls"], 3),
+                       retry_rate=round(stats["retried"] / stats["calls"], 3),
+                       failure_rate=round(stats["failed"] / stats["calls"], 3))
+            for name, stats in _extraction_stats.items()
+        }
+
 class LLMClient:
-    def __init__(self, model_name: str = "mistral", base_url: str = "http://localhost:11434", mock_mode: bool = False):
+    def __init__(self, model_name: str = "mistral", base_url: str = "http://localhost:11434", mock_mode: bool = False,
+                 embedding_model: str = "nomic-embed-text", max_retries: int = 2,
+                 usage: Optional["UsageLedger"] = None):
         self.model_name = model_name
+        self.max_retries = max_retries
         self.base_url = base_url
         self.mock_mode = mock_mode
+        self.embedding_model = embedding_model
+        # Token counts and timings of every Ollama call go here when set
+        self.usage = usage
+        self._route = threading.local()
+
+    @property
+    def active_model(self) -> str:
+        """The chat model for calls made from this thread: a routed override, or model_name."""
+        return getattr(self._route, "model", None) or self.model_name
+
+    @contextmanager
+    def routed(self, model: Optional[str]):
+        """Sends this thread's chat calls to `model` (None keeps the default) inside the block."""
+        previous = getattr(self._route, "model", None)
+        self._route.model = model or previous
+        try:
+            yield self
+        finally:
+            self._route.model = previous
 
     def generate_json(self, prompt: str, schema: Type[T]) -> T:
         """
         Generates a JSON response from the LLM conforming to the Pydantic schema.
+        The schema is sent as Ollama's structured-output `format`, so decoding is
+        constrained to it. Output that still fails validation is retried up to
+        `max_retries` times with the validation error fed back to the model.
+        Raises LLMExtractionError when every attempt fails.
         """
         if self.mock_mode:
             return self._generate_mock(schema)
 
-        schema_json = json.dumps(schema.model_json_schema(), indent=2)
+        json_schema = schema.model_json_schema()
         system_prompt = f"""
 You are an AI assistant that outputs strictly valid JSON.
 Your task is to generate a JSON object that strictly follows this schema:
-{schema_json}
-
-Rules:
-1. Output ONLY the JSON object.
-2. Do NOT output the schema itself.
-3. Do NOT wrap the content in markdown blocks (no ```json).
-4. The root object should contain the fields directly, not nested under "properties".
-5. Do NOT include schema metadata like "type", "title", "default", "items" in the values. Fill them with actual extracted data.
+{json.dumps(json_schema, indent=2)}
+
+Output ONLY the JSON object, filled with the actual extracted data.
 """
 
-        payload = {
-            "model": self.model_name,
-            "prompt": prompt,
-            "system": system_prompt,
-            "stream": False,
-            "format": "json"
-        }
+        import requests
+        attempt_prompt = prompt
+        raw_json = ""
+        for attempt in range(self.max_retries + 1):
+            payload = {
+                "model": self.active_model,
+                "prompt": attempt_prompt,
+                "system": system_prompt,
+                "stream": False,
+                "format": json_schema
+            }
+            try:
+                response = requests.post(f"{self.base_url}/api/generate", json=payload)
+                response.raise_for_status()
+                data = response.json()
+                if self.usage:
+                    self.usage.record("generate", payload["model"], data)
+                raw_json = data.get("response", "")
+            except Exception as e:
+                print(f"Error calling Ollama: {e}")
+                _record_extraction(schema.__name__, attempt, ok=False)
+                raise
 
-        try:
-            response = requests.post(f"{self.base_url}/api/generate", json=payload)
-            response.raise_for_status()
-            result = response.json()
-            raw_json = result.get("response", "")
-            
-            # Basic cleanup if the model adds markdown code blocks
-            if "```json" in raw_json:
-                raw_json = raw_json.split("```json")[1].split("```")[0]
-            elif "```" in raw_json:
-                raw_json = raw_json.split("```")[1].split("```")[0]
-            
-            data = json.loads(raw_json)
-            
-            # Robustness fix: Llama 3.2 often wraps data in "properties" key resembling schema
-            # Robustness fix: Handle various hallucinated JSON structures
-            if isinstance(data, dict):
-                # 1. Nested under "properties" (common schema reflection)
-                if "properties" in data and isinstance(data["properties"], dict):
-                    # Check if the "properties" dict contains the actual data values
-                    # Sometimes LLM puts values INSIDE properties: {"properties": {"field": "value"}}
-                    # Sometimes it puts schemas INSIDE properties: {"properties": {"field": {"type": "string"}}}
-                    # We check if the values start looking like schema definitions (dicts with 'type')
-                    # OR if the top level has the data.
-                    
-                    # Heuristic: If top level has the keys we want (excluding schema keys), use top level.
-                    # Schema keys: title, type, properties, required
-                    schema_keys = {"title", "type", "properties", "required", "$defs", "definitions"}
-                    data_keys = set(data.keys()) - schema_keys
-                    
-                    # If we have substantial data keys at root, just strip schema keys
-                    if data_keys:
-                        for k in schema_keys:
-                            data.pop(k, None)
-                    else:
-                        # Maybe data is inside properties? 
-                        # Check one value in properties
-                        props = data["properties"]
-                        if props:
-                            first_val = next(iter(props.values()))
-                            # It is a schema definition ONLY if it has 'type' AND NO 'value'
-                            # If it has 'value', we treat it as data (wrapped)
-                            is_pure_schema = isinstance(first_val, dict) and "type" in first_val and "value" not in first_val
-                            
-                            if not is_pure_schema:
-                                # It's data (possibly wrapped), so extract it
-                                data = props
-
-                # 2. Strip schema reflection if it leaked into the data
-                data.pop("title", None)
-                data.pop("type", None)
-                data.pop("required", None)
-                data.pop("properties", None)
-
-                # 3. Handle nested "value" keys (e.g. {"field": {"value": 85}})
-                for key, val in list(data.items()):
-                    if isinstance(val, dict) and "value" in val:
-                        # Heuristic: if it has "value", use that.
-                        # But be careful it's not some actual nested dict user wanted.
-                        # Given our models (simple integers/strings mostly), this is safely likely a hallucination.
-                        data[key] = val["value"]
-
-            # Final validation: if data is empty or only has schema keys, the LLM completely failed
-            # This is a last resort - return a default/error object
-            if not data or all(k in {"title", "type", "properties", "required"} for k in data.keys()):
-                print(f"WARNING: LLM returned pure schema with no data. Using fallback defaults.")
-                # Return a minimal valid object based on schema
-                schema_fields = schema.model_json_schema().get("properties", {})
-                data = {}
-                for field_name, field_info in schema_fields.items():
-                    field_type = field_info.get("type")
-                    if field_type == "number":
-                        data[field_name] = 0.0
-                    elif field_type == "integer":
-                        data[field_name] = 0
-                    elif field_type == "string":
-                        data[field_name] = ""
-                    elif field_type == "boolean":
-                        data[field_name] = False
-                    elif field_type == "array":
-                        data[field_name] = []
-                    else:
-                        data[field_name] = None
-
-            return schema.model_validate(data)
-        except Exception as e:
-            print(f"Error calling Ollama or parsing JSON: {e}")
-            print(f"Raw response: {raw_json}") 
-            raise
+            try:
+                result = extract_model(raw_json, schema)
+                _record_extraction(schema.__name__, attempt, ok=True)
+                return result
+            except JSONRepairError as e:
+                error = e
+                print(f"Invalid {schema.__name__} output (attempt {attempt + 1}/{self.max_retries + 1}): {e}")
+                # A truncated object is rejected rather than filled in with field defaults
+                instruction = ("Return the complete JSON object, keeping string values short so it fits."
+                               if e.truncated else
+                               "Return a corrected JSON object with real values for every required field.")
+                attempt_prompt = f"""{prompt}
+
+Your previous response was rejected:
+{raw_json[:1500]}
+
+Validation error:
+{e}
+
+{instruction}
+"""
+
+        _record_extraction(schema.__name__, self.max_retries, ok=False)
+        print(f"Raw response: {raw_json}")
+        raise LLMExtractionError(schema.__name__, self.max_retries + 1, str(error), raw_json)
 
     def _generate_mock(self, schema: Type[T]) -> T:
         schema_name = schema.__name__
@@ -154,6 +168,15 @@ Rules:
                 companies=["Tech Corp", "StartUp Inc"],
                 certifications=[]
             )
+        elif schema_name == "ATSScore":
+            # Matches the mock resume: most mandatory skills, over the experience bar, a relevant degree
+            return schema(
+                skill_score=80.0,
+                experience_score=100.0,
+                keyword_score=75.0,
+                education_score=100.0,
+                final_ats_score=85.0
+            )
         elif schema_name == "DecisionOutput":
             # This logic is usually heuristic in the agent, but if agent asks LLM for decision (it doesn't, it asks logic)
             # Wait, make_decision is in Agent. generate_email calls LLM.
@@ -173,16 +196,53 @@ Rules:
         Generates a text response from the LLM.
         """
         payload = {
-            "model": self.model_name,
+            "model": self.active_model,
             "prompt": prompt,
             "stream": False
         }
 
+        import requests
         try:
             response = requests.post(f"{self.base_url}/api/generate", json=payload)
             response.raise_for_status()
             result = response.json()
+            if self.usage:
+                self.usage.record("generate", payload["model"], result)
             return result.get("response", "")
         except Exception as e:
             print(f"Error calling Ollama: {e}")
             raise
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a batch of texts in one call to Ollama's embeddings endpoint.
+        """
+        if self.mock_mode:
+            return [self._mock_embedding(t) for t in texts]
+
+        payload = {
+            "model": self.embedding_model,
+            "input": texts
+        }
+
+        import requests
+        try:
+            response = requests.post(f"{self.base_url}/api/embed", json=payload)
+            response.raise_for_status()
+            data = response.json()
+            if self.usage:
+                self.usage.record("embed", self.embedding_model, data, items=len(texts))
+            return data["embeddings"]
+        except Exception as e:
+            print(f"Error calling Ollama embeddings: {e}")
+            raise
+
+    @staticmethod
+    def _mock_embedding(text: str, dim: int = 64) -> List[float]:
+        # Hashed character trigrams: similar strings get similar vectors without a model
+        vec = [0.0] * dim
+        padded = f"  {text.lower()} "
+        for i in range(len(padded) - 2):
+            h = int(hashlib.md5(padded[i:i + 3].encode()).hexdigest(), 16)
+            vec[h % dim] += 1.0
+        return vec
@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ProcessPoolExecutor
+from email import message_from_bytes
+from email.header import decode_header, make_header
+from typing import Dict, List, Optional, Tuple, Union
+from models import IncomingEmail
+
+RESUME_EXTENSIONS = ('.pdf', '.docx', '.doc')
+
+# Bodies are stored with the job and sent to the classifier; a few pages is plenty
+MAX_BODY_CHARS = 20000
+
+DRY_RUN_FILE = "dry_run_replies.jsonl"
+DRY_RUN_QUEUE_FILE = "dry_run_queue.db"
+
+
+def dry_run_outbox_path(queue_path: str) -> str:
+    """
+    The outbox a dry run uses alongside `queue_path`. Outbox keys are message
+    IDs, so a replay with a fresh queue needs a fresh outbox too, or every
+    reply would be dropped as already queued.
+    """
+    root, ext = os.path.splitext(queue_path)
+    return f"{root}_outbox{ext or '.db'}"
+
+
+def attachment_save_path(download_dir: str, msg_id: str, filename: str) -> str:
+    # Prefixed with the message ID so same-named resumes never overwrite each other
+    return os.path.join(download_dir, f"{msg_id}_{os.path.basename(filename)}")
+
+
+def oversize_reason(filename: str, size: int, max_attachment_bytes: Optional[int]) -> Optional[str]:
+    if max_attachment_bytes and size > max_attachment_bytes:
+        return f"{filename} is {size / 2**20:.1f} MB, over the {max_attachment_bytes / 2**20:.0f} MB limit"
+    return None
+
+
+class MailSource(ABC):
+    """
+    Where BotService gets applications from and sends replies to.
+
+    `fetch_unread_emails` lists one page of message refs ({"id": ...}) and
+    sets `next_page_token` while more are waiting; `get_email_details` turns
+    an ID into an IncomingEmail with its resume saved under `download_dir`.
+    """
+
+    next_page_token: Optional[str] = None
+
+    @abstractmethod
+    def fetch_unread_emails(self, page_token: Optional[str] = None, max_results: int = 100,
+                            query: str = '') -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def get_email_details(self, msg_id: str, download_dir: str = "temp",
+                          max_attachment_bytes: Optional[int] = None) -> Optional[IncomingEmail]:
+        ...
+
+    @abstractmethod
+    def send_reply(self, to_email: str, subject: str, body: str) -> str:
+        ...
+
+    @abstractmethod
+    def mark_as_read(self, msg_id: str):
+        ...
+
+    def close(self):
+        pass
+
+
+# Where a local message lives: a Maildir file, or (mbox path, start, end) byte offsets
+Locator = Union[str, Tuple[str, int, int]]
+
+
+def _read_raw(locator: Locator) -> bytes:
+    if isinstance(locator, str):
+        with open(locator, 'rb') as f:
+            return f.read()
+    path, start, end = locator
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def _decode(value: Optional[str]) -> str:
+    """Decodes RFC 2047 encoded words ("=?utf-8?b?...?=") in a header value."""
+    if value is None:
+        return ""
+    try:
+        return str(make_header(decode_header(value)))
+    except (LookupError, ValueError, UnicodeDecodeError):
+        return str(value)
+
+
+def parse_local_message(locator: Locator, msg_id: str, download_dir: str,
+                        max_attachment_bytes: Optional[int] = None) -> Dict:
+    """
+    Parses one stored MIME message into IncomingEmail fields, saving its first
+    resume attachment the way GmailClient does. Runs in worker processes, so
+    it takes and returns plain data. Uses the compat32 parser: the modern
+    email API is about 3x slower and a backfill parses every message.
+    """
+    msg = message_from_bytes(_read_raw(locator))
+
+    body_text = "ERROR: Could not parse body"
+    for part in msg.walk():
+        if part.get_content_type() == 'text/plain' and not part.get_filename():
+            data = part.get_payload(decode=True)
+            if data is not None:
+                try:
+                    body_text = data.decode(part.get_content_charset() or 'utf-8', errors='replace')
+                except LookupError:
+                    body_text = data.decode('utf-8', errors='replace')
+                break
+
+    attachment_path = None
+    attachment_rejected = None
+    for part in msg.walk():
+        filename = part.get_filename()
+        if not filename:
+            continue
+        filename = _decode(filename)
+        if os.path.splitext(filename)[1].lower() not in RESUME_EXTENSIONS:
+            continue
+        data = part.get_payload(decode=True) or b''
+        attachment_rejected = oversize_reason(filename, len(data), max_attachment_bytes)
+        if not attachment_rejected:
+            os.makedirs(download_dir, exist_ok=True)
+            attachment_path = attachment_save_path(download_dir, msg_id, filename)
+            with open(attachment_path, 'wb') as f:
+                f.write(data)
+        break  # Only take first resume
+
+    return {
+        "sender_email": _decode(msg.get('From')),
+        "subject": _decode(msg.get('Subject')),
+        "body_text": body_text[:MAX_BODY_CHARS],
+        "attachment_path": attachment_path,
+        "attachment_rejected": attachment_rejected
+    }
+
+
+def _mbox_offsets(path: str) -> List[Tuple[int, int]]:
+    """(start, end) of each message body in an mbox file, "From " separator lines excluded."""
+    offsets = []
+    start = None
+    pos = 0
+    prev_blank = True
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.startswith(b'From ') and prev_blank:
+                if start is not None:
+                    offsets.append((start, pos))
+                start = pos + len(line)
+            prev_blank = line in (b'\n', b'\r\n')
+            pos += len(line)
+    if start is not None:
+        offsets.append((start, pos))
+    return offsets
+
+
+class LocalMailSource(MailSource):
+    """
+    Reads stored mail from a Maildir directory or an mbox file, for backfills
+    and replays through the full pipeline.
+
+    Listing hands out every message not listed before (a rescan picks up
+    newly delivered Maildir files or mbox appends); there is no other notion
+    of unread, and `mark_as_read` does nothing. Replies go to `sink` (a
+    DryRunSink writing DRY_RUN_FILE by default). Messages are parsed in a
+    process pool (`workers`; 0 parses inline): each `get_email_details` call
+    also queues the next `prefetch` listed messages, so parsing and
+    attachment extraction run ahead of the screening workers. One instance is
+    shared by all threads.
+    """
+
+    def __init__(self, path: str, workers: Optional[int] = None, prefetch: int = 64,
+                 sink: Optional["DryRunSink"] = None):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Mail source not found: {path}")
+        self.path = os.path.abspath(path)
+        self.is_maildir = os.path.isdir(path)
+        # One core stays with the bot's own threads; on a single core, parse inline
+        self.workers = (os.cpu_count() or 1) - 1 if workers is None else workers
+        self.prefetch = prefetch
+        self.sink = sink or DryRunSink()
+        self.next_page_token = None
+        self._locators: Dict[str, Locator] = {}
+        self._order: List[str] = []
+        self._position: Dict[str, int] = {}
+        self._listed = 0
+        self._scanned_stamp = None
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        if self.workers > 0:
+            import multiprocessing
+            # spawn: the bot is multi-threaded, and forking a threaded process is unsafe
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _id(self, key: str) -> str:
+        return "local-" + hashlib.sha1(f"{self.path}:{key}".encode()).hexdigest()[:16]
+
+    def _stamp(self) -> tuple:
+        paths = [os.path.join(self.path, sub) for sub in ('new', 'cur')] if self.is_maildir else [self.path]
+        return tuple((st.st_mtime_ns, st.st_size) for st in (os.stat(p) for p in paths if os.path.exists(p)))
+
+    def _scan(self):
+        """Adds messages not seen before to the listing order."""
+        stamp = self._stamp()
+        if stamp == self._scanned_stamp:
+            return
+        self._scanned_stamp = stamp
+        found: List[Tuple[str, Locator]] = []
+        if self.is_maildir:
+            for sub in ('new', 'cur'):
+                folder = os.path.join(self.path, sub)
+                if not os.path.isdir(folder):
+                    continue
+                for name in sorted(os.listdir(folder)):
+                    if not name.startswith('.'):
+                        # Maildir flags after ':' change when a message is read; the unique part doesn't
+                        found.append((self._id(name.split(':', 1)[0]), os.path.join(folder, name)))
+        else:
+            found = [(self._id(str(start)), (self.path, start, end)) for start, end in _mbox_offsets(self.path)]
+
+        for msg_id, locator in found:
+            if msg_id not in self._locators:
+                self._position[msg_id] = len(self._order)
+                self._order.append(msg_id)
+            self._locators[msg_id] = locator
+
+    def fetch_unread_emails(self, page_token: Optional[str] = None, max_results: int = 100,
+                            query: str = '') -> List[Dict]:
+        """Lists the next page of messages not handed out yet. `query` is ignored."""
+        with self._lock:
+            if page_token is None:
+                self._scan()
+            page = self._order[self._listed:self._listed + max_results]
+            self._listed += len(page)
+            self.next_page_token = str(self._listed) if self._listed < len(self._order) else None
+        return [{"id": msg_id} for msg_id in page]
+
+    def _submit(self, msg_id: str, download_dir: str, max_attachment_bytes: Optional[int]):
+        if msg_id not in self._futures and len(self._futures) < 2 * self.prefetch:
+            self._futures[msg_id] = self._pool.submit(
+                parse_local_message, self._locators[msg_id], msg_id, download_dir, max_attachment_bytes)
+
+    def get_email_details(self, msg_id: str, download_dir: str = "temp",
+                          max_attachment_bytes: Optional[int] = None) -> Optional[IncomingEmail]:
+        with self._lock:
+            if msg_id not in self._locators:
+                self._scan()
+            if msg_id not in self._locators:
+                raise KeyError(f"Message {msg_id} is not in {self.path}")
+            future = None
+            if self._pool is not None:
+                future = self._futures.pop(msg_id, None)
+                start = self._position[msg_id] + 1
+                for ahead in self._order[start:start + self.prefetch]:
+                    self._submit(ahead, download_dir, max_attachment_bytes)
+            locator = self._locators[msg_id]
+
+        if future is not None:
+            fields = future.result()
+            # A prefetched attachment may since have been evicted by the disk janitor
+            if not fields["attachment_path"] or os.path.exists(fields["attachment_path"]):
+                return IncomingEmail(**fields)
+        return IncomingEmail(**parse_local_message(locator, msg_id, download_dir, max_attachment_bytes))
+
+    def send_reply(self, to_email: str, subject: str, body: str) -> str:
+        # Stored mail has nobody to reply to; the reply is recorded instead
+        return self.sink.send_reply(to_email, subject, body)
+
+    def mark_as_read(self, msg_id: str):
+        pass
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class DryRunSink:
+    """
+    Stands in for a mail client when sending replies: each reply is appended to
+    a JSONL file instead of being sent, so a backfill or replay exercises the
+    whole pipeline without emailing anyone.
+    """
+
+    def __init__(self, path: str = DRY_RUN_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send_reply(self, to_email: str, subject: str, body: str) -> str:
+        reply_id = f"dry-run-{uuid.uuid4().hex[:12]}"
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({"id": reply_id, "to": to_email, "subject": subject, "body": body,
+                                    "at": time.time()}) + "\n")
+        return reply_id
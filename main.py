@@ -1,4 +1,5 @@
 import argparse
+import os
 import sys
 import json
 from agent import HiringAgent
@@ -12,6 +13,14 @@ def main():
     parser.add_argument("--model", default="llama3.2:3b", help="Ollama model name")
     parser.add_argument("--cutoff", type=int, default=70, help="ATS Score Cutoff")
     parser.add_argument("--mock", action="store_true", help="Run in mock mode (no Ollama required)")
+    parser.add_argument("--semantic", action="store_true",
+                        help="Score skills/keywords with cached embeddings instead of an LLM call")
+    parser.add_argument("--embed-model", default="nomic-embed-text", help="Ollama embedding model name")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile each stage (cProfile, tracemalloc, wall vs CPU time) and print hotspots")
+    parser.add_argument("--profile-dir", default="profiles", help="Where profile artifacts are written")
+    parser.add_argument("--profile-top", type=int, default=20, help="Hotspot functions shown in the report")
+    parser.add_argument("--usage-db", help="Record token and compute usage to this ledger and print the run's totals")
     
     args = parser.parse_args()
 
@@ -40,16 +49,41 @@ def main():
     }
 
     # Initialize Agent
-    client = LLMClient(model_name=args.model, mock_mode=args.mock)
-    agent = HiringAgent(client)
+    usage = None
+    if args.usage_db:
+        from usage_ledger import UsageLedger
+        usage = UsageLedger(args.usage_db)
+    client = LLMClient(model_name=args.model, mock_mode=args.mock, embedding_model=args.embed_model, usage=usage)
+    matcher = None
+    if args.semantic:
+        from embeddings import EmbeddingCache, Embedder, SemanticSkillMatcher
+        matcher = SemanticSkillMatcher(Embedder(client, EmbeddingCache()))
+    profiler = None
+    if args.profile:
+        from profiler import Profiler
+        profiler = Profiler(args.profile_dir, top_n=args.profile_top)
+    agent = HiringAgent(client, matcher=matcher, profiler=profiler)
 
     # Run
+    result = None
     try:
-        agent.run(email, jd_text, config)
+        if profiler:
+            with profiler.message(os.path.basename(resume_path)):
+                result = agent.run(email, jd_text, config, message_id=resume_path)
+        else:
+            result = agent.run(email, jd_text, config, message_id=resume_path)
     except Exception as e:
         print(f"\nError during execution: {e}")
         import traceback
         traceback.print_exc()
 
+    if profiler:
+        print("\n--- Profile ---")
+        print(profiler.report())
+
+    if result and "usage" in result:
+        print("\n--- Model Usage ---")
+        print(json.dumps(result["usage"], indent=2))
+
 if __name__ == "__main__":
     main()
@@ -6,6 +6,7 @@ class IncomingEmail(BaseModel):
     subject: str
     body_text: str
     attachment_path: Optional[str] = None
+    attachment_rejected: Optional[str] = None  # why a resume attachment was not downloaded
 
 class JobDescription(BaseModel):
     role_title: str
@@ -0,0 +1,189 @@
+import argparse
+import json
+import re
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from models import JobDescription
+
+# Component weights of the pre-screen score (0-100)
+PRESCREEN_WEIGHTS = {"mandatory": 0.7, "preferred": 0.2, "keywords": 0.1}
+
+# Extracted text shorter than this is more likely a scan than a resume; never call it hopeless
+MIN_TEXT_CHARS = 200
+
+HOPELESS_ACTIONS = ("process", "defer", "reject")
+
+
+def term_variants(term: str) -> List[str]:
+    """Spellings a skill commonly appears under: "Node.js" -> node.js, nodejs, node js."""
+    base = re.sub(r"\s+", " ", term.lower()).strip()
+    base = re.sub(r"\s*\d+(\.\d+)*$", "", base) or base  # "python 3" -> "python"
+    variants = {base, base.replace(".", ""), base.replace(".", " "), base.replace("-", " "), base.replace("-", "")}
+    return [v.strip() for v in variants if v.strip()]
+
+
+class MultiPatternMatcher:
+    """
+    Aho-Corasick automaton over lower-cased patterns. One pass over the text
+    finds every pattern occurrence, whatever the number of patterns. Matches
+    must sit on word boundaries, so "go" does not match inside "good".
+    """
+
+    def __init__(self, patterns: Dict[str, Any]):
+        """`patterns` maps each pattern string to the label it reports."""
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[Any, int]]] = [[]]
+
+        for pattern, label in patterns.items():
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((label, len(pattern)))
+
+        # Breadth-first failure links; outputs inherit their failure node's outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[child] = self._goto[f].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> set:
+        """Returns the labels of every pattern found in `text`."""
+        text = text.lower()
+        n = len(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for label, length in out[node]:
+                start = i - length + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (i + 1 == n or not text[i + 1].isalnum()):
+                    found.add(label)
+        return found
+
+
+class PreScreener:
+    """
+    Cheap first stage of the screening cascade: scores raw resume text against
+    the JD's skills and keywords before the costly LLM stages. The score orders
+    the work queue, and a resume that matches too few mandatory skills is
+    flagged hopeless.
+    """
+
+    def __init__(self, jd: JobDescription, min_mandatory: float = 0.0):
+        self.min_mandatory = min_mandatory
+        self.groups = {
+            "mandatory": list(dict.fromkeys(jd.mandatory_skills)),
+            "preferred": list(dict.fromkeys(jd.preferred_skills)),
+            "keywords": list(dict.fromkeys(jd.keywords))
+        }
+        patterns = {}
+        for group, terms in self.groups.items():
+            for term in terms:
+                for variant in term_variants(term):
+                    patterns.setdefault(variant, (group, term))
+        self.matcher = MultiPatternMatcher(patterns)
+
+    def score(self, text: str) -> Dict[str, Any]:
+        found = self.matcher.find(text)
+        matched = {group: [t for t in terms if (group, t) in found] for group, terms in self.groups.items()}
+        fractions = {group: len(matched[group]) / len(terms) if terms else 1.0
+                     for group, terms in self.groups.items()}
+        score = 100 * sum(PRESCREEN_WEIGHTS[g] * fractions[g] for g in PRESCREEN_WEIGHTS)
+        hopeless = (bool(self.groups["mandatory"]) and len(text.strip()) >= MIN_TEXT_CHARS
+                    and fractions["mandatory"] <= self.min_mandatory)
+        return {
+            "score": round(score, 1),
+            "mandatory_fraction": round(fractions["mandatory"], 3),
+            "matched": matched["mandatory"] + matched["preferred"],
+            "hopeless": hopeless
+        }
+
+
+def next_off_peak(hour: int, now: Optional[float] = None) -> float:
+    """Timestamp of the next occurrence of `hour`:00 local time."""
+    current = datetime.fromtimestamp(now or time.time())
+    target = current.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if target <= current:
+        target += timedelta(days=1)
+    return target.timestamp()
+
+
+def cascade_report(stages: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Measures the pre-screen against full LLM screening, using jobs that went
+    through both. Hopeless resumes that still reached the LLM
+    (audited, deferred or processed) give the false-negative rate: the share
+    the LLM would have passed.
+    """
+    pairs = []
+    report = {"prescreened": 0, "hopeless": 0, "rejected_without_llm": 0, "deferred": 0, "audited": 0,
+              "hopeless_llm_scored": 0, "false_negatives": 0}
+    for job in stages:
+        pre = job.get("prescreened")
+        if not pre:
+            continue
+        report["prescreened"] += 1
+        report["hopeless"] += pre["hopeless"]
+        report["rejected_without_llm"] += pre.get("action") == "reject"
+        report["deferred"] += pre.get("action") == "defer"
+        report["audited"] += bool(pre.get("audit"))
+
+        screened = job.get("screened")
+        if not screened or screened.get("prescreen_rejected"):
+            continue
+        final = screened["score"]["final_ats_score"]
+        pairs.append((pre["score"], final))
+        if pre["hopeless"]:
+            report["hopeless_llm_scored"] += 1
+            report["false_negatives"] += screened["decision"]["decision"] == "PROCEED"
+
+    scored = report["hopeless_llm_scored"]
+    report["false_negative_rate"] = round(report["false_negatives"] / scored, 3) if scored else None
+    report["llm_calls_avoided"] = report["rejected_without_llm"]
+    report["score_correlation"] = _pearson(pairs)
+    return report
+
+
+def _pearson(pairs: List[Tuple[float, float]]) -> Optional[float]:
+    if len(pairs) < 3:
+        return None
+    n = len(pairs)
+    mx = sum(p for p, _ in pairs) / n
+    my = sum(f for _, f in pairs) / n
+    cov = sum((p - mx) * (f - my) for p, f in pairs)
+    vx = sum((p - mx) ** 2 for p, _ in pairs)
+    vy = sum((f - my) ** 2 for _, f in pairs)
+    return round(cov / (vx * vy) ** 0.5, 3) if vx and vy else None
+
+
+def main():
+    from work_queue import WorkQueue, QUEUE_FILE
+
+    parser = argparse.ArgumentParser(description="Pre-screen cascade report (pre-screen vs full LLM scores)")
+    parser.add_argument("--queue", default=QUEUE_FILE, help="Path to the SQLite work queue")
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue)
+    print(json.dumps(cascade_report(stages for _, stages in queue.iter_stages()), indent=2))
+
+if __name__ == "__main__":
+    main()
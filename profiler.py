@@ -0,0 +1,330 @@
+import argparse
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+PROFILE_DIR = "profiles"
+DEFAULT_TOP_N = 20
+
+# Totals of the always-on timed calls, one file per profiler, next to the message profiles
+TIMED_PREFIX = "timed_"
+# Wall times kept per timed call for its p95
+TIMED_RECENT = 1000
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^\w.-]", "_", name)
+
+
+class _Stage:
+    def __init__(self, name: str, trace_memory: bool):
+        self.name = name
+        self.profile = cProfile.Profile()
+        self.snapshot = tracemalloc.take_snapshot() if trace_memory else None
+        self.mem_start = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+        self.peak = self.mem_start
+        # Started last so the snapshot above isn't charged to the stage
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        # Profiler bookkeeping of nested stages, taken back out of this stage's times
+        self.overhead_wall = 0.0
+        self.overhead_cpu = 0.0
+
+
+class MessageProfile:
+    """Stages recorded while profiling one message."""
+
+    def __init__(self, message_id: str, seq: int):
+        self.message_id = message_id
+        self.seq = seq
+        self.started_at = time.time()
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        self.overhead_wall = 0.0
+        self.overhead_cpu = 0.0
+        self.stages: List[Dict[str, Any]] = []
+        self.stats: List[cProfile.Profile] = []
+        self.stack: List[_Stage] = []
+
+
+class Profiler:
+    """
+    Opt-in profiler for the screening pipeline.
+
+    `message(id)` marks the unit of work; `stage(name)` wraps one step of it.
+    For a sampled message, each stage gets its own cProfile run (nested stages
+    pause their parent, so a stage's profile only holds its own calls), wall
+    versus CPU time of the calling thread (the gap is time spent waiting on
+    Ollama, Gmail or disk) and, with `trace_memory`, the allocations it made.
+    One message in `sample_every` is profiled and only one at a time, because
+    tracemalloc is process-wide. Outside a sampled message `stage` is a no-op.
+
+    Frequent calls outside the screening pipeline (Gmail polls and sends) go
+    through `timed` instead: every call's wall and CPU time is recorded, with
+    no cProfile run, no sample taken and no wait for a profiled message.
+
+    Each profiled message writes `<output_dir>/<time>_<id>/`: stages.json plus
+    one .prof file per stage (readable with pstats or snakeviz). `report()`
+    aggregates everything written so far into a top-N hotspot report.
+    """
+
+    def __init__(self, output_dir: str = PROFILE_DIR, sample_every: int = 1,
+                 trace_memory: bool = True, top_n: int = DEFAULT_TOP_N):
+        self.output_dir = output_dir
+        self.sample_every = max(1, sample_every)
+        self.trace_memory = trace_memory
+        self.top_n = top_n
+        self._counter = itertools.count()
+        self._busy = threading.Lock()
+        self._local = threading.local()
+        self._metrics_lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {"messages": 0, "profiled": 0, "skipped_busy": 0}
+        self._stage_totals: Dict[str, Dict[str, float]] = {}
+        self._timed: Dict[str, Dict[str, Any]] = {}
+        self._timed_path = os.path.join(
+            output_dir, f"{TIMED_PREFIX}{datetime.now().strftime('%Y%m%d-%H%M%S')}_{os.getpid()}.json")
+
+    @contextmanager
+    def message(self, message_id: str) -> Iterator[Optional[MessageProfile]]:
+        """Profiles the enclosed work if this message is sampled; yields None otherwise."""
+        with self._metrics_lock:
+            self._metrics["messages"] += 1
+        seq = next(self._counter)
+        if seq % self.sample_every or getattr(self._local, "current", None):
+            yield None
+            return
+        if not self._busy.acquire(blocking=False):
+            with self._metrics_lock:
+                self._metrics["skipped_busy"] += 1
+            yield None
+            return
+
+        started_tracing = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        current = MessageProfile(message_id, seq)
+        self._local.current = current
+        try:
+            yield current
+        finally:
+            self._local.current = None
+            try:
+                self._write(current)
+            finally:
+                if started_tracing:
+                    tracemalloc.stop()
+                self._busy.release()
+
+    @contextmanager
+    def stage(self, name: str):
+        current: Optional[MessageProfile] = getattr(self._local, "current", None)
+        if current is None:
+            yield
+            return
+
+        enter_wall, enter_cpu = time.perf_counter(), time.thread_time()
+        parent = current.stack[-1] if current.stack else None
+        owner = parent or current
+        if parent:
+            parent.profile.disable()
+            if self.trace_memory:
+                parent.peak = max(parent.peak, tracemalloc.get_traced_memory()[1])
+        stage = _Stage(name, self.trace_memory)
+        current.stack.append(stage)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        stage.profile.enable()
+        try:
+            yield
+        finally:
+            stage.profile.disable()
+            end_wall, end_cpu = time.perf_counter(), time.thread_time()
+            current.stack.pop()
+            self._finish(current, stage, end_wall - stage.wall - stage.overhead_wall,
+                         end_cpu - stage.cpu - stage.overhead_cpu)
+            if parent:
+                if self.trace_memory:
+                    parent.peak = max(parent.peak, stage.peak)
+                    tracemalloc.reset_peak()
+            owner.overhead_wall += (stage.wall - enter_wall) + (time.perf_counter() - end_wall) + stage.overhead_wall
+            owner.overhead_cpu += (stage.cpu - enter_cpu) + (time.thread_time() - end_cpu) + stage.overhead_cpu
+            if parent:
+                parent.profile.enable()
+
+    @contextmanager
+    def timed(self, name: str):
+        """Times every call of the enclosed work under `name`, whether or not a message is sampled."""
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            with self._metrics_lock:
+                totals = self._timed.setdefault(name, {"count": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                                       "recent_wall_s": deque(maxlen=TIMED_RECENT)})
+                totals["count"] += 1
+                totals["wall_s"] += wall
+                totals["cpu_s"] += cpu
+                totals["recent_wall_s"].append(round(wall, 4))
+
+    def _finish(self, current: MessageProfile, stage: _Stage, wall: float, cpu: float):
+        entry: Dict[str, Any] = {
+            "name": stage.name,
+            "depth": len(current.stack),
+            "wall_s": round(wall, 4),
+            "cpu_s": round(cpu, 4),
+            "wait_s": round(max(0.0, wall - cpu), 4)
+        }
+        if stage.snapshot is not None:
+            current_mem, peak = tracemalloc.get_traced_memory()
+            stage.peak = max(stage.peak, peak)
+            entry["alloc_kb"] = round((current_mem - stage.mem_start) / 2**10, 1)
+            entry["peak_kb"] = round((stage.peak - stage.mem_start) / 2**10, 1)
+            entry["top_allocations"] = self._top_allocations(stage.snapshot)
+        current.stages.append(entry)
+        current.stats.append(stage.profile)
+
+    def _top_allocations(self, before: tracemalloc.Snapshot, limit: int = 5) -> List[str]:
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__),
+                  tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+        diff = [d for d in after.compare_to(before.filter_traces(ignore), "lineno") if d.size_diff > 0]
+        return [f"{d.traceback[0].filename}:{d.traceback[0].lineno} +{d.size_diff / 2**10:.0f} KiB"
+                for d in diff[:limit]]
+
+    def _write(self, current: MessageProfile):
+        wall = time.perf_counter() - current.wall - current.overhead_wall
+        cpu = time.thread_time() - current.cpu - current.overhead_cpu
+        stamp = datetime.fromtimestamp(current.started_at).strftime("%Y%m%d-%H%M%S")
+        # The sequence number keeps a retried message's profiles apart
+        path = os.path.join(self.output_dir, f"{stamp}_{_safe_name(current.message_id)[:64]}_{current.seq}")
+        os.makedirs(path, exist_ok=True)
+
+        for i, (entry, profile) in enumerate(zip(current.stages, current.stats)):
+            entry["profile"] = f"{i:02d}_{_safe_name(entry['name'])}.prof"
+            profile.dump_stats(os.path.join(path, entry["profile"]))
+        with open(os.path.join(path, "stages.json"), "w") as f:
+            json.dump({
+                "message_id": current.message_id,
+                "started_at": current.started_at,
+                "wall_s": round(wall, 4),
+                "cpu_s": round(cpu, 4),
+                "stages": current.stages
+            }, f, indent=2)
+
+        with self._metrics_lock:
+            self._metrics["profiled"] += 1
+            for entry in current.stages:
+                totals = self._stage_totals.setdefault(entry["name"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0})
+                totals["count"] += 1
+                totals["wall_s"] += entry["wall_s"]
+                totals["cpu_s"] += entry["cpu_s"]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Sampling counters and mean wall/CPU time per stage and timed call, for the dashboard."""
+        with self._metrics_lock:
+            stages = {name: {"count": t["count"],
+                             "mean_wall_s": round(t["wall_s"] / t["count"], 4),
+                             "mean_cpu_s": round(t["cpu_s"] / t["count"], 4)}
+                      for name, t in list(self._stage_totals.items()) + list(self._timed.items())}
+            return dict(self._metrics, sample_every=self.sample_every, timed_calls=len(self._timed),
+                        stages=stages)
+
+    def write_timed(self):
+        """Writes this profiler's timed-call totals next to the message profiles, for `build_report`."""
+        with self._metrics_lock:
+            if not self._timed:
+                return
+            data = {name: dict(t, recent_wall_s=list(t["recent_wall_s"])) for name, t in self._timed.items()}
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(self._timed_path, "w") as f:
+            json.dump(data, f)
+
+    def report(self, top_n: Optional[int] = None) -> str:
+        self.write_timed()
+        return build_report(self.output_dir, top_n or self.top_n)
+
+
+def build_report(profile_dir: str, top_n: int = DEFAULT_TOP_N, sort: str = "tottime") -> str:
+    """
+    Aggregates every profiled message under `profile_dir`: wall/CPU time per
+    stage and per timed call (marked *), then the top-N functions over all
+    stage profiles combined.
+    """
+    stage_rows: Dict[str, List[Dict[str, Any]]] = {}
+    timed: Dict[str, Dict[str, Any]] = {}
+    prof_files = []
+    messages = 0
+    for entry in sorted(os.listdir(profile_dir)) if os.path.isdir(profile_dir) else []:
+        if entry.startswith(TIMED_PREFIX) and entry.endswith(".json"):
+            with open(os.path.join(profile_dir, entry)) as f:
+                for name, t in json.load(f).items():
+                    totals = timed.setdefault(name, {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "recent_wall_s": []})
+                    for key in ("count", "wall_s", "cpu_s", "recent_wall_s"):
+                        totals[key] += t[key]
+            continue
+        stages_path = os.path.join(profile_dir, entry, "stages.json")
+        if not os.path.exists(stages_path):
+            continue
+        with open(stages_path) as f:
+            data = json.load(f)
+        messages += 1
+        for stage in data["stages"]:
+            stage_rows.setdefault(stage["name"], []).append(stage)
+            prof_files.append(os.path.join(profile_dir, entry, stage["profile"]))
+
+    if not messages and not timed:
+        return f"No profiles found in {profile_dir}"
+
+    # (name, count, total wall, total cpu, wall samples for the p95, peak KiB)
+    table = [(name, len(rows), sum(r["wall_s"] for r in rows), sum(r["cpu_s"] for r in rows),
+              [r["wall_s"] for r in rows], max([r["peak_kb"] for r in rows if "peak_kb" in r], default=0))
+             for name, rows in stage_rows.items()]
+    table += [(f"{name}*", t["count"], t["wall_s"], t["cpu_s"], t["recent_wall_s"], 0) for name, t in timed.items()]
+
+    out = io.StringIO()
+    out.write(f"Profiled messages: {messages}\n\n")
+    out.write(f"{'stage':<28}{'count':>6}{'wall ms':>10}{'p95 ms':>10}{'cpu ms':>10}{'wait %':>8}{'peak KiB':>10}\n")
+    for name, count, wall, cpu, walls, peak in sorted(table, key=lambda row: -row[2]):
+        walls = sorted(walls)
+        p95 = walls[min(len(walls) - 1, int(0.95 * len(walls)))]
+        out.write(f"{name:<28}{count:>6}{1000 * wall / count:>10.1f}{1000 * p95:>10.1f}"
+                  f"{1000 * cpu / count:>10.1f}{100 * max(0.0, wall - cpu) / wall if wall else 0:>8.0f}"
+                  f"{peak:>10.0f}\n")
+    if timed:
+        out.write("* timed on every call, not sampled or cProfiled\n")
+
+    if not prof_files:
+        return out.getvalue()
+    out.write(f"\nTop {top_n} functions by {sort} (all stages):\n")
+    stats = pstats.Stats(prof_files[0], stream=out)
+    for path in prof_files[1:]:
+        stats.add(path)
+    stats.files = []  # don't list every .prof file in the header
+    stats.strip_dirs().sort_stats(sort).print_stats(top_n)
+    return out.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate per-message profiles into a hotspot report")
+    parser.add_argument("profile_dir", nargs="?", default=PROFILE_DIR, help="Directory written by --profile")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_N, help="Number of hotspot functions to show")
+    parser.add_argument("--sort", default="tottime", choices=["tottime", "cumulative", "calls"],
+                        help="Hotspot ordering")
+    args = parser.parse_args()
+    print(build_report(args.profile_dir, args.top, args.sort))
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,130 @@
 import time
+import random
 import argparse
 import sys
 import os
 import threading
+from contextlib import contextmanager, nullcontext
+from typing import Optional
 from termcolor import colored
 from gmail_client import GmailClient
+from mail_source import (MailSource, LocalMailSource, DryRunSink, DRY_RUN_FILE, DRY_RUN_QUEUE_FILE,
+                         dry_run_outbox_path)
 from agent import HiringAgent
-from llm_client import LLMClient
+from llm_client import LLMClient, extraction_metrics
+from models import IncomingEmail
 from state_manager import StateManager
+from dedup import DuplicateIndex, DEDUP_FILE
+from score_store import ScoreStore, STORE_DIR
+from candidate_index import CandidateIndex, INDEX_FILE
+from reply_sender import ReplySender, OUTBOX_FILE
+from scheduler import PollScheduler, TokenBucket, RateLimitError, DEFAULT_UNITS_PER_SECOND
+from work_queue import WorkQueue, Job, LeaseLost, Released, QUEUE_FILE
+from resume_parser import ResumeParser
+from prescreen import PreScreener, cascade_report, next_off_peak, HOPELESS_ACTIONS
+from profiler import Profiler, PROFILE_DIR
+from degradation import DegradationController
+from usage_ledger import UsageLedger, USAGE_FILE
+from resources import (ResourceGovernor, DOWNLOAD_DIR, DEFAULT_MAX_ATTACHMENT_MB, DEFAULT_DISK_QUOTA_MB,
+                       DEFAULT_MAX_AGE_DAYS, DEFAULT_MEMORY_LIMIT_MB)
 
 class BotService:
-    def __init__(self, jd_path: str, model: str, cutoff: int, interval: int):
+    def __init__(self, jd_path: str, model: str, cutoff: int, interval: int,
+                 queue_path: str = QUEUE_FILE, workers: int = 1, max_attempts: int = 5,
+                 visibility_timeout: int = 600, dedup_path: str = DEDUP_FILE,
+                 reuse_duplicates: bool = True, score_store_dir: str = STORE_DIR,
+                 semantic: bool = False, embedding_model: str = "nomic-embed-text",
+                 index_path: str = INDEX_FILE, max_interval: int = 300,
+                 quota_units_per_second: float = DEFAULT_UNITS_PER_SECOND,
+                 outbox_path: str = OUTBOX_FILE, send_workers: int = 2, sends_per_minute: int = 20,
+                 max_attachment_mb: float = DEFAULT_MAX_ATTACHMENT_MB, disk_quota_mb: float = DEFAULT_DISK_QUOTA_MB,
+                 max_artifact_age_days: float = DEFAULT_MAX_AGE_DAYS,
+                 memory_limit_mb: float = DEFAULT_MEMORY_LIMIT_MB, trace_memory: bool = False,
+                 shard: Optional[str] = None, credentials_path: str = 'credentials.json',
+                 token_path: str = 'token.json', gmail_query: str = '', download_dir: str = DOWNLOAD_DIR,
+                 prescreen: bool = True, hopeless_action: str = "process", min_mandatory: float = 0.0,
+                 audit_rate: float = 0.05, off_peak_hour: int = 22,
+                 profile_dir: Optional[str] = None, profile_every: int = 1,
+                 source_path: Optional[str] = None, source_workers: Optional[int] = None,
+                 dry_run: bool = False, exit_when_done: bool = False,
+                 slo_seconds: Optional[float] = None, small_model: Optional[str] = None,
+                 usage_path: Optional[str] = USAGE_FILE):
         self.jd_path = jd_path
         self.model = model
         self.cutoff = cutoff
         self.interval = interval
-        self.state = StateManager()
+        self.workers = workers
+        self.visibility_timeout = visibility_timeout
+        self.shard = shard
+        self.credentials_path = credentials_path
+        self.token_path = token_path
+        self.gmail_query = gmail_query
+        self.download_dir = download_dir
+        self.state = StateManager(shard=shard)
+        self.prescreen = prescreen
+        self.prescreener = None
+        self.hopeless_action = hopeless_action
+        self.min_mandatory = min_mandatory
+        self.audit_rate = audit_rate
+        self.off_peak_hour = off_peak_hour
+        self._last_cascade_report = 0.0
+        self._last_usage_report = 0.0
+        self.jd = None
+        self.role = None
+        # Off unless a profile directory is given; then one message in profile_every is profiled
+        self.profiler = Profiler(profile_dir, sample_every=profile_every) if profile_dir else None
+        # A local Maildir/mbox source is shared by every thread; it can't send, so replies are dry-run
+        self.dry_run = dry_run or source_path is not None
+        self.sink = DryRunSink(DRY_RUN_FILE) if self.dry_run else None
+        self.source = LocalMailSource(source_path, workers=source_workers, sink=self.sink) if source_path else None
+        self.exit_when_done = exit_when_done
+        self._ingest_drained = threading.Event()
+        if self.dry_run and queue_path == QUEUE_FILE:
+            # Never let a dry run's finished jobs stop a live run from screening the same (still unread) messages
+            queue_path = DRY_RUN_QUEUE_FILE
+        if self.dry_run and outbox_path == OUTBOX_FILE:
+            # Nor let a dry-run "send" mark a real application as replied to; each queue gets its own outbox
+            outbox_path = dry_run_outbox_path(queue_path)
+        self.queue = WorkQueue(queue_path, max_attempts=max_attempts)
+        # Without an SLO every candidate gets the full-quality pipeline
+        self.degradation = (DegradationController(slo_seconds, workers=workers, small_model=small_model, state=self.state)
+                            if slo_seconds else None)
+        # Token and compute usage per message and stage; shards share one ledger by default
+        self.usage = UsageLedger(usage_path) if usage_path else None
+        self.dedup = DuplicateIndex(dedup_path)
+        self.reuse_duplicates = reuse_duplicates
+        self.scores = ScoreStore(score_store_dir)
+        self.index = CandidateIndex(index_path)
+        # One limiter for every Gmail client: the quota is per user, not per thread
+        self.rate_limiter = TokenBucket(quota_units_per_second)
+        self.scheduler = PollScheduler(min_interval=interval, max_interval=max_interval)
+        self.sender = ReplySender(self._reply_client, outbox_path, workers=send_workers,
+                                  per_minute=10**6 if self.dry_run else sends_per_minute, state=self.state,
+                                  profiler=self.profiler)
+        self.semantic = semantic
+        self.embedding_model = embedding_model
+        self.max_attachment_bytes = int(max_attachment_mb * 2**20)
+        self.governor = ResourceGovernor(download_dir, disk_quota_mb=disk_quota_mb,
+                                         max_age_days=max_artifact_age_days, memory_limit_mb=memory_limit_mb,
+                                         trace_memory=trace_memory, state=self.state)
+
+    def _mail_source(self) -> MailSource:
+        if self.source:
+            return self.source
+        return GmailClient(self.credentials_path, self.token_path, rate_limiter=self.rate_limiter)
+
+    def _reply_client(self):
+        return self.sink if self.dry_run else self._mail_source()
 
     def run(self, stop_event: threading.Event):
         """
         Main loop designed to run in a thread.
         Checks stop_event.is_set() to exit.
+
+        Ingestion and screening are decoupled through the work queue: one thread
+        polls Gmail and enqueues message IDs, while `workers` consumer threads
+        lease jobs and screen them. A crash mid-message resumes from the last
+        completed stage instead of redoing the whole message.
         """
         self.state.update_status("Starting up...")
 
@@ -35,12 +139,29 @@ class BotService:
 
         print(colored(f"--- Starting Resume Agent Bot ---", "green"))
         
-        # Initialize Clients
+        # Initialize Clients (the Gmail service object is not thread-safe, so each thread gets its own)
         try:
-            gmail = GmailClient() 
-            llm = LLMClient(model_name=self.model)
-            agent = HiringAgent(llm)
-            config = {"cutoff_score": self.cutoff}
+            ingest_gmail = self._mail_source()
+            consumers = []
+            if self.semantic:
+                from embeddings import EmbeddingCache, Embedder, SemanticSkillMatcher
+                embedding_cache = EmbeddingCache()
+            for _ in range(self.workers):
+                llm = LLMClient(model_name=self.model, embedding_model=self.embedding_model, usage=self.usage)
+                matcher = SemanticSkillMatcher(Embedder(llm, embedding_cache)) if self.semantic else None
+                consumers.append((self._mail_source(), HiringAgent(llm, dedup_index=self.dedup, matcher=matcher,
+                                                             profiler=self.profiler)))
+            config = {"cutoff_score": self.cutoff, "reuse_duplicates": self.reuse_duplicates}
+            if self.prescreen:
+                # One LLM call up front; every resume is then pre-screened without one
+                try:
+                    with self._stage("parse_jd"):
+                        jd = consumers[0][1].parse_jd(jd_text)
+                    self.jd, self.role = jd, jd.role_title
+                    self.prescreener = PreScreener(jd, self.min_mandatory)
+                except Exception as e:
+                    print(colored(f"Pre-screen disabled, JD parsing failed: {e}", "yellow"))
+                    self.state.log_activity(f"Pre-screen disabled: {e}", level="WARNING")
             self.state.update_status("Clients Initialized. Listening...")
         except Exception as e:
             print(colored(f"Initialization Error: {e}", "red"))
@@ -49,104 +170,420 @@ class BotService:
 
         print(colored("Listening for new emails...", "yellow"))
 
+        threads = [threading.Thread(target=self._ingest_loop, args=(stop_event, ingest_gmail), daemon=True)]
+        for gmail, agent in consumers:
+            threads.append(threading.Thread(
+                target=self._consume_loop, args=(stop_event, gmail, agent, jd_text, config), daemon=True))
+        for t in threads:
+            t.start()
+        self.sender.start(stop_event)
+        self.governor.start(stop_event)
+
+        try:
+            while not stop_event.is_set():
+                stop_event.wait(1)
+                if self.exit_when_done and self._done():
+                    print(colored("\nSource drained and queue empty; stopping.", "green"))
+                    stop_event.set()
+        except KeyboardInterrupt:
+            stop_event.set()
+
+        for t in threads:
+            t.join()
+        self.sender.join()
+        if self.source:
+            self.source.close()
+
+        metrics = self.profiler.metrics() if self.profiler else {}
+        if metrics.get("profiled") or metrics.get("timed_calls"):
+            report = self.profiler.report()
+            with open(os.path.join(self.profiler.output_dir, "report.txt"), "w") as f:
+                f.write(report)
+            print(colored(f"Profile report written to {self.profiler.output_dir}/report.txt", "green"))
+
+        self.state.update_status("Stopped.")
+        print("Bot Service Stopped.")
+
+    def _done(self) -> bool:
+        if not self._ingest_drained.is_set():
+            return False
+        queue, outbox = self.queue.stats(), self.sender.stats()
+        return not (queue["PENDING"] or queue["LEASED"] or outbox["PENDING"] or outbox["SENDING"])
+
+    def _ingest_loop(self, stop_event: threading.Event, gmail: MailSource):
+        """
+        Producer: polls Gmail for unread messages and enqueues their IDs.
+        Already-known IDs are ignored, so messages still being screened aren't duplicated.
+        The scheduler re-polls immediately while more pages are waiting and backs
+        off exponentially while the inbox is idle or rate-limited.
+        """
+        page_token = None
         while not stop_event.is_set():
             try:
-                self.state.update_status("Polling Gmail...")
-                messages = gmail.fetch_unread_emails()
-                
-                if not messages:
-                    print(".", end="", flush=True) 
+                with self.profiler.timed("gmail.fetch_unread_emails") if self.profiler else nullcontext():
+                    messages = gmail.fetch_unread_emails(page_token=page_token, query=self.gmail_query)
+                page_token = gmail.next_page_token
+                new_count = sum(1 for m in messages if self.queue.enqueue(m['id']))
+                delay = self.scheduler.on_poll(new_count, has_more=page_token is not None)
+                if not new_count:
+                    # Every ID on this page is already queued; start over from the first page after the backoff
+                    page_token = None
+                if not messages and page_token is None:
+                    self._ingest_drained.set()
+
+                if new_count:
+                    self.state.log_activity(f"Queued {new_count} new messages.")
+                    print(f"\nQueued {new_count} new messages.")
+                else:
+                    print(".", end="", flush=True)
+            except RateLimitError as e:
+                delay = self.scheduler.on_rate_limited(e.retry_after)
+                self.rate_limiter.pause(delay)
+                print(colored(f"\nRate limited, backing off {delay:.0f}s", "yellow"))
+                self.state.log_activity(f"Gmail rate limit hit; backing off {delay:.0f}s", level="WARNING")
+            except Exception as e:
+                delay = self.scheduler.on_error()
+                print(colored(f"\nIngestion Error: {e}", "red"))
+                self.state.log_activity(f"Ingestion Error: {e}", level="ERROR")
+
+            self.state.update_metrics("scheduler", dict(self.scheduler.metrics(), **self.rate_limiter.metrics()))
+            # Wait on the event so shutdown is immediate
+            stop_event.wait(delay)
+
+    def _consume_loop(self, stop_event: threading.Event, gmail: MailSource, agent: HiringAgent,
+                      jd_text: str, config: dict):
+        """
+        Consumer: leases jobs from the queue and screens them.
+        Failures are retried with backoff and eventually dead-lettered by the queue.
+        """
+        idle = False
+        while not stop_event.is_set():
+            if self.governor.should_shed():
+                # Over the memory limit: leave new work in the queue until memory recovers
+                self.state.update_status("Memory limit reached. Paused screening.")
+                idle = False
+                stop_event.wait(5)
+                continue
+
+            try:
+                job = self.queue.lease(self.visibility_timeout)
+            except Exception as e:
+                print(colored(f"\nQueue Error: {e}", "red"))
+                stop_event.wait(self.interval)
+                continue
+
+            if job is None:
+                if not idle:
                     self.state.update_status("Idle. Waiting for emails.")
-                    # Sleep in small chunks to allow quick shutdown
-                    for _ in range(self.interval):
-                        if stop_event.is_set(): break
-                        time.sleep(1)
-                    continue
-                
-                self.state.log_activity(f"Found {len(messages)} unread messages.")
-                print(f"\nFound {len(messages)} messages.")
-
-                for msg_meta in messages:
-                    if stop_event.is_set(): break
-                    
-                    msg_id = msg_meta['id']
-                    try:
-                        email_data = gmail.get_email_details(msg_id)
-                        self.state.log_activity(f"Analyzing: {email_data.sender_email}")
-                        
-                        # 1. Classify
-                        classification = agent.classify_email(email_data)
-                        if not classification.is_job_application:
-                            self.state.log_activity(f"Skipping {email_data.sender_email}: Not application")
-                            gmail.mark_as_read(msg_id)
-                            continue
-
-                        if not email_data.attachment_path:
-                            self.state.log_activity(f"Skipping {email_data.sender_email}: No resume")
-                            gmail.mark_as_read(msg_id)
-                            continue
-                            
-                        # 2. Run Agent
-                        self.state.update_status(f"Processing candidate: {email_data.sender_email}")
-                        print(f" -> Processing {email_data.sender_email}")
-                        result = agent.run(email_data, jd_text, config)
-
-                        if result: 
-                            # Save to dashboard
-                            candidate_info = {
-                                "name": result['resume']['name'],
-                                "score": result['score']['final_ats_score'],
-                                "decision": result['decision']['decision'],
-                                "skills": result['resume']['skills'],
-                                "breakdown": result['score']
-                            }
-                            self.state.update_candidate(candidate_info)
-                            
-                            # 3. Send Reply
-                            email_draft = result['email']
-                            gmail.send_reply(
-                                to_email=email_data.sender_email,
-                                subject=email_draft['email_subject'],
-                                body=email_draft['email_body']
-                            )
-                            self.state.log_activity(f"Reply sent to {email_data.sender_email}")
-                        
-                        # 4. Cleanup
-                        gmail.mark_as_read(msg_id)
-                    
-                    except Exception as e:
-                        err_msg = f"Error processing message {msg_id}: {e}"
-                        print(colored(err_msg, "red"))
-                        self.state.log_activity(err_msg)
-                
-                self.state.update_status("Waiting...")
-                # Sleep loop
-                for _ in range(self.interval):
-                    if stop_event.is_set(): break
-                    time.sleep(1)
-
-            except KeyboardInterrupt:
-                break
+                    idle = True
+                if self.degradation:
+                    self.degradation.update(0)
+                stop_event.wait(1)
+                continue
+            idle = False
+
+            started = time.time()
+            job_config = dict(config, **self.degradation.settings()) if self.degradation else config
+            try:
+                with self.queue.keep_alive(job, self.visibility_timeout), \
+                        self.profiler.message(job.message_id) if self.profiler else nullcontext(), \
+                        self.usage.message(job.message_id, self.role) if self.usage else nullcontext():
+                    self._process_job(job, gmail, agent, jd_text, job_config)
+                self.queue.complete(job)
+                # Deferred resumes wait for off-peak hours on purpose; their latency says nothing about load
+                deferred = (job.stages.get("prescreened") or {}).get("action") == "defer"
+                if self.degradation and "screened" in job.stages and not deferred:
+                    self.degradation.observe(job.created_at, time.time() - started)
+            except Released:
+                pass
+            except LeaseLost as e:
+                print(colored(str(e), "yellow"))
+            except RateLimitError as e:
+                # Slow every Gmail caller down, then let the queue retry this job
+                self.rate_limiter.pause(e.retry_after or self.interval)
+                try:
+                    self.queue.fail(job, str(e))
+                except LeaseLost:
+                    pass
+                self.state.log_activity(f"Gmail rate limit while processing {job.message_id}", level="WARNING")
             except Exception as e:
-                print(colored(f"\nCritical Loop Error: {e}", "red"))
-                self.state.update_status(f"Crashed: {e}")
-                time.sleep(self.interval)
-        
-        self.state.update_status("Stopped.")
-        print("Bot Service Stopped.")
+                err_msg = f"Error processing message {job.message_id}: {e}"
+                print(colored(err_msg, "red"))
+                try:
+                    retry_at = self.queue.fail(job, str(e))
+                except LeaseLost:
+                    continue
+                if retry_at is None:
+                    err_msg += f" (dead-lettered after {job.attempts} attempts)"
+                else:
+                    err_msg += f" (retry in {int(retry_at - time.time())}s)"
+                self.state.log_activity(err_msg, level="ERROR")
+
+            self.state.update_queue_stats(self.queue.stats())
+            self.state.update_metrics("llm_extraction", extraction_metrics())
+            if self.degradation:
+                self.degradation.update(self.queue.ready_count())
+                self.state.update_metrics("degradation", self.degradation.metrics())
+            if self.profiler:
+                self.state.update_metrics("profiling", self.profiler.metrics())
+            if self.prescreener and time.time() - self._last_cascade_report > 60:
+                self._last_cascade_report = time.time()
+                self.state.update_metrics("prescreen", cascade_report(s for _, s in self.queue.iter_stages()))
+            if self.usage and time.time() - self._last_usage_report > 60:
+                self._last_usage_report = time.time()
+                self.state.update_metrics("usage", self.usage.metrics())
+
+    def _process_job(self, job: Job, gmail: MailSource, agent: HiringAgent, jd_text: str, config: dict):
+        """
+        Runs one message through the pipeline, recording each completed stage on
+        the job. Stages already recorded by an earlier attempt are skipped. The
+        reply is only queued here; the ReplySender delivers it in the background.
+        """
+        msg_id = job.message_id
+
+        fetched = job.stages.get("fetched")
+        # A retried job's attachment may have been evicted by the disk janitor; fetch it again
+        refetch = (fetched and "screened" not in job.stages and fetched.get("attachment_path")
+                   and not os.path.exists(fetched["attachment_path"]))
+        if not fetched or refetch:
+            with self._stage("gmail.get_email_details"):
+                email_data = gmail.get_email_details(msg_id, download_dir=self.download_dir,
+                                                     max_attachment_bytes=self.max_attachment_bytes)
+            self.queue.record_stage(job, "fetched", email_data.model_dump())
+        email_data = IncomingEmail(**job.stages["fetched"])
+
+        self.governor.pin(email_data.attachment_path)
+        try:
+            self._screen_job(job, email_data, gmail, agent, jd_text, config)
+        finally:
+            self.governor.unpin(email_data.attachment_path)
+
+    def _screen_job(self, job: Job, email_data: IncomingEmail, gmail: MailSource, agent: HiringAgent,
+                    jd_text: str, config: dict):
+        msg_id = job.message_id
+
+        if "classified" not in job.stages:
+            self.state.log_activity(f"Analyzing: {email_data.sender_email}")
+            with self._stage("classify_email"), agent.llm.routed(config.get("model")):
+                classification = agent.classify_email(email_data)
+            self.queue.record_stage(job, "classified", classification.model_dump())
+
+        if not job.stages["classified"]["is_job_application"]:
+            self.state.log_activity(f"Skipping {email_data.sender_email}: Not application", level="WARNING")
+            self._mark_read(job, gmail)
+            return
+
+        if email_data.attachment_rejected:
+            self.state.log_activity(f"Skipping {email_data.sender_email}: {email_data.attachment_rejected}",
+                                    level="WARNING")
+            self._mark_read(job, gmail)
+            return
+
+        if not email_data.attachment_path:
+            self.state.log_activity(f"Skipping {email_data.sender_email}: No resume", level="WARNING")
+            self._mark_read(job, gmail)
+            return
+
+        # Cheap pre-screen of an application before the costly stages; it re-ranks the job in the queue
+        if self.prescreener and "prescreened" not in job.stages:
+            with self._stage("prescreen"):
+                self._prescreen(job, email_data, agent)
+
+        # A pre-screen rejection is already screened; it only needs recording and its reply
+        if "screened" not in job.stages:
+            self.state.update_status(f"Processing candidate: {email_data.sender_email}")
+            print(f" -> Processing {email_data.sender_email}")
+            # Text the pre-screen already extracted isn't extracted again
+            raw_text = (job.stages.get("prescreened") or {}).get("resume_text")
+            with self._stage("agent.run"):
+                result = agent.run(email_data, jd_text, config, message_id=msg_id, raw_text=raw_text)
+            self.queue.record_stage(job, "screened", result)
+        result = job.stages["screened"]
+
+        if result:
+            if "stored" not in job.stages:
+                # The score store keeps one row per message ID; a replay of a stored message adds nothing
+                new = self.scores.append(msg_id, result['score'], result['decision']['decision'], self.cutoff,
+                                         name=result['resume']['name'], email=email_data.sender_email,
+                                         role=result['jd']['role_title'],
+                                         degradation_level=(result.get('degradation') or {}).get('level', 0))
+                self.queue.record_stage(job, "stored", {"new": new})
+
+            if "recorded" not in job.stages:
+                # ...and neither does the dashboard, so its aggregates keep agreeing with the score store
+                if (job.stages["stored"] or {}).get("new", True):
+                    candidate_info = {
+                        "id": msg_id,
+                        "name": result['resume']['name'],
+                        "email": email_data.sender_email,
+                        "role": result['jd']['role_title'],
+                        "experience": result['resume']['experience_years'],
+                        "score": result['score']['final_ats_score'],
+                        "decision": result['decision']['decision'],
+                        "skills": result['resume']['skills'],
+                        "breakdown": result['score'],
+                        "duplicate_of": result.get('duplicate_of'),
+                        "prescreen_score": (job.stages.get("prescreened") or {}).get("score"),
+                        "degradation_level": (result.get('degradation') or {}).get('level', 0),
+                        "usage": {key: (result.get('usage') or {}).get(key, 0)
+                                  for key in ("calls", "prompt_tokens", "completion_tokens", "compute_ms")},
+                        "dry_run": self.dry_run
+                    }
+                    self.state.update_candidate(candidate_info)
+                else:
+                    self.state.log_activity(f"{email_data.sender_email} was already recorded; "
+                                            f"dashboard and score store left as they were")
+                self.queue.record_stage(job, "recorded")
+
+            if "indexed" not in job.stages:
+                self.index.add(msg_id, result.get('resume_text', ''), result['resume'],
+                               result['score']['final_ats_score'], result['decision']['decision'],
+                               role=result['jd']['role_title'], email=email_data.sender_email)
+                self.queue.record_stage(job, "indexed")
+
+            if "reply_queued" not in job.stages:
+                # Hand off to the outbox; the message ID is the idempotency key, so a
+                # retried job can never queue a second reply
+                email_draft = result['email']
+                self.sender.submit(
+                    msg_id,
+                    to_email=email_data.sender_email,
+                    subject=email_draft['email_subject'],
+                    body=email_draft['email_body']
+                )
+                self.queue.record_stage(job, "reply_queued")
+                self.state.log_activity(f"Reply queued for {email_data.sender_email}")
+
+        self._mark_read(job, gmail)
+
+    def _prescreen(self, job: Job, email_data: IncomingEmail, agent: HiringAgent):
+        """
+        Scores the raw resume text of a classified application against the JD's
+        skills, then hands the job back to the queue ranked by that score
+        (raises Released). A hopeless resume is rejected without further LLM
+        calls (a REJECT result with a templated reply is recorded as the
+        screened stage and the job carries on through the normal stages) or
+        deferred to off-peak hours, per `hopeless_action`.
+        `audit_rate` of those still get the full pipeline so the cascade's
+        false-negative rate can be measured. The extracted text is kept on the
+        stage so screening doesn't extract it again.
+        """
+        text = ResumeParser.extract_text(email_data.attachment_path)
+        result = self.prescreener.score(text)
+        action = "process"
+        if result["hopeless"]:
+            action = self.hopeless_action
+            if action != "process" and random.random() < self.audit_rate:
+                action = "process"
+                result["audit"] = True
+        result["action"] = action
+
+        if action == "reject":
+            # Screened first: a crash before the prescreened stage then just re-runs this cheap step
+            self.queue.record_stage(job, "screened", agent.prescreen_reject(email_data, self.jd, text, result))
+            self.queue.record_stage(job, "prescreened", result)
+            self.state.log_activity(f"Pre-screen rejected {email_data.sender_email}: matched "
+                                    f"{result['mandatory_fraction']:.0%} of mandatory skills (LLM skipped)",
+                                    level="WARNING")
+            return
+
+        result["resume_text"] = text
+        self.queue.record_stage(job, "prescreened", result)
+        available_at = None
+        if action == "defer":
+            available_at = next_off_peak(self.off_peak_hour)
+            self.state.log_activity(f"Deferred {email_data.sender_email} to off-peak: matched "
+                                    f"{result['mandatory_fraction']:.0%} of mandatory skills")
+        self.queue.release(job, priority=result["score"], available_at=available_at)
+        raise Released()
+
+    @contextmanager
+    def _stage(self, name: str):
+        with self.profiler.stage(name) if self.profiler else nullcontext(), \
+                self.usage.stage(name) if self.usage else nullcontext():
+            yield
+
+    def _mark_read(self, job: Job, gmail: MailSource):
+        if "marked_read" not in job.stages:
+            # A dry run must leave the live mailbox as it found it
+            if not self.dry_run:
+                with self._stage("gmail.mark_as_read"):
+                    gmail.mark_as_read(job.message_id)
+            self.queue.record_stage(job, "marked_read")
 
 def main():
     parser = argparse.ArgumentParser(description="Realtime Resume Screening Bot (Gmail)")
     parser.add_argument("--jd", required=True, help="Path to Job Description file (TXT)")
     parser.add_argument("--model", default="llama3.2:3b", help="Ollama model name")
     parser.add_argument("--cutoff", type=int, default=70, help="ATS Score Cutoff")
-    parser.add_argument("--interval", type=int, default=60, help="Polling interval in seconds")
+    parser.add_argument("--interval", type=int, default=60, help="Polling interval in seconds after new mail")
+    parser.add_argument("--max-interval", type=int, default=300, help="Ceiling for idle polling backoff in seconds")
+    parser.add_argument("--quota-rate", type=float, default=DEFAULT_UNITS_PER_SECOND,
+                        help="Gmail quota units per second to stay under")
+    parser.add_argument("--send-workers", type=int, default=2, help="Background reply sender threads")
+    parser.add_argument("--sends-per-minute", type=int, default=20, help="Outbound reply rate limit")
+    parser.add_argument("--queue", default=QUEUE_FILE, help="Path to the SQLite work queue")
+    parser.add_argument("--workers", type=int, default=1, help="Number of screening consumer threads")
+    parser.add_argument("--max-attempts", type=int, default=5, help="Attempts before a message is dead-lettered")
+    parser.add_argument("--no-dedup-reuse", action="store_true",
+                        help="Detect near-duplicate resumes but always re-run extraction and scoring")
+    parser.add_argument("--semantic", action="store_true",
+                        help="Score skills/keywords with cached embeddings instead of an LLM call per candidate")
+    parser.add_argument("--embed-model", default="nomic-embed-text", help="Ollama embedding model name")
+    parser.add_argument("--max-attachment-mb", type=float, default=DEFAULT_MAX_ATTACHMENT_MB,
+                        help="Skip resume attachments larger than this")
+    parser.add_argument("--disk-quota-mb", type=float, default=DEFAULT_DISK_QUOTA_MB,
+                        help="Evict least recently used downloads above this")
+    parser.add_argument("--max-artifact-age-days", type=float, default=DEFAULT_MAX_AGE_DAYS,
+                        help="Delete downloads older than this")
+    parser.add_argument("--memory-limit-mb", type=float, default=DEFAULT_MEMORY_LIMIT_MB,
+                        help="Pause screening while RSS is above this")
+    parser.add_argument("--tracemalloc", action="store_true", help="Report top allocation sites in metrics")
+    parser.add_argument("--no-prescreen", action="store_true", help="Skip the keyword pre-screen and queue ranking")
+    parser.add_argument("--hopeless", choices=HOPELESS_ACTIONS, default="process",
+                        help="What to do with resumes the pre-screen finds hopeless")
+    parser.add_argument("--min-mandatory", type=float, default=0.0,
+                        help="Hopeless when at most this fraction of mandatory skills is found")
+    parser.add_argument("--audit-rate", type=float, default=0.05,
+                        help="Share of hopeless resumes still fully screened to measure false negatives")
+    parser.add_argument("--off-peak-hour", type=int, default=22, help="Local hour deferred resumes become ready")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile screening stages (cProfile, tracemalloc, wall vs CPU time)")
+    parser.add_argument("--profile-every", type=int, default=1, help="Profile one message in this many")
+    parser.add_argument("--profile-dir", default=PROFILE_DIR, help="Where per-message profiles are written")
+    parser.add_argument("--source", help="Read mail from a local Maildir directory or mbox file instead of Gmail "
+                                         "(implies --dry-run)")
+    parser.add_argument("--source-workers", type=int, help="Processes parsing local messages (default: CPUs - 1; 0 parses inline)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help=f"Write replies to {DRY_RUN_FILE} instead of sending them")
+    parser.add_argument("--slo-seconds", type=float,
+                        help="End-to-end latency target per candidate; cheapen screening while it is at risk")
+    parser.add_argument("--small-model", help="Smaller Ollama model to route to when degrading (e.g. llama3.2:1b)")
+    parser.add_argument("--exit-when-done", action="store_true",
+                        help="Stop once the source has nothing new and the queue and outbox are empty")
+    parser.add_argument("--usage-db", default=USAGE_FILE,
+                        help="Ledger of token and compute usage per message and stage (python usage_ledger.py reports it)")
 
     args = parser.parse_args()
 
     # Create stop event for standalone run (Ctrl+C will handle it mainly, but good practice)
     stop_event = threading.Event()
-    service = BotService(args.jd, args.model, args.cutoff, args.interval)
+    service = BotService(args.jd, args.model, args.cutoff, args.interval,
+                         queue_path=args.queue, workers=args.workers, max_attempts=args.max_attempts,
+                         reuse_duplicates=not args.no_dedup_reuse,
+                         semantic=args.semantic, embedding_model=args.embed_model,
+                         max_interval=args.max_interval, quota_units_per_second=args.quota_rate,
+                         send_workers=args.send_workers, sends_per_minute=args.sends_per_minute,
+                         max_attachment_mb=args.max_attachment_mb, disk_quota_mb=args.disk_quota_mb,
+                         max_artifact_age_days=args.max_artifact_age_days,
+                         memory_limit_mb=args.memory_limit_mb, trace_memory=args.tracemalloc,
+                         prescreen=not args.no_prescreen, hopeless_action=args.hopeless,
+                         min_mandatory=args.min_mandatory, audit_rate=args.audit_rate,
+                         off_peak_hour=args.off_peak_hour,
+                         profile_dir=args.profile_dir if args.profile else None, profile_every=args.profile_every,
+                         source_path=args.source, source_workers=args.source_workers, dry_run=args.dry_run,
+                         exit_when_done=args.exit_when_done, slo_seconds=args.slo_seconds,
+                         small_model=args.small_model, usage_path=args.usage_db)
     
     try:
         service.run(stop_event)
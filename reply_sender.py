@@ -0,0 +1,189 @@
+import random
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, Optional, TYPE_CHECKING
+from termcolor import colored
+from scheduler import TokenBucket, RateLimitError
+from state_manager import StateManager
+
+if TYPE_CHECKING:
+    from profiler import Profiler
+
+OUTBOX_FILE = "outbox.db"
+
+PENDING = "PENDING"
+SENDING = "SENDING"
+SENT = "SENT"
+FAILED = "FAILED"
+UNKNOWN = "UNKNOWN"
+
+
+class ReplySender:
+    """
+    Outbound reply subsystem: a durable outbox drained by a pool of background workers.
+
+    Replies are submitted with an idempotency key (the Gmail message ID of the
+    application), and the outbox holds at most one reply per key. Workers send
+    under a per-minute limit and retry failures with exponential backoff until
+    they are marked FAILED.
+
+    Delivery is at-most-once. A row is marked SENDING before the Gmail call,
+    so a reply interrupted by a crash becomes UNKNOWN for manual review and is
+    never resent automatically.
+
+    With a `profiler`, every Gmail send is timed, so it shows up in the
+    hotspot report next to the screening stages.
+    """
+
+    def __init__(self, client_factory: Callable, db_path: str = OUTBOX_FILE, workers: int = 2,
+                 per_minute: int = 20, max_attempts: int = 5, base_backoff: float = 30.0,
+                 state: Optional[StateManager] = None, profiler: Optional["Profiler"] = None):
+        self.client_factory = client_factory
+        self.db_path = db_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.state = state or StateManager()
+        self.profiler = profiler
+        self.limiter = TokenBucket(rate=per_minute / 60.0, capacity=max(1, per_minute // 10))
+        self._local = threading.local()
+        self._threads = []
+        self._init_db()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                idempotency_key TEXT PRIMARY KEY,
+                to_email TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                last_error TEXT,
+                gmail_id TEXT,
+                created_at REAL NOT NULL,
+                sent_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_outbox_ready ON outbox (status, available_at);
+        """)
+        # Sends interrupted by a previous crash may or may not have gone out
+        conn.execute("UPDATE outbox SET status = ?, last_error = 'interrupted while sending' WHERE status = ?",
+                     (UNKNOWN, SENDING))
+
+    def submit(self, idempotency_key: str, to_email: str, subject: str, body: str) -> bool:
+        """Queues a reply. Returns False if one was already queued under this key."""
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT OR IGNORE INTO outbox (idempotency_key, to_email, subject, body, status, available_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (idempotency_key, to_email, subject, body, PENDING, now, now))
+        created = cur.rowcount == 1
+        if created:
+            self.state.set_reply_status(idempotency_key, PENDING)
+        return created
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM outbox WHERE status = ? AND available_at <= ? ORDER BY available_at LIMIT 1",
+                (PENDING, time.time())).fetchone()
+            if row is not None:
+                conn.execute("UPDATE outbox SET status = ?, attempts = attempts + 1 WHERE idempotency_key = ?",
+                             (SENDING, row["idempotency_key"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _finish(self, key: str, status: str, error: Optional[str] = None, gmail_id: Optional[str] = None,
+                available_at: Optional[float] = None):
+        self._conn().execute(
+            "UPDATE outbox SET status = ?, last_error = ?, gmail_id = COALESCE(?, gmail_id), "
+            "available_at = COALESCE(?, available_at), sent_at = CASE WHEN ? = 'SENT' THEN ? ELSE sent_at END "
+            "WHERE idempotency_key = ?",
+            (status, error, gmail_id, available_at, status, time.time(), key))
+        self.state.set_reply_status(key, status)
+
+    def _ready(self) -> bool:
+        return self._conn().execute("SELECT 1 FROM outbox WHERE status = ? AND available_at <= ? LIMIT 1",
+                                    (PENDING, time.time())).fetchone() is not None
+
+    def _worker(self, stop_event: threading.Event):
+        client = None
+        client_failures = 0
+        while not stop_event.is_set():
+            if not self._ready():
+                stop_event.wait(1)
+                continue
+
+            if client is None:
+                try:
+                    client = self.client_factory()
+                    client_failures = 0
+                except Exception as e:
+                    client_failures += 1
+                    delay = min(self.base_backoff * (2 ** (client_failures - 1)), 600)
+                    print(colored(f"Reply sender could not create a mail client, retrying in {delay:.0f}s: {e}", "red"))
+                    self.state.log_activity(f"Reply sender could not create a mail client: {e}", level="ERROR")
+                    stop_event.wait(delay)
+                    continue
+
+            # Wait for a send token before claiming: a crash while throttled must leave the reply PENDING, not UNKNOWN
+            self.limiter.acquire("outbound", 1)
+            row = self._claim()
+            if row is None:
+                continue  # another worker took it
+
+            key = row["idempotency_key"]
+            try:
+                with self.profiler.timed("gmail.send_reply") if self.profiler else nullcontext():
+                    gmail_id = client.send_reply(row["to_email"], row["subject"], row["body"])
+                self._finish(key, SENT, gmail_id=gmail_id)
+                self.state.log_activity(f"Reply sent to {row['to_email']}", level="SUCCESS")
+            except Exception as e:
+                attempts = row["attempts"] + 1
+                if attempts >= self.max_attempts:
+                    self._finish(key, FAILED, error=str(e))
+                    print(colored(f"Reply to {row['to_email']} failed permanently: {e}", "red"))
+                    self.state.log_activity(f"Reply to {row['to_email']} FAILED after {attempts} attempts: {e}",
+                                            level="ERROR")
+                else:
+                    delay = self.base_backoff * (2 ** (attempts - 1))
+                    if isinstance(e, RateLimitError) and e.retry_after:
+                        delay = max(delay, e.retry_after)
+                    self._finish(key, PENDING, error=str(e), available_at=time.time() + delay * random.uniform(0.8, 1.2))
+                    self.state.log_activity(f"Reply to {row['to_email']} failed, retrying in {delay:.0f}s: {e}",
+                                            level="WARNING")
+            self.state.update_metrics("outbox", self.stats())
+
+    def start(self, stop_event: threading.Event):
+        for _ in range(self.workers):
+            t = threading.Thread(target=self._worker, args=(stop_event,), daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def join(self):
+        for t in self._threads:
+            t.join()
+
+    def stats(self) -> Dict[str, int]:
+        counts = {PENDING: 0, SENDING: 0, SENT: 0, FAILED: 0, UNKNOWN: 0}
+        for row in self._conn().execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        return counts
@@ -0,0 +1,158 @@
+import gc
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Set
+from termcolor import colored
+from state_manager import StateManager
+
+DOWNLOAD_DIR = "temp"
+DEFAULT_MAX_ATTACHMENT_MB = 10
+DEFAULT_DISK_QUOTA_MB = 500
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_MEMORY_LIMIT_MB = 1024
+
+
+def current_rss_mb() -> Optional[float]:
+    """
+    Resident set size of this process, or None where it can't be read. There
+    is deliberately no ru_maxrss fallback: that is the peak, which never comes
+    back down, so shedding on it would pause screening for good.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ResourceGovernor:
+    """
+    Keeps a long-running bot's footprint bounded.
+
+    - Disk: files under `root` older than `max_age_days` are deleted, then the
+      least recently used are evicted until usage fits `disk_quota_mb`. Files
+      pinned by an in-flight job are never touched.
+    - Memory: RSS (and optionally tracemalloc) is sampled periodically. Above
+      `memory_limit_mb` the governor sheds load: `should_shed()` turns true and
+      consumers stop leasing new work until RSS drops below 90% of the limit.
+    """
+
+    def __init__(self, root: str = DOWNLOAD_DIR, disk_quota_mb: float = DEFAULT_DISK_QUOTA_MB,
+                 max_age_days: float = DEFAULT_MAX_AGE_DAYS, memory_limit_mb: float = DEFAULT_MEMORY_LIMIT_MB,
+                 sample_interval: float = 30.0, sweep_interval: float = 600.0, trace_memory: bool = False,
+                 state: Optional[StateManager] = None):
+        self.root = root
+        self.disk_quota_bytes = disk_quota_mb * 2**20
+        self.max_age = max_age_days * 86400
+        self.memory_limit_mb = memory_limit_mb
+        self.sample_interval = sample_interval
+        self.sweep_interval = sweep_interval
+        self.trace_memory = trace_memory
+        self.state = state or StateManager()
+        self._pinned: Set[str] = set()
+        self._lock = threading.Lock()
+        self._shedding = False
+        self._metrics: Dict[str, Any] = {"evicted_files": 0, "evicted_mb": 0.0, "shed_events": 0}
+
+    def pin(self, path: Optional[str]):
+        if path:
+            with self._lock:
+                self._pinned.add(os.path.abspath(path))
+
+    def unpin(self, path: Optional[str]):
+        if path:
+            with self._lock:
+                self._pinned.discard(os.path.abspath(path))
+
+    def should_shed(self) -> bool:
+        return self._shedding
+
+    def sweep(self) -> Dict[str, Any]:
+        """Applies the age limit and disk quota. Returns usage after cleanup."""
+        files = []
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                # atime is often disabled (noatime), so use whichever is newer
+                files.append((max(st.st_atime, st.st_mtime), st.st_size, os.path.abspath(path)))
+
+        now = time.time()
+        with self._lock:
+            pinned = set(self._pinned)
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        kept = []
+        for last_used, size, path in files:
+            expired = now - last_used > self.max_age
+            over_quota = total > self.disk_quota_bytes
+            if path not in pinned and (expired or over_quota):
+                try:
+                    os.remove(path)
+                except OSError:
+                    kept.append(size)
+                    continue
+                total -= size
+                self._metrics["evicted_files"] += 1
+                self._metrics["evicted_mb"] = round(self._metrics["evicted_mb"] + size / 2**20, 2)
+            else:
+                kept.append(size)
+        return {"disk_usage_mb": round(total / 2**20, 2), "files": len(kept)}
+
+    def sample(self) -> Dict[str, Any]:
+        """Samples memory and updates the load-shedding flag."""
+        rss = current_rss_mb()
+        sample: Dict[str, Any] = {"rss_mb": round(rss, 1) if rss is not None else None}
+        if self.trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            sample["traced_mb"] = round(current / 2**20, 1)
+            sample["traced_peak_mb"] = round(peak / 2**20, 1)
+            sample["top_allocations"] = self._top_allocations()
+
+        if rss is None:
+            self._shedding = False  # memory can't be measured here; never pause on a stale reading
+        else:
+            if not self._shedding and rss > self.memory_limit_mb:
+                self._shedding = True
+                self._metrics["shed_events"] += 1
+                gc.collect()
+                print(colored(f"\nMemory {rss:.0f} MB over {self.memory_limit_mb:.0f} MB limit; pausing new work", "red"))
+                self.state.log_activity(f"Memory {rss:.0f} MB over limit; pausing new work", level="WARNING")
+            elif self._shedding and rss < 0.9 * self.memory_limit_mb:
+                self._shedding = False
+                self.state.log_activity(f"Memory back to {rss:.0f} MB; resuming work", level="SUCCESS")
+        sample["shedding"] = self._shedding
+        return sample
+
+    @staticmethod
+    def _top_allocations(limit: int = 5) -> List[str]:
+        stats = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]).statistics("lineno")
+        return [f"{s.traceback[0].filename}:{s.traceback[0].lineno} {s.size / 2**10:.0f} KiB" for s in stats[:limit]]
+
+    def _loop(self, stop_event: threading.Event):
+        last_sweep = 0.0
+        usage: Dict[str, Any] = {}
+        while not stop_event.is_set():
+            try:
+                if time.monotonic() - last_sweep >= self.sweep_interval:
+                    usage = self.sweep()
+                    last_sweep = time.monotonic()
+                self.state.update_metrics("resources", dict(self._metrics, **usage, **self.sample()))
+            except Exception as e:
+                print(colored(f"\nResource governor error: {e}", "red"))
+            stop_event.wait(self.sample_interval)
+
+    def start(self, stop_event: threading.Event) -> threading.Thread:
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        t = threading.Thread(target=self._loop, args=(stop_event,), daemon=True)
+        t.start()
+        return t
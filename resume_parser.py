@@ -1,6 +1,4 @@
 import os
-from pypdf import PdfReader
-from docx import Document
 
 class ResumeParser:
     @staticmethod
@@ -23,6 +21,8 @@ class ResumeParser:
 
     @staticmethod
     def _extract_from_pdf(file_path: str) -> str:
+        # Imported lazily: pypdf is only needed when a PDF is actually parsed
+        from pypdf import PdfReader
         text = ""
         try:
             reader = PdfReader(file_path)
@@ -35,6 +35,7 @@ class ResumeParser:
 
     @staticmethod
     def _extract_from_docx(file_path: str) -> str:
+        from docx import Document
         text = ""
         try:
             doc = Document(file_path)
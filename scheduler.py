@@ -0,0 +1,145 @@
+import threading
+import time
+from typing import Dict, Any, Optional
+
+# Gmail API per-user quota units per method
+# https://developers.google.com/gmail/api/reference/quota
+GMAIL_QUOTA_COSTS = {
+    "messages.list": 5,
+    "messages.get": 5,
+    "messages.attachments.get": 5,
+    "messages.modify": 5,
+    "messages.send": 100
+}
+# Gmail allows 250 units/user/second; stay a little under it
+DEFAULT_UNITS_PER_SECOND = 200
+
+
+class RateLimitError(Exception):
+    """Raised when Gmail answers with a rate-limit response (429 / 403 rateLimitExceeded)."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket charged in Gmail quota units. `acquire` blocks
+    until enough units have refilled; `pause` empties the bucket and holds it
+    closed for a while after a rate-limit response.
+    """
+
+    def __init__(self, rate: float = DEFAULT_UNITS_PER_SECOND, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.units_spent: Dict[str, int] = {}
+        self.wait_seconds = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, method: str, cost: Optional[float] = None):
+        cost = GMAIL_QUOTA_COSTS.get(method, 5) if cost is None else cost
+        cost = min(cost, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._paused_until:
+                    self._refill(now)
+                    if self.tokens >= cost:
+                        self.tokens -= cost
+                        self.units_spent[method] = self.units_spent.get(method, 0) + int(cost)
+                        return
+                    wait = (cost - self.tokens) / self.rate
+                else:
+                    wait = self._paused_until - now
+                self.wait_seconds += wait
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self.tokens = 0
+            self._updated = now + seconds
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(max(time.monotonic(), self._updated))
+            return {
+                "tokens_available": round(self.tokens, 1),
+                "units_per_second": self.rate,
+                "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 1),
+                "throttled_seconds": round(self.wait_seconds, 1),
+                "units_spent": dict(self.units_spent)
+            }
+
+
+class PollScheduler:
+    """
+    Decides how long to wait before the next inbox poll.
+
+    While a backlog exists (more pages of unread mail) and the last page held
+    new messages, it re-polls immediately. A page of already-queued IDs counts
+    as idle, so a standing backlog isn't re-listed in a tight loop. When a poll
+    finds new mail it waits `min_interval`. Each consecutive idle
+    poll doubles the wait up to `max_interval`, and rate-limit responses back
+    off the same way, honouring any Retry-After.
+    """
+
+    def __init__(self, min_interval: float = 5, max_interval: float = 300):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.delay = min_interval
+        self.idle_streak = 0
+        self.rate_limit_streak = 0
+        self.polls = 0
+        self.backlog_polls = 0
+        self.rate_limited = 0
+        self.last_poll = None
+
+    def _backoff(self, streak: int) -> float:
+        return min(self.min_interval * (2 ** streak), self.max_interval)
+
+    def on_poll(self, new_messages: int, has_more: bool) -> float:
+        self.polls += 1
+        self.last_poll = time.time()
+        self.rate_limit_streak = 0
+        if has_more and new_messages:
+            self.backlog_polls += 1
+            self.idle_streak = 0
+            self.delay = 0
+        elif new_messages:
+            self.idle_streak = 0
+            self.delay = self.min_interval
+        else:
+            self.delay = self._backoff(self.idle_streak)
+            self.idle_streak += 1
+        return self.delay
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> float:
+        self.rate_limited += 1
+        self.rate_limit_streak += 1
+        self.delay = max(retry_after or 0, self._backoff(self.rate_limit_streak))
+        return self.delay
+
+    def on_error(self) -> float:
+        self.delay = self._backoff(self.idle_streak)
+        self.idle_streak += 1
+        return self.delay
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "next_poll_in": round(self.delay, 1),
+            "idle_streak": self.idle_streak,
+            "polls": self.polls,
+            "backlog_polls": self.backlog_polls,
+            "rate_limited": self.rate_limited,
+            "last_poll": self.last_poll
+        }
@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+import numpy as np
+from termcolor import colored
+from ats_scorer import SCORE_WEIGHTS
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads within one process are serialized
+    fcntl = None
+
+STORE_DIR = "score_store"
+
+COMPONENTS = list(SCORE_WEIGHTS)
+COLUMNS = {
+    **{c: np.float32 for c in COMPONENTS},
+    "final_ats_score": np.float32,
+    "cutoff": np.float32,
+    "decision": np.int8,  # 1 = PROCEED, 0 = REJECT
+    "timestamp": np.float64
+}
+
+# Appends and rewrites are serialized by this lock within a process and by an
+# flock on a sidecar lock file across processes (the bot appends while
+# `score_store.py --apply` rewrites columns).
+_lock = threading.Lock()
+
+
+class ScoreStore:
+    """
+    Append-only columnar store of every candidate's ATSScore components.
+
+    Each column is a flat binary file of fixed-width values, so an append is a
+    few bytes per column and a full column loads straight into a NumPy array.
+    Candidate metadata (id, name, email, role) lives alongside in a JSONL file
+    with one line per row.
+
+    The meta line is written last and is what makes a row count. On open, and
+    after a failed append, every column is truncated back to the rows that have
+    one, so a crash between column writes can never shift later rows out of
+    alignment. Each candidate ID is stored once; appending it again is a no-op.
+
+    `reevaluate` compares the weighted decisions under a new policy with those
+    under the policy the rows were decided by: the weights last applied
+    (policy.json) for the rows that existed then, SCORE_WEIGHTS for later
+    ones, and each row's own cutoff. Rows whose recorded decision (the
+    scorer's own final score) disagrees with that are reported as drift,
+    apart from the flips.
+    """
+
+    def __init__(self, store_dir: str = STORE_DIR):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self._ids = set()
+        with self._exclusive():
+            self._repair()
+
+    @contextmanager
+    def _exclusive(self):
+        with _lock:
+            fd = None
+            if fcntl is not None:
+                fd = os.open(os.path.join(self.store_dir, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fd is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                    os.close(fd)
+
+    def _column_path(self, name: str) -> str:
+        return os.path.join(self.store_dir, f"{name}.bin")
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.store_dir, "meta.jsonl")
+
+    def _policy_path(self) -> str:
+        return os.path.join(self.store_dir, "policy.json")
+
+    def _policy_weights(self, n: int) -> np.ndarray:
+        """Per-row weights the first `n` rows' current decisions were made with."""
+        default = np.array([SCORE_WEIGHTS[c] for c in COMPONENTS], dtype=np.float32)
+        weights = np.tile(default, (n, 1))
+        if os.path.exists(self._policy_path()):
+            with open(self._policy_path()) as f:
+                policy = json.load(f)
+            applied = min(n, policy["rows"])
+            weights[:applied] = [policy["weights"].get(c, 0.0) for c in COMPONENTS]
+        return weights
+
+    def _repair(self):
+        """Truncates the meta file and every column to the complete rows, and reloads the stored IDs."""
+        offsets = [0]
+        ids = []
+        if os.path.exists(self._meta_path()):
+            with open(self._meta_path(), "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # cut off mid-write
+                    try:
+                        ids.append(json.loads(line)["id"])
+                    except (ValueError, KeyError):
+                        break
+                    offsets.append(offsets[-1] + len(line))
+
+        sizes = {name: os.path.getsize(self._column_path(name)) // np.dtype(dtype).itemsize
+                 if os.path.exists(self._column_path(name)) else 0 for name, dtype in COLUMNS.items()}
+        n = min([len(ids)] + list(sizes.values()))
+        if os.path.exists(self._meta_path()):
+            os.truncate(self._meta_path(), offsets[n])
+        for name, dtype in COLUMNS.items():
+            if sizes[name] > n:
+                os.truncate(self._column_path(name), n * np.dtype(dtype).itemsize)
+        self._ids = set(ids[:n])
+
+    def append(self, candidate_id: str, score: Dict[str, float], decision: str, cutoff: float,
+               name: str = "", email: str = "", role: str = "", degradation_level: int = 0) -> bool:
+        """Appends one candidate's row. Returns False if the candidate is already stored."""
+        row = {c: score.get(c, 0.0) for c in COMPONENTS}
+        row["final_ats_score"] = score.get("final_ats_score", 0.0)
+        row["cutoff"] = cutoff
+        row["decision"] = 1 if decision == "PROCEED" else 0
+        row["timestamp"] = time.time()
+
+        with self._exclusive():
+            if candidate_id in self._ids:
+                return False
+            try:
+                for name_, dtype in COLUMNS.items():
+                    with open(self._column_path(name_), "ab") as f:
+                        f.write(np.asarray([row[name_]], dtype=dtype).tobytes())
+                # Metadata is written last: a row only counts once its meta line exists
+                with open(self._meta_path(), "a") as f:
+                    f.write(json.dumps({"id": candidate_id, "name": name, "email": email, "role": role,
+                                        "degradation_level": degradation_level}) + "\n")
+            except BaseException:
+                self._repair()
+                raise
+            self._ids.add(candidate_id)
+            return True
+
+    def load(self) -> Dict[str, Any]:
+        """Loads all columns as NumPy arrays plus the metadata list, trimmed to complete rows."""
+        meta = []
+        if os.path.exists(self._meta_path()):
+            with open(self._meta_path()) as f:
+                meta = [json.loads(line) for line in f if line.strip()]
+
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            path = self._column_path(name)
+            columns[name] = np.fromfile(path, dtype=dtype) if os.path.exists(path) else np.empty(0, dtype=dtype)
+
+        n = min([len(meta)] + [len(col) for col in columns.values()])
+        columns = {name: col[:n] for name, col in columns.items()}
+        columns["meta"] = meta[:n]
+        return columns
+
+    def reevaluate(self, weights: Optional[Dict[str, float]] = None, cutoff: float = 70) -> Dict[str, Any]:
+        """
+        Recomputes final scores and decisions for every stored candidate from
+        their component scores with one matrix-vector product. Weights are
+        normalised to sum to 1. Returns the new scores/decisions, the
+        candidates whose decision flips between the current policy and the new
+        one, and (as `drift`) those whose recorded decision the current policy
+        doesn't reproduce.
+        """
+        weights = dict(SCORE_WEIGHTS if weights is None else weights)
+        unknown = set(weights) - set(COMPONENTS)
+        if unknown:
+            raise ValueError(f"Unknown score components: {sorted(unknown)}")
+        w = np.array([weights.get(c, 0.0) for c in COMPONENTS], dtype=np.float32)
+        if w.sum() <= 0:
+            raise ValueError("Weights must sum to a positive number")
+        w /= w.sum()
+
+        data = self.load()
+        matrix = np.column_stack([data[c] for c in COMPONENTS]) if data["meta"] else np.empty((0, len(COMPONENTS)), np.float32)
+        new_scores = matrix @ w
+        new_decisions = (new_scores >= cutoff).astype(np.int8)
+        # The current policy applied to the same components, so only the policy change can flip a decision
+        old_scores = np.einsum("ij,ij->i", matrix, self._policy_weights(len(matrix)))
+        old_decisions = (old_scores >= data["cutoff"]).astype(np.int8)
+
+        def rows(mask: np.ndarray, scores: np.ndarray) -> List[Dict[str, Any]]:
+            idx = np.flatnonzero(mask)
+            idx = idx[np.argsort(-scores[idx])]
+            return [
+                dict(data["meta"][i], old_score=round(float(old_scores[i]), 1),
+                     new_score=round(float(new_scores[i]), 1),
+                     recorded_score=round(float(data["final_ats_score"][i]), 1))
+                for i in idx
+            ]
+
+        return {
+            "count": len(new_scores),
+            "weights": dict(zip(COMPONENTS, w.tolist())),
+            "cutoff": cutoff,
+            "scores": new_scores,
+            "decisions": new_decisions,
+            "proceed_before": int(old_decisions.sum()),
+            "proceed_after": int(new_decisions.sum()),
+            "to_proceed": rows((old_decisions == 0) & (new_decisions == 1), new_scores),
+            "to_reject": rows((old_decisions == 1) & (new_decisions == 0), new_scores),
+            "drift": rows(old_decisions != data["decision"], old_scores)
+        }
+
+    def apply(self, result: Dict[str, Any]):
+        """Persists the scores/decisions from `reevaluate` as the current ones, and its weights as the policy."""
+        n = result["count"]
+        with self._exclusive():
+            for name, values in (("final_ats_score", result["scores"]), ("decision", result["decisions"]),
+                                 ("cutoff", np.full(n, result["cutoff"]))):
+                path = self._column_path(name)
+                current = np.fromfile(path, dtype=COLUMNS[name]) if os.path.exists(path) else np.empty(0, COLUMNS[name])
+                # Rows appended after the reevaluation keep their own values
+                current[:n] = values
+                tmp_path = path + ".tmp"
+                current.tofile(tmp_path)
+                os.replace(tmp_path, path)
+            tmp_path = self._policy_path() + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"weights": result["weights"], "rows": n}, f)
+            os.replace(tmp_path, self._policy_path())
+
+
+def parse_weights(text: str) -> Dict[str, float]:
+    """Parses 'skill=0.6,experience=0.2,...' (the '_score' suffix is optional)."""
+    weights = {}
+    for part in text.split(","):
+        key, _, value = part.partition("=")
+        key = key.strip()
+        if not key.endswith("_score"):
+            key += "_score"
+        weights[key] = float(value)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-decide historical candidates with new weights/cutoff")
+    parser.add_argument("--cutoff", type=float, default=70, help="New ATS Score Cutoff")
+    parser.add_argument("--weights", default=None,
+                        help="Component weights, e.g. skill=0.5,experience=0.2,keyword=0.2,education=0.1")
+    parser.add_argument("--store", default=STORE_DIR, help="Score store directory")
+    parser.add_argument("--show", type=int, default=20, help="Max flipped candidates to list per direction")
+    parser.add_argument("--apply", action="store_true", help="Persist the new scores and decisions")
+    args = parser.parse_args()
+
+    store = ScoreStore(args.store)
+    weights = parse_weights(args.weights) if args.weights else None
+    result = store.reevaluate(weights, args.cutoff)
+
+    print(f"Candidates: {result['count']}")
+    print(f"Weights: {', '.join(f'{k}={v:.2f}' for k, v in result['weights'].items())} | Cutoff: {args.cutoff}")
+    print(f"PROCEED: {result['proceed_before']} -> {result['proceed_after']}")
+
+    for label, key, color in (("REJECT -> PROCEED", "to_proceed", "green"), ("PROCEED -> REJECT", "to_reject", "red")):
+        flipped = result[key]
+        print(colored(f"\n{label}: {len(flipped)}", color))
+        for row in flipped[:args.show]:
+            print(f"  {row['name'] or row['id']} <{row['email']}> [{row['role']}] "
+                  f"{row['old_score']} -> {row['new_score']}")
+        if len(flipped) > args.show:
+            print(f"  ... and {len(flipped) - args.show} more")
+
+    if result["drift"]:
+        print(colored(f"\nRecorded decisions the current weights don't reproduce (scorer drift, not flips): "
+                      f"{len(result['drift'])}", "yellow"))
+        for row in result["drift"][:args.show]:
+            print(f"  {row['name'] or row['id']} <{row['email']}> [{row['role']}] "
+                  f"recorded {row['recorded_score']}, weighted {row['old_score']}")
+        if len(result["drift"]) > args.show:
+            print(f"  ... and {len(result['drift']) - args.show} more")
+
+    if args.apply:
+        store.apply(result)
+        print(colored("\nApplied new scores and decisions.", "yellow"))
+
+if __name__ == "__main__":
+    main()
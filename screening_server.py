@@ -0,0 +1,350 @@
+import argparse
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlparse, parse_qs
+from termcolor import colored
+from agent import HiringAgent
+from llm_client import LLMClient, extraction_metrics
+from dedup import DuplicateIndex
+from resources import DEFAULT_MAX_ATTACHMENT_MB
+
+UPLOAD_DIR = os.path.join("temp", "uploads")
+JOB_TTL_SECONDS = 3600
+
+
+class QueueFull(Exception):
+    pass
+
+
+class ScreeningJob:
+    def __init__(self, jd_id: str, resume_path: str):
+        self.id = uuid.uuid4().hex
+        self.jd_id = jd_id
+        self.resume_path = resume_path
+        self.status = "queued"
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "jd_id": self.jd_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "result": self.result
+        }
+
+
+class MicroBatcher:
+    """
+    Collects concurrent screening requests into small batches.
+
+    A batch closes when it reaches `max_batch` jobs or `max_wait` seconds after
+    its first job, whichever comes first. Jobs are grouped by JD and handed to
+    HiringAgent.screen_batch, so concurrent requests share LLM and scoring work.
+    The pending queue is bounded at `max_queue` to provide backpressure.
+    """
+
+    def __init__(self, agent: HiringAgent, jds: Dict[str, Dict[str, Any]], config: dict,
+                 max_batch: int = 8, max_wait: float = 0.05, max_queue: int = 64, workers: int = 1):
+        self.agent = agent
+        self.jds = jds
+        self.config = config
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pending: "queue.Queue[ScreeningJob]" = queue.Queue(maxsize=max_queue)
+        self.jobs: Dict[str, ScreeningJob] = {}
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.batched_jobs = 0
+        for _ in range(workers):
+            threading.Thread(target=self._loop, daemon=True).start()
+
+    def submit(self, jd_id: str, resume_path: str) -> ScreeningJob:
+        job = ScreeningJob(jd_id, resume_path)
+        try:
+            self.pending.put_nowait(job)
+        except queue.Full:
+            raise QueueFull(f"Screening queue is full ({self.pending.maxsize} pending)")
+        with self._lock:
+            self._evict_expired()
+            self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[ScreeningJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _evict_expired(self):
+        cutoff = time.time() - JOB_TTL_SECONDS
+        for job_id in [j.id for j in self.jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def _collect(self) -> List[ScreeningJob]:
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            self.batches += 1
+            self.batched_jobs += len(batch)
+
+            by_jd: Dict[str, List[ScreeningJob]] = {}
+            for job in batch:
+                job.status = "running"
+                by_jd.setdefault(job.jd_id, []).append(job)
+
+            for jd_id, jobs in by_jd.items():
+                entry = self.jds[jd_id]
+                try:
+                    results = self.agent.screen_batch(
+                        [j.resume_path for j in jobs], entry["jd"], entry["text"], self.config)
+                except Exception as e:
+                    results = [{"error": str(e)}] * len(jobs)
+                for job, result in zip(jobs, results):
+                    result = dict(result)
+                    result.pop("resume_text", None)
+                    job.result = result
+                    job.status = "error" if "error" in result else "done"
+                    job.finished_at = time.time()
+                    job.done.set()
+                    try:
+                        os.remove(job.resume_path)
+                    except OSError:
+                        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.pending.qsize(),
+            "queue_limit": self.pending.maxsize,
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_jobs / self.batches, 2) if self.batches else 0.0,
+            "tracked_jobs": len(self.jobs)
+        }
+
+
+class ScreeningService:
+    """Holds parsed JDs warm in memory and fronts the micro-batcher."""
+
+    def __init__(self, agent: HiringAgent, config: dict, **batcher_options):
+        self.agent = agent
+        self.jds: Dict[str, Dict[str, Any]] = {}
+        self._jd_lock = threading.Lock()
+        self.batcher = MicroBatcher(agent, self.jds, config, **batcher_options)
+
+    def register_jd(self, text: str) -> Dict[str, Any]:
+        jd_id = hashlib.sha256(text.encode()).hexdigest()[:12]
+        with self._jd_lock:
+            entry = self.jds.get(jd_id)
+        if entry is None:
+            # Parsed outside the lock so registrations of different JDs don't queue behind each other's LLM call
+            jd = self.agent.parse_jd(text)
+            with self._jd_lock:
+                entry = self.jds.setdefault(jd_id, {"jd": jd, "text": text})
+        return {"jd_id": jd_id, "jd": entry["jd"].model_dump()}
+
+    def list_jds(self) -> List[Dict[str, Any]]:
+        with self._jd_lock:
+            items = list(self.jds.items())
+        return [{"jd_id": jd_id, "role_title": entry["jd"].role_title} for jd_id, entry in items]
+
+
+def _safe_filename(name: str) -> str:
+    base = os.path.basename(name or "resume.pdf")
+    return re.sub(r"[^A-Za-z0-9._-]", "_", base) or "resume.pdf"
+
+
+class ScreeningHandler(BaseHTTPRequestHandler):
+    service: ScreeningService = None
+    sync_timeout: float = 300.0
+    max_upload_bytes: int = int(DEFAULT_MAX_ATTACHMENT_MB * 2**20)
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _parse_upload(self, body: bytes, params: Dict[str, str]):
+        """Returns (filename, file bytes, form fields) from a multipart form or a raw body."""
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+            fields, filename, data = {}, None, None
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if part.get_filename():
+                    filename, data = part.get_filename(), part.get_payload(decode=True)
+                elif name:
+                    fields[name] = part.get_content().strip()
+            return filename, data, fields
+        return params.get("filename", "resume.pdf"), body, {}
+
+    def log_message(self, format, *args):
+        print(f"[{self.address_string()}] {format % args}")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._send_json(200, dict(self.service.batcher.stats(), jds=len(self.service.jds),
+                                      llm_extraction=extraction_metrics()))
+        elif url.path == "/jds":
+            self._send_json(200, {"jds": self.service.list_jds()})
+        elif url.path.startswith("/jobs/"):
+            job = self.service.batcher.get(url.path[len("/jobs/"):])
+            if job is None:
+                self._send_json(404, {"error": "unknown job"})
+            else:
+                self._send_json(200, job.to_dict())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if int(self.headers.get("Content-Length") or 0) > self.max_upload_bytes:
+            self.close_connection = True
+            self._send_json(413, {"error": f"upload exceeds {self.max_upload_bytes // 2**20} MB"})
+            return
+        body = self._read_body()
+
+        if url.path == "/jds":
+            text = body.decode("utf-8", "replace")
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                try:
+                    payload = json.loads(text or "{}")
+                except json.JSONDecodeError as e:
+                    self._send_json(400, {"error": f"invalid JSON body: {e}"})
+                    return
+                text = payload.get("text", "") if isinstance(payload, dict) else ""
+                if not isinstance(text, str):
+                    self._send_json(400, {"error": "\"text\" must be a string"})
+                    return
+            if not text.strip():
+                self._send_json(400, {"error": "empty JD text"})
+                return
+            try:
+                self._send_json(201, self.service.register_jd(text))
+            except Exception as e:
+                self._send_json(502, {"error": f"JD parsing failed: {e}"})
+            return
+
+        if url.path != "/screen":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        filename, data, fields = self._parse_upload(body, params)
+        params.update(fields)
+        jd_id = params.get("jd_id")
+        mode = params.get("mode", "sync")
+        if jd_id not in self.service.jds:
+            self._send_json(400, {"error": f"unknown jd_id {jd_id!r}; POST the JD to /jds first"})
+            return
+        if not data:
+            self._send_json(400, {"error": "no resume uploaded"})
+            return
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in (".pdf", ".docx", ".doc"):
+            self._send_json(415, {"error": f"unsupported resume format {ext!r}"})
+            return
+
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}_{_safe_filename(filename)}")
+        with open(path, "wb") as f:
+            f.write(data)
+
+        try:
+            job = self.service.batcher.submit(jd_id, path)
+        except QueueFull as e:
+            os.remove(path)
+            self._send_json(503, {"error": str(e)}, headers={"Retry-After": "5"})
+            return
+
+        if mode == "async":
+            self._send_json(202, {"job_id": job.id, "status_url": f"/jobs/{job.id}"})
+            return
+
+        if not job.done.wait(self.sync_timeout):
+            self._send_json(504, {"error": "screening timed out", "job_id": job.id, "status_url": f"/jobs/{job.id}"})
+            return
+        self._send_json(200 if job.status == "done" else 500, job.to_dict())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP resume screening service")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address")
+    parser.add_argument("--port", type=int, default=8000, help="Port")
+    parser.add_argument("--jd", action="append", default=[], help="JD file to preload (repeatable)")
+    parser.add_argument("--model", default="llama3.2:3b", help="Ollama model name")
+    parser.add_argument("--cutoff", type=int, default=70, help="ATS Score Cutoff")
+    parser.add_argument("--mock", action="store_true", help="Run in mock mode (no Ollama required)")
+    parser.add_argument("--semantic", action="store_true", help="Score skills/keywords with cached embeddings")
+    parser.add_argument("--max-batch", type=int, default=8, help="Max requests per micro-batch")
+    parser.add_argument("--max-wait-ms", type=int, default=50, help="Max time a batch waits to fill")
+    parser.add_argument("--max-queue", type=int, default=64, help="Pending requests before returning 503")
+    parser.add_argument("--batch-workers", type=int, default=1, help="Batches processed concurrently")
+    parser.add_argument("--max-upload-mb", type=float, default=DEFAULT_MAX_ATTACHMENT_MB,
+                        help="Reject uploads larger than this")
+    args = parser.parse_args()
+
+    llm = LLMClient(model_name=args.model, mock_mode=args.mock)
+    matcher = None
+    if args.semantic:
+        from embeddings import EmbeddingCache, Embedder, SemanticSkillMatcher
+        matcher = SemanticSkillMatcher(Embedder(llm, EmbeddingCache()))
+    agent = HiringAgent(llm, dedup_index=DuplicateIndex(), matcher=matcher)
+
+    service = ScreeningService(
+        agent, {"cutoff_score": args.cutoff},
+        max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000.0,
+        max_queue=args.max_queue, workers=args.batch_workers)
+    for path in args.jd:
+        with open(path) as f:
+            registered = service.register_jd(f.read())
+        print(colored(f"Loaded JD {path} as jd_id={registered['jd_id']} ({registered['jd']['role_title']})", "green"))
+
+    ScreeningHandler.service = service
+    ScreeningHandler.max_upload_bytes = int(args.max_upload_mb * 2**20)
+    server = ThreadingHTTPServer((args.host, args.port), ScreeningHandler)
+    print(colored(f"Screening service listening on http://{args.host}:{args.port}", "green"))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
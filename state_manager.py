@@ -1,26 +1,107 @@
 import json
 import time
 import os
-from typing import Dict, Any, List
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+from aggregates import empty_aggregates, update_aggregates, summarize
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads within one process are serialized
+    fcntl = None
 
 STATE_FILE = "dashboard_state.json"
 
+MAX_LOGS = 50
+MAX_CANDIDATES = 200
+
+# A shard that hasn't written state for this long is reported as stale
+SHARD_STALE_SECONDS = 120
+
+# Metrics are published per job by several subsystems; write them out at most this often
+METRICS_FLUSH_SECONDS = 5.0
+
+# Bot consumer threads share one state file; serialize read-modify-write cycles.
+# Across processes (sharded bots) an flock on a sidecar lock file does the same.
+_lock = threading.RLock()
+_lock_depth = 0
+
 class StateManager:
-    def __init__(self):
+    """
+    JSON-file store shared by the bot (writer) and the dashboard (reader).
+
+    Every save bumps a `version` counter, and every candidate/log entry is stamped
+    with the version that added it. Readers poll cheaply with `get_changes`: the
+    file is only re-read when its mtime/size etag moved, and only entries newer
+    than the reader's last version are returned.
+
+    Writers are safe across threads and processes. A StateManager created with a
+    `shard` name also records that shard's status, metrics, queue stats and a
+    heartbeat under state["shards"][shard], and stamps its logs and candidates.
+    """
+
+    def __init__(self, shard: Optional[str] = None):
         self.state_file = STATE_FILE
+        self.shard = shard
+        self._etag = None
+        self._cached_state = None
+        self._pending_metrics: Dict[str, Dict[str, Any]] = {}
+        self._metrics_flushed = 0.0
         self._ensure_file()
 
+    @contextmanager
+    def _exclusive(self):
+        """Holds the state lock; re-entrant within a process."""
+        global _lock_depth
+        with _lock:
+            fd = None
+            if _lock_depth == 0 and fcntl is not None:
+                fd = os.open(f"{self.state_file}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            _lock_depth += 1
+            try:
+                yield
+            finally:
+                _lock_depth -= 1
+                if fd is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                    os.close(fd)
+
+    def _shard_entry(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """This shard's entry, with its heartbeat refreshed. None when unsharded."""
+        if not self.shard:
+            return None
+        entry = state.setdefault("shards", {}).setdefault(self.shard, {})
+        entry["last_seen"] = time.time()
+        entry["pid"] = os.getpid()
+        return entry
+
     def _ensure_file(self):
-        if not os.path.exists(self.state_file):
+        if os.path.exists(self.state_file):
+            return
+        with self._exclusive():
+            if os.path.exists(self.state_file):
+                return
             initial_state = {
                 "status": "Initializing...",
                 "last_updated": time.time(),
+                "version": 0,
                 "processed_count": 0,
                 "latest_candidate": None,  # {name, score, decision, skills...}
-                "activity_log": []
+                "aggregates": empty_aggregates(),
+                "candidates": [],
+                "logs": []
             }
             self.save_state(initial_state)
 
+    def _file_etag(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.state_file)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
     def load_state(self) -> Dict[str, Any]:
         try:
             with open(self.state_file, 'r') as f:
@@ -30,27 +111,140 @@ class StateManager:
             return self.load_state()
 
     def save_state(self, state: Dict[str, Any]):
+        if self._pending_metrics:
+            # Buffered metrics ride along with whatever this instance writes next
+            owner = self._shard_entry(state)
+            (owner if owner is not None else state).setdefault("metrics", {}).update(self._pending_metrics)
+            self._pending_metrics = {}
+            self._metrics_flushed = time.time()
         state["last_updated"] = time.time()
+        state["version"] = state.get("version", 0) + 1
         # Keep log size manageable
-        if "activity_log" in state:
-            state["activity_log"] = state["activity_log"][-50:]
-            
-        with open(self.state_file, 'w') as f:
+        if "logs" in state:
+            state["logs"] = state["logs"][-MAX_LOGS:]
+        if "candidates" in state:
+            state["candidates"] = state["candidates"][-MAX_CANDIDATES:]
+
+        # Write-then-rename so readers never observe a half-written file
+        tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
             json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_file)
+
+    def get_changes(self, since_version: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        Returns None if nothing changed since `since_version` (checked via file
+        etag first, so an idle dashboard never re-parses the file). Otherwise
+        returns the current scalar fields plus only the candidates and logs added
+        after `since_version`. `reset` is True when the reader must drop its
+        cached entries (e.g. the state file was recreated).
+        """
+        etag = self._file_etag()
+        if etag is None or etag != self._etag or self._cached_state is None:
+            self._cached_state = self.load_state()
+            self._etag = etag
+        state = self._cached_state
+
+        version = state.get("version", 0)
+        if version == since_version:
+            return None
+
+        reset = version < since_version
+        if reset:
+            since_version = 0
+
+        changes = {k: v for k, v in state.items() if k not in ("candidates", "logs")}
+        changes["aggregates"] = summarize(state.get("aggregates") or empty_aggregates())
+        changes["reset"] = reset
+        changes["candidates"] = [c for c in state.get("candidates", []) if c.get("version", 0) > since_version]
+        changes["logs"] = [l for l in state.get("logs", []) if l.get("version", 0) > since_version]
+        return changes
 
     def update_status(self, status: str):
-        state = self.load_state()
-        state["status"] = status
-        self.save_state(state)
+        with self._exclusive():
+            state = self.load_state()
+            shard = self._shard_entry(state)
+            if shard is not None:
+                shard["status"] = status
+                status = f"[{self.shard}] {status}"
+            state["status"] = status
+            self.save_state(state)
 
-    def log_activity(self, message: str):
-        state = self.load_state()
-        timestamp = time.strftime("%H:%M:%S")
-        state["activity_log"].append(f"[{timestamp}] {message}")
-        self.save_state(state)
+    def log_activity(self, message: str, level: str = "INFO"):
+        with self._exclusive():
+            state = self.load_state()
+            entry = {
+                "timestamp": time.strftime("%H:%M:%S"),
+                "message": message,
+                "level": level,
+                "version": state.get("version", 0) + 1
+            }
+            if self.shard:
+                entry["shard"] = self.shard
+            state.setdefault("logs", []).append(entry)
+            self.save_state(state)
 
     def update_candidate(self, candidate_data: Dict[str, Any]):
-        state = self.load_state()
-        state["processed_count"] = state.get("processed_count", 0) + 1
-        state["latest_candidate"] = candidate_data
-        self.save_state(state)
+        with self._exclusive():
+            state = self.load_state()
+            version = state.get("version", 0) + 1
+            candidate = dict(candidate_data, version=version)
+            candidate.setdefault("id", f"candidate-{version}")
+            shard = self._shard_entry(state)
+            if shard is not None:
+                candidate["shard"] = self.shard
+                shard["processed"] = shard.get("processed", 0) + 1
+            state["processed_count"] = state.get("processed_count", 0) + 1
+            state["latest_candidate"] = candidate
+            state.setdefault("candidates", []).append(candidate)
+            update_aggregates(state.setdefault("aggregates", empty_aggregates()), candidate)
+            self.save_state(state)
+
+    def set_reply_status(self, candidate_id: str, status: str):
+        """Records outbound reply delivery status on the candidate (re-stamped so dashboards pick it up)."""
+        with self._exclusive():
+            state = self.load_state()
+            version = state.get("version", 0) + 1
+            for candidate in state.get("candidates", []):
+                if candidate.get("id") == candidate_id:
+                    candidate["reply_status"] = status
+                    candidate["version"] = version
+                    break
+            else:
+                return
+            self.save_state(state)
+
+    def get_aggregates(self) -> Dict[str, Any]:
+        """All dashboard aggregates (counts, mean/std, histograms, rollups) in one read."""
+        return summarize(self.load_state().get("aggregates") or empty_aggregates())
+
+    def update_metrics(self, name: str, metrics: Dict[str, Any], flush: bool = False):
+        """
+        Publishes a subsystem's metrics under state["metrics"][name] (or the
+        shard's). Rewriting the whole file for every call would dominate a busy
+        bot's I/O, so metrics are buffered and written with this instance's next
+        save, or on their own once METRICS_FLUSH_SECONDS have passed (or with
+        `flush`).
+        """
+        with self._exclusive():
+            self._pending_metrics[name] = metrics
+            if not flush and time.time() - self._metrics_flushed < METRICS_FLUSH_SECONDS:
+                return
+            self.save_state(self.load_state())
+
+    def update_queue_stats(self, stats: Dict[str, int]):
+        with self._exclusive():
+            state = self.load_state()
+            owner = state.get("shards", {}).get(self.shard, {}) if self.shard else state
+            if owner.get("queue") == stats:
+                return
+            owner = self._shard_entry(state) if self.shard else state
+            owner["queue"] = stats
+            self.save_state(state)
+
+    def update_shard(self, name: str, info: Dict[str, Any]):
+        """Supervisor-side process info for a shard (state, pid, restarts, exit code)."""
+        with self._exclusive():
+            state = self.load_state()
+            state.setdefault("shards", {}).setdefault(name, {}).setdefault("process", {}).update(info)
+            self.save_state(state)
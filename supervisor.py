@@ -0,0 +1,196 @@
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List
+from termcolor import colored
+from state_manager import StateManager
+
+SHARD_DIR = "shards"
+
+# A shard that ran at least this long before exiting restarts without backoff
+HEALTHY_RUN_SECONDS = 60
+
+
+def run_shard(spec: Dict[str, Any], options: Dict[str, Any]):
+    """
+    Entry point of one shard process: a BotService for one mailbox (or one
+    label partition of a mailbox). The work queue, outbox, score store and
+    downloads live under the shard's own directory. The dedup index, candidate
+    index, embedding cache and dashboard state are shared by all shards.
+    """
+    from realtime_bot import BotService
+    from work_queue import QUEUE_FILE
+    from reply_sender import OUTBOX_FILE
+    from score_store import STORE_DIR
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    # Ctrl+C goes to the whole process group; the supervisor coordinates shutdown
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    name = spec["name"]
+    shard_dir = os.path.join(options["shard_dir"], name)
+    os.makedirs(shard_dir, exist_ok=True)
+    service = BotService(
+        spec.get("jd", options["jd"]), options["model"], spec.get("cutoff", options["cutoff"]), options["interval"],
+        queue_path=os.path.join(shard_dir, QUEUE_FILE),
+        outbox_path=os.path.join(shard_dir, OUTBOX_FILE),
+        score_store_dir=os.path.join(shard_dir, STORE_DIR),
+        download_dir=os.path.join(shard_dir, "temp"),
+        workers=spec.get("workers", options["workers"]),
+        semantic=options["semantic"],
+        quota_units_per_second=spec["quota_rate"],
+        shard=name,
+        credentials_path=spec.get("credentials", options["credentials"]),
+        token_path=spec.get("token", "token.json"),
+        gmail_query=spec.get("query", ""))
+    service.run(stop_event)
+    # BotService.run only returns early on a startup failure
+    sys.exit(0 if stop_event.is_set() else 1)
+
+
+class Supervisor:
+    """
+    Launches one bot process per shard and keeps them running. A shard that
+    exits is restarted, with exponential backoff when it keeps dying quickly.
+    Process state is published to the shared dashboard state under
+    state["shards"][name]["process"]; the shards add their own heartbeat.
+    """
+
+    def __init__(self, shards: List[Dict[str, Any]], options: Dict[str, Any],
+                 base_backoff: float = 5.0, max_backoff: float = 300.0):
+        names = [s["name"] for s in shards]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Shard names must be unique: {names}")
+
+        # Gmail quota is per mailbox: label partitions of one mailbox split its budget
+        per_token = Counter(s.get("token", "token.json") for s in shards)
+        self.shards = [dict(s, quota_rate=options["quota_rate"] / per_token[s.get("token", "token.json")])
+                       for s in shards]
+        self.options = options
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = StateManager()
+        self._ctx = multiprocessing.get_context("spawn")
+        self._procs: Dict[str, Any] = {}
+        self._restarts: Counter = Counter()
+        self._failures: Counter = Counter()
+        self._restart_at: Dict[str, float] = {}
+
+    def _spawn(self, spec: Dict[str, Any]):
+        name = spec["name"]
+        proc = self._ctx.Process(target=run_shard, args=(spec, self.options), name=f"bot-{name}")
+        proc.start()
+        self._procs[name] = (proc, time.time())
+        print(colored(f"Started shard {name} (pid {proc.pid})", "green"))
+        self.state.update_shard(name, {
+            "state": "running", "pid": proc.pid, "started_at": time.time(),
+            "restarts": self._restarts[name], "mailbox": spec.get("token", "token.json"),
+            "query": spec.get("query", "")
+        })
+
+    def start(self):
+        for spec in self.shards:
+            self._spawn(spec)
+
+    def check(self):
+        """Restarts exited shards once their backoff has elapsed."""
+        now = time.time()
+        for spec in self.shards:
+            name = spec["name"]
+            proc, started_at = self._procs[name]
+            if proc.is_alive():
+                continue
+
+            if name not in self._restart_at:
+                ran_for = now - started_at
+                self._failures[name] = 0 if ran_for >= HEALTHY_RUN_SECONDS else self._failures[name] + 1
+                delay = min(self.max_backoff, self.base_backoff * (2 ** self._failures[name])) if self._failures[name] else 0
+                self._restart_at[name] = now + delay
+                print(colored(f"Shard {name} exited with code {proc.exitcode}; restarting in {delay:.0f}s", "yellow"))
+                self.state.update_shard(name, {"state": "restarting", "exit_code": proc.exitcode,
+                                               "restart_at": self._restart_at[name]})
+                self.state.log_activity(f"Shard {name} exited with code {proc.exitcode}", level="ERROR")
+
+            if now >= self._restart_at[name]:
+                del self._restart_at[name]
+                self._restarts[name] += 1
+                self._spawn(spec)
+
+    def stop(self, timeout: float = 30.0):
+        for proc, _ in self._procs.values():
+            if proc.is_alive():
+                proc.terminate()
+        deadline = time.time() + timeout
+        for name, (proc, _) in self._procs.items():
+            proc.join(max(0.0, deadline - time.time()))
+            if proc.is_alive():
+                proc.kill()
+                proc.join()
+            self.state.update_shard(name, {"state": "stopped", "exit_code": proc.exitcode})
+
+    def run(self, stop_event: threading.Event, poll: float = 2.0):
+        self.start()
+        try:
+            while not stop_event.is_set():
+                self.check()
+                stop_event.wait(poll)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            print(colored("\nStopping shards...", "yellow"))
+            if threading.current_thread() is threading.main_thread():
+                # A repeated Ctrl+C must not abort shutdown halfway through a state write
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+            self.stop()
+
+
+def load_shards(path: str) -> List[Dict[str, Any]]:
+    """
+    Reads a shard config: {"shards": [{"name": ..., "token": ..., "query": ...}, ...]}.
+    Optional per-shard keys: credentials, jd, cutoff, workers.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    shards = config["shards"] if isinstance(config, dict) else config
+    for spec in shards:
+        if not spec.get("name"):
+            raise ValueError(f"Shard without a name in {path}: {spec}")
+    return shards
+
+
+def main():
+    from scheduler import DEFAULT_UNITS_PER_SECOND
+
+    parser = argparse.ArgumentParser(description="Run one bot process per mailbox / label partition")
+    parser.add_argument("--config", required=True, help="Shard config JSON (see README)")
+    parser.add_argument("--jd", default="data/jd.txt", help="Default Job Description file for shards")
+    parser.add_argument("--model", default="llama3.2:3b", help="Ollama model name")
+    parser.add_argument("--cutoff", type=int, default=70, help="Default ATS Score Cutoff")
+    parser.add_argument("--interval", type=int, default=60, help="Polling interval in seconds after new mail")
+    parser.add_argument("--workers", type=int, default=1, help="Default screening threads per shard")
+    parser.add_argument("--credentials", default="credentials.json", help="Default OAuth client file")
+    parser.add_argument("--quota-rate", type=float, default=DEFAULT_UNITS_PER_SECOND,
+                        help="Gmail quota units per second per mailbox")
+    parser.add_argument("--semantic", action="store_true", help="Score skills/keywords with cached embeddings")
+    parser.add_argument("--shard-dir", default=SHARD_DIR, help="Root directory for per-shard queues and outboxes")
+    args = parser.parse_args()
+
+    options = {
+        "jd": args.jd, "model": args.model, "cutoff": args.cutoff, "interval": args.interval,
+        "workers": args.workers, "credentials": args.credentials, "quota_rate": args.quota_rate,
+        "semantic": args.semantic, "shard_dir": args.shard_dir
+    }
+    supervisor = Supervisor(load_shards(args.config), options)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    supervisor.run(stop_event)
+
+if __name__ == "__main__":
+    main()
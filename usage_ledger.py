@@ -0,0 +1,292 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+USAGE_FILE = "usage.db"
+
+ROLLUPS = ("stage", "role", "day", "model")
+
+# Summed per group by every rollup; compute is Ollama's total_duration
+_TOTALS = """
+    COUNT(*) AS records,
+    SUM(cache = 'miss') AS calls,
+    SUM(cache = 'hit') AS cache_hits,
+    SUM(prompt_tokens) AS prompt_tokens,
+    SUM(completion_tokens) AS completion_tokens,
+    ROUND(SUM(prompt_eval_ms), 1) AS prompt_eval_ms,
+    ROUND(SUM(eval_ms), 1) AS eval_ms,
+    ROUND(SUM(load_ms), 1) AS load_ms,
+    ROUND(SUM(total_ms), 1) AS compute_ms
+"""
+
+SORT_KEYS = {"compute": "SUM(total_ms)", "tokens": "SUM(prompt_tokens + completion_tokens)",
+             "calls": "SUM(cache = 'miss')"}
+
+
+def usage_from_response(data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Token counts and timings (ns -> ms) from an Ollama /api/generate or /api/embed response."""
+    data = data or {}
+    return {
+        "prompt_tokens": data.get("prompt_eval_count", 0),
+        "completion_tokens": data.get("eval_count", 0),
+        "prompt_eval_ms": round(data.get("prompt_eval_duration", 0) / 1e6, 2),
+        "eval_ms": round(data.get("eval_duration", 0) / 1e6, 2),
+        "load_ms": round(data.get("load_duration", 0) / 1e6, 2),
+        "total_ms": round(data.get("total_duration", 0) / 1e6, 2)
+    }
+
+
+class MessageUsage:
+    """Usage records of one message, held until the message finishes."""
+
+    def __init__(self, message_id: str, role: Optional[str]):
+        self.message_id = message_id
+        self.role = role
+        self.records: List[Dict[str, Any]] = []
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals for this message so far, overall and per stage."""
+        stages: Dict[str, Dict[str, Any]] = {}
+        for r in self.records:
+            s = stages.setdefault(r["stage"], {"calls": 0, "cache_hits": 0, "prompt_tokens": 0,
+                                               "completion_tokens": 0, "compute_ms": 0.0})
+            s["calls" if r["cache"] == "miss" else "cache_hits"] += 1
+            s["prompt_tokens"] += r["prompt_tokens"]
+            s["completion_tokens"] += r["completion_tokens"]
+            s["compute_ms"] = round(s["compute_ms"] + r["total_ms"], 2)
+        totals = {key: sum(s[key] for s in stages.values())
+                  for key in ("calls", "cache_hits", "prompt_tokens", "completion_tokens")}
+        totals["compute_ms"] = round(sum(s["compute_ms"] for s in stages.values()), 2)
+        totals["models"] = sorted({r["model"] for r in self.records if r["cache"] == "miss"})
+        return dict(totals, stages=stages)
+
+
+class UsageLedger:
+    """
+    SQLite ledger of model compute: one record per Ollama call, tagged with
+    the message and pipeline stage it was made for, plus one record for each
+    time a stage's model work was served from a cache instead (dedup reuse,
+    cached embeddings).
+
+    `message(id, role)` scopes the records of one message and `stage(name)`
+    names the step making the calls; both are per thread, so LLMClient can
+    record without knowing where it is called from. A message's records are
+    written in one transaction when it finishes, failed attempts included
+    (their compute was spent all the same). Calls made outside a message are
+    written straight away without one.
+    """
+
+    def __init__(self, db_path: str = USAGE_FILE):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_id TEXT,
+                role TEXT,
+                stage TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                cache TEXT NOT NULL,
+                items INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                prompt_eval_ms REAL NOT NULL,
+                eval_ms REAL NOT NULL,
+                load_ms REAL NOT NULL,
+                total_ms REAL NOT NULL,
+                created_at REAL NOT NULL,
+                day TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_usage_message ON usage (message_id);
+            CREATE INDEX IF NOT EXISTS idx_usage_day ON usage (day);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _stages(self) -> List[str]:
+        stages = getattr(self._local, "stages", None)
+        if stages is None:
+            stages = self._local.stages = []
+        return stages
+
+    @property
+    def current(self) -> Optional[MessageUsage]:
+        return getattr(self._local, "current", None)
+
+    @contextmanager
+    def message(self, message_id: str, role: Optional[str] = None) -> Iterator[MessageUsage]:
+        """Scopes usage to `message_id`. Nested scopes join the outer message."""
+        current = self.current
+        if current is not None:
+            if role and not current.role:
+                current.role = role
+            yield current
+            return
+        current = MessageUsage(message_id, role)
+        self._local.current = current
+        try:
+            yield current
+        finally:
+            self._local.current = None
+            self._write(current.records, current.message_id, current.role)
+
+    @contextmanager
+    def stage(self, name: str):
+        stages = self._stages()
+        stages.append(name)
+        try:
+            yield
+        finally:
+            stages.pop()
+
+    def set_role(self, role: str):
+        """Tags the current message with the role it was screened for, once known."""
+        if self.current is not None:
+            self.current.role = role
+
+    def record(self, kind: str, model: str, response: Optional[Dict[str, Any]] = None,
+               cache: str = "miss", items: int = 1, stage: Optional[str] = None):
+        """
+        Records one model call from its Ollama response (`cache="miss"`), or
+        `items` results served from a cache (`cache="hit"`, no response).
+        `stage` defaults to the innermost open stage.
+        """
+        current = self.current
+        stages = self._stages()
+        now = time.time()
+        stage = stage or (stages[-1] if stages else "unstaged")
+        row = dict(usage_from_response(response), stage=stage, kind=kind,
+                   model=model, cache=cache, items=items, created_at=now,
+                   day=datetime.fromtimestamp(now).strftime("%Y-%m-%d"))
+        if current is not None:
+            current.records.append(row)
+        else:
+            self._write([row], None, None)
+
+    def _write(self, records: List[Dict[str, Any]], message_id: Optional[str], role: Optional[str]):
+        if not records:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany("""
+                INSERT INTO usage (message_id, role, stage, kind, model, cache, items, prompt_tokens,
+                                   completion_tokens, prompt_eval_ms, eval_ms, load_ms, total_ms, created_at, day)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(message_id, role, r["stage"], r["kind"], r["model"], r["cache"], r["items"],
+                   r["prompt_tokens"], r["completion_tokens"], r["prompt_eval_ms"], r["eval_ms"],
+                   r["load_ms"], r["total_ms"], r["created_at"], r["day"]) for r in records])
+
+    def _where(self, days: Optional[float]):
+        if not days:
+            return "", ()
+        return "WHERE created_at >= ?", (time.time() - days * 86400,)
+
+    def totals(self, days: Optional[float] = None) -> Dict[str, Any]:
+        where, params = self._where(days)
+        row = self._conn().execute(
+            f"SELECT {_TOTALS}, COUNT(DISTINCT message_id) AS candidates FROM usage {where}", params).fetchone()
+        totals = {key: row[key] or 0 for key in row.keys()}
+        totals["compute_ms_per_candidate"] = (round(totals["compute_ms"] / totals["candidates"], 1)
+                                              if totals["candidates"] else None)
+        return totals
+
+    def rollup(self, by: str, days: Optional[float] = None, sort: str = "compute") -> List[Dict[str, Any]]:
+        """Totals grouped by one of ROLLUPS, most expensive first."""
+        if by not in ROLLUPS:
+            raise ValueError(f"Unknown rollup {by!r}; expected one of {ROLLUPS}")
+        where, params = self._where(days)
+        # Days read best in order; every other rollup is a cost ranking
+        order = "day DESC" if by == "day" else f"{SORT_KEYS[sort]} DESC"
+        rows = self._conn().execute(f"""
+            SELECT COALESCE({by}, '(none)') AS {by}, {_TOTALS}, COUNT(DISTINCT message_id) AS candidates
+            FROM usage {where} GROUP BY 1 ORDER BY {order}
+        """, params)
+        return [dict(r) for r in rows]
+
+    def top_candidates(self, limit: int = 10, days: Optional[float] = None,
+                       sort: str = "compute") -> List[Dict[str, Any]]:
+        where, params = self._where(days)
+        where = f"{where} AND message_id IS NOT NULL" if where else "WHERE message_id IS NOT NULL"
+        rows = self._conn().execute(f"""
+            SELECT message_id, MAX(role) AS role, MIN(day) AS day, {_TOTALS}
+            FROM usage {where} GROUP BY message_id ORDER BY {SORT_KEYS[sort]} DESC LIMIT ?
+        """, params + (limit,))
+        return [dict(r) for r in rows]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Today's totals and per-stage compute, for the dashboard."""
+        today = datetime.now().strftime("%Y-%m-%d")
+        row = self._conn().execute(
+            f"SELECT {_TOTALS}, COUNT(DISTINCT message_id) AS candidates FROM usage WHERE day = ?",
+            (today,)).fetchone()
+        stages = self._conn().execute(
+            "SELECT stage, ROUND(SUM(total_ms), 1) FROM usage WHERE day = ? GROUP BY stage ORDER BY 2 DESC",
+            (today,))
+        return dict({key: row[key] or 0 for key in row.keys()}, day=today,
+                    compute_ms_by_stage={stage: ms for stage, ms in stages})
+
+    def report(self, top_n: int = 10, days: Optional[float] = None, sort: str = "compute") -> str:
+        totals = self.totals(days)
+        if not totals["records"]:
+            return f"No usage recorded in {self.db_path}"
+        lines = [
+            f"Candidates: {totals['candidates']}  LLM calls: {totals['calls']}  cache hits: {totals['cache_hits']}",
+            f"Tokens: {totals['prompt_tokens']} prompt + {totals['completion_tokens']} generated  "
+            f"compute: {totals['compute_ms'] / 1000:.1f}s "
+            f"({totals['compute_ms_per_candidate'] or 0:.0f} ms per candidate, "
+            f"{totals['load_ms'] / 1000:.1f}s loading models)"
+        ]
+        header = f"{'calls':>7}{'hits':>6}{'prompt tok':>12}{'gen tok':>10}{'eval s':>9}{'compute s':>11}"
+
+        def row(r: Dict[str, Any]) -> str:
+            return (f"{r['calls'] or 0:>7}{r['cache_hits'] or 0:>6}{r['prompt_tokens'] or 0:>12}"
+                    f"{r['completion_tokens'] or 0:>10}{(r['eval_ms'] or 0) / 1000:>9.1f}"
+                    f"{(r['compute_ms'] or 0) / 1000:>11.1f}")
+
+        for by in ROLLUPS:
+            rows = self.rollup(by, days, sort)
+            if by == "day":
+                rows = rows[:top_n]
+            lines += ["", f"By {by}:", f"{by:<28}{header}"]
+            lines += [f"{str(r[by])[:27]:<28}{row(r)}" for r in rows]
+
+        lines += ["", f"Top {top_n} candidates by {sort}:", f"{'message':<28}{'role':<20}{header}"]
+        for r in self.top_candidates(top_n, days, sort):
+            lines.append(f"{r['message_id'][:27]:<28}{(r['role'] or '')[:19]:<20}{row(r)}")
+        return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model compute per candidate, stage, role and day")
+    parser.add_argument("--db", default=USAGE_FILE, help="Path to the usage ledger")
+    parser.add_argument("--top", type=int, default=10, help="Most expensive candidates (and days) to list")
+    parser.add_argument("--days", type=float, help="Only count the last N days")
+    parser.add_argument("--sort", choices=list(SORT_KEYS), default="compute", help="Cost ranking")
+    parser.add_argument("--json", action="store_true", help="Print the rollups as JSON")
+    args = parser.parse_args()
+
+    ledger = UsageLedger(args.db)
+    if args.json:
+        print(json.dumps({
+            "totals": ledger.totals(args.days),
+            **{f"by_{by}": ledger.rollup(by, args.days, args.sort) for by in ROLLUPS},
+            "top_candidates": ledger.top_candidates(args.top, args.days, args.sort)
+        }, indent=2))
+    else:
+        print(ledger.report(args.top, args.days, args.sort))
+
+if __name__ == "__main__":
+    main()
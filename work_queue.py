@@ -0,0 +1,257 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+QUEUE_FILE = "work_queue.db"
+
+PENDING = "PENDING"
+LEASED = "LEASED"
+DONE = "DONE"
+DEAD = "DEAD"
+
+
+class Job(BaseModel):
+    id: int
+    message_id: str
+    attempts: int
+    lease_token: str
+    created_at: float = 0.0
+    stages: Dict[str, Any] = {}
+
+
+class LeaseLost(Exception):
+    """Raised when a job's lease expired and another consumer took it over."""
+
+
+class Released(Exception):
+    """Raised by a consumer after handing its job back with WorkQueue.release."""
+
+
+class WorkQueue:
+    """
+    Durable SQLite-backed queue of Gmail message IDs.
+
+    Producers enqueue message IDs (duplicates are ignored). Consumers lease a job
+    for a visibility timeout, record each completed stage on it so a retry can
+    resume where it stopped, and either complete it or fail it. Failed jobs are
+    retried with exponential backoff until max_attempts, then dead-lettered.
+
+    Jobs without a priority are leased first (they still need their cheap
+    pre-screen); the rest go in descending priority order.
+    """
+
+    def __init__(self, db_path: str = QUEUE_FILE, max_attempts: int = 5,
+                 base_backoff: float = 30.0, max_backoff: float = 3600.0):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._local = threading.local()
+        self._init_db()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_id TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                lease_token TEXT,
+                leased_until REAL,
+                stages TEXT NOT NULL DEFAULT '{}',
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, available_at);
+        """)
+        columns = {row["name"] for row in self._conn().execute("PRAGMA table_info(jobs)")}
+        if "priority" not in columns:
+            self._conn().execute("ALTER TABLE jobs ADD COLUMN priority REAL")
+
+    def enqueue(self, message_id: str) -> bool:
+        """
+        Adds a message ID to the queue. Returns False if it was already known,
+        whatever its status, so re-polling the same inbox is harmless.
+        """
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT OR IGNORE INTO jobs (message_id, status, available_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (message_id, PENDING, now, now, now))
+        return cur.rowcount == 1
+
+    def lease(self, visibility_timeout: float = 300.0) -> Optional[Job]:
+        """
+        Claims the next ready job. Jobs whose lease expired are treated as ready
+        again, unless they have used up their attempts, in which case they are
+        dead-lettered.
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = ?, last_error = 'lease expired', lease_token = NULL, updated_at = ? "
+                "WHERE status = ? AND leased_until < ? AND attempts >= ?",
+                (DEAD, now, LEASED, now, self.max_attempts))
+            row = conn.execute(
+                "SELECT id FROM jobs "
+                "WHERE (status = ? AND available_at <= ?) OR (status = ? AND leased_until < ?) "
+                "ORDER BY priority IS NOT NULL, priority DESC, available_at, id LIMIT 1",
+                (PENDING, now, LEASED, now)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_token = ?, leased_until = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (LEASED, token, now + visibility_timeout, now, row["id"]))
+            job_row = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return Job(
+            id=job_row["id"],
+            message_id=job_row["message_id"],
+            attempts=job_row["attempts"],
+            lease_token=token,
+            created_at=job_row["created_at"],
+            stages=json.loads(job_row["stages"])
+        )
+
+    def _update_leased(self, job: Job, sql: str, params: tuple):
+        cur = self._conn().execute(
+            sql + " WHERE id = ? AND status = ? AND lease_token = ?",
+            params + (job.id, LEASED, job.lease_token))
+        if cur.rowcount != 1:
+            raise LeaseLost(f"Lease on job {job.id} ({job.message_id}) is no longer held")
+
+    def extend(self, job: Job, visibility_timeout: float = 300.0):
+        """Pushes back the lease deadline for long-running work."""
+        now = time.time()
+        self._update_leased(job, "UPDATE jobs SET leased_until = ?, updated_at = ?",
+                            (now + visibility_timeout, now))
+
+    @contextmanager
+    def keep_alive(self, job: Job, visibility_timeout: float = 300.0):
+        """
+        Extends the job's lease every third of `visibility_timeout` while the
+        block runs, so a slow stage (a long LLM call) doesn't let the lease
+        lapse and hand the message to a second consumer. Stops once the lease
+        is lost; the consumer finds out at its next record_stage.
+        """
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(visibility_timeout / 3):
+                try:
+                    self.extend(job, visibility_timeout)
+                except LeaseLost:
+                    return
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+
+    def record_stage(self, job: Job, stage: str, data: Any = None):
+        """
+        Persists the output of a completed stage. A retried job sees it in
+        job.stages and skips that stage.
+        """
+        job.stages[stage] = data
+        self._update_leased(job, "UPDATE jobs SET stages = ?, updated_at = ?",
+                            (json.dumps(job.stages), time.time()))
+
+    def complete(self, job: Job):
+        self._update_leased(job, "UPDATE jobs SET status = ?, lease_token = NULL, last_error = NULL, updated_at = ?",
+                            (DONE, time.time()))
+
+    def fail(self, job: Job, error: str) -> Optional[float]:
+        """
+        Releases a job after an error. Returns the time it becomes ready again,
+        or None if it was moved to the dead-letter state.
+        """
+        now = time.time()
+        if job.attempts >= self.max_attempts:
+            self._update_leased(job, "UPDATE jobs SET status = ?, lease_token = NULL, last_error = ?, updated_at = ?",
+                                (DEAD, error, now))
+            return None
+
+        delay = min(self.base_backoff * (2 ** (job.attempts - 1)), self.max_backoff)
+        retry_at = now + delay * random.uniform(0.8, 1.2)
+        self._update_leased(job, "UPDATE jobs SET status = ?, lease_token = NULL, available_at = ?, "
+                                 "last_error = ?, updated_at = ?",
+                            (PENDING, retry_at, error, now))
+        return retry_at
+
+    def release(self, job: Job, priority: Optional[float] = None, available_at: Optional[float] = None):
+        """
+        Returns a leased job to the queue without counting the attempt, e.g. to
+        re-rank it by `priority` or to defer it until `available_at`.
+        """
+        now = time.time()
+        self._update_leased(job, "UPDATE jobs SET status = ?, lease_token = NULL, attempts = attempts - 1, "
+                                 "priority = COALESCE(?, priority), available_at = ?, updated_at = ?",
+                            (PENDING, priority, available_at or now, now))
+
+    def iter_stages(self, status: Optional[str] = None):
+        """Yields (message_id, stages) for every job, or only those in `status`."""
+        if status is None:
+            rows = self._conn().execute("SELECT message_id, stages FROM jobs")
+        else:
+            rows = self._conn().execute("SELECT message_id, stages FROM jobs WHERE status = ?", (status,))
+        for row in rows:
+            yield row["message_id"], json.loads(row["stages"])
+
+    def requeue_dead(self, message_id: str) -> bool:
+        """Gives a dead-lettered job a fresh set of attempts, keeping its recorded stages."""
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE jobs SET status = ?, attempts = 0, available_at = ?, updated_at = ? "
+            "WHERE message_id = ? AND status = ?",
+            (PENDING, now, now, message_id, DEAD))
+        return cur.rowcount == 1
+
+    def dead_letters(self, limit: int = 50) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT message_id, attempts, last_error, updated_at FROM jobs "
+            "WHERE status = ? ORDER BY updated_at DESC LIMIT ?",
+            (DEAD, limit)).fetchall()
+        return [dict(r) for r in rows]
+
+    def ready_count(self) -> int:
+        """Pending jobs that could be leased right now (deferred and backed-off ones excluded)."""
+        return self._conn().execute("SELECT COUNT(*) FROM jobs WHERE status = ? AND available_at <= ?",
+                                    (PENDING, time.time())).fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, DEAD: 0}
+        for row in self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        return counts